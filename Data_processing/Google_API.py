@@ -2,28 +2,16 @@ import requests
 import os
 import json
 import pandas as pd
+from Data_processing.driving_time_store import get_store
+from Data_processing.driving_time_fetch import acquire_driving_times
 
 base = "https://maps.googleapis.com/maps/api/distancematrix/json?units=imperial"
 key = os.environ['KEY']
 
-driving_times = {}
-
 
 def write_driving_times():
-    with open("station.json", 'r') as f:
-        station_json = json.load(f)
-
-    for id_1, station_1 in station_json.items():
-        longitude_1 = float(station_1[0])
-        latitude_1 = float(station_1[1])
-        for id_2, station_2 in station_json.items():
-            driving_key = str(id_1) + '_' + str(id_2)
-            longitude_2 = float(station_2[0])
-            latitude_2 = float(station_2[1])
-            driving_times[driving_key] = get_driving_time(latitude_1, longitude_1, latitude_2, longitude_2)
-        print(driving_times)
-    with open('times.json', 'w') as fp:
-        json.dump(driving_times, fp)
+    # Tiles of origins x destinations are requested concurrently and checkpointed, see driving_time_fetch
+    return acquire_driving_times(station_path="station.json", out_path="times.json", url=base, key=key)
 
 
 def get_driving_time(origin_lat, origin_lon, dest_lat, dest_lon):
@@ -76,7 +64,4 @@ def write_all_addresses():
 
 
 def get_driving_time_from_id(station_id_1, station_id_2):
-    id_key = str(station_id_1) + '_' + station_id_2
-    with open("Data_processing/times.json", 'r') as f:
-        time_json = json.load(f)
-    return time_json[id_key]
+    return get_store().get_driving_time(station_id_1, station_id_2)
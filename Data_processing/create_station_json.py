@@ -37,5 +37,6 @@ def write_json(json_element):
         json.dump(json_element, fp)
 
 
-read_excel()
-write_json(stations)
+if __name__ == '__main__':
+    read_excel()
+    write_json(stations)
@@ -0,0 +1,64 @@
+import json
+import math
+import random
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def haversine_minutes(origin, destination, speed=30):
+    # Straight-line driving time in minutes at speed km/h
+    lat_1, lon_1, lat_2, lon_2 = map(math.radians, (*origin, *destination))
+    a = math.sin((lat_2 - lat_1) / 2) ** 2 + math.cos(lat_1) * math.cos(lat_2) * math.sin((lon_2 - lon_1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(a)) / speed * 60
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Answers distance matrix requests in the format of the real service from the coordinates alone
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.path)
+        if server.fail_rate > 0 and server.random.random() < server.fail_rate:
+            self.send_response(503)
+            self.end_headers()
+            return
+        query = parse_qs(urlparse(self.path).query)
+
+        def points(name):
+            return [tuple(float(k) for k in point.split(',')) for point in query[name][0].split('|')]
+        origins = points('origins')
+        destinations = points('destinations')
+        body = {'status': 'OK',
+                'origin_addresses': ["Stub {:.5f} {:.5f}, Oslo".format(*point) for point in origins],
+                'destination_addresses': ["Stub {:.5f} {:.5f}, Oslo".format(*point) for point in destinations],
+                'rows': [{'elements': [{'status': 'OK', 'duration': {
+                    'value': int(round(haversine_minutes(origin, destination) * 60))}} for destination in destinations]}
+                         for origin in origins]}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, fail_rate=0.0, seed=0):
+    # Serves in a background thread, returns the server and the url to pass to acquire_driving_times.
+    # fail_rate answers that share of the requests with 503 to exercise retries
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.requests = []
+    server.fail_rate = fail_rate
+    server.random = random.Random(seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}/maps/api/distancematrix/json".format(server.server_address[1])
+
+
+if __name__ == '__main__':
+    stub, url = start_stub_server(int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
+    print("Distance matrix stub at", url)
+    threading.Event().wait()
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from Data_processing.driving_time_store import DrivingTimeStore, default_path, save_store
+
+base = "https://maps.googleapis.com/maps/api/distancematrix/json?units=imperial"
+
+# The distance matrix service allows 25 origins, 25 destinations and 100 elements per request
+max_tile_side = 25
+max_tile_elements = 100
+
+
+class RateLimiter:
+    # Spaces request starts at least 1 / rate seconds apart
+
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_start = 0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            delay = self.next_start - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.next_start = time.monotonic() + self.interval
+
+
+class TileCheckpoint:
+    # Completed tiles are appended as one json line each, so an interrupted run loses at most the running tiles
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        tiles = []
+        if not os.path.exists(self.path):
+            return tiles
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    tiles.append(json.loads(line))
+                except ValueError:
+                    # A line cut off by a crash, its tile is fetched again
+                    continue
+        return tiles
+
+    def append(self, tile):
+        with open(self.path, 'a') as fp:
+            fp.write(json.dumps(tile) + "\n")
+            fp.flush()
+
+
+def plan_tiles(times, tile_size=10):
+    # Rectangular origin x destination tiles that cover every missing entry: the origins with a missing entry
+    # are split into groups, and every group only asks for the destinations missing in one of its rows
+    tile_size = min(tile_size, max_tile_side)
+    missing = np.isnan(times)
+    origins = np.flatnonzero(missing.any(axis=1))
+    tiles = []
+    for start in range(0, len(origins), tile_size):
+        rows = origins[start:start + tile_size]
+        columns = np.flatnonzero(missing[rows].any(axis=0))
+        width = max(1, min(max_tile_side, max_tile_elements // len(rows)))
+        for column_start in range(0, len(columns), width):
+            tiles.append((rows, columns[column_start:column_start + width]))
+    return tiles
+
+
+def request_tile(url, key, origins, destinations, timeout=30):
+    # origins and destinations are lists of (latitude, longitude)
+    parameters = {'origins': "|".join("{},{}".format(lat, lon) for lat, lon in origins),
+                  'destinations': "|".join("{},{}".format(lat, lon) for lat, lon in destinations), 'key': key}
+    r = requests.get(url, params=parameters, timeout=timeout)
+    r.raise_for_status()
+    data = r.json()
+    if data.get('status', 'OK') != 'OK':
+        raise RuntimeError("Distance matrix request failed: " + str(data.get('status')))
+    times = [[round(int(element['duration']['value']) / 60, 2) if element.get('status', 'OK') == 'OK' else None
+              for element in row['elements']] for row in data['rows']]
+    return {'times': times, 'origin_addresses': [address.split(',')[0] for address in data['origin_addresses']],
+            'destination_addresses': [address.split(',')[0] for address in data['destination_addresses']]}
+
+
+def apply_tile(tile, index, times, addresses):
+    for origin, row in zip(tile['origins'], tile['times']):
+        for destination, time_x in zip(tile['destinations'], row):
+            if time_x is not None and origin in index and destination in index:
+                times[index[origin], index[destination]] = time_x
+    for station_ids, tile_addresses in ((tile['origins'], tile['origin_addresses']),
+                                        (tile['destinations'], tile['destination_addresses'])):
+        for station_id, address in zip(station_ids, tile_addresses):
+            if station_id in index and address is not None:
+                addresses[index[station_id]] = address
+
+
+async def fetch_tiles(tiles, ids, coordinates, checkpoint, url, key, concurrency=4, rate=10, retries=3):
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        async def fetch(rows, columns):
+            origins = [ids[i] for i in rows]
+            destinations = [ids[j] for j in columns]
+            async with semaphore:
+                for attempt in range(retries):
+                    await limiter.wait()
+                    try:
+                        result = await loop.run_in_executor(pool, request_tile, url, key,
+                                                            [coordinates[i] for i in rows],
+                                                            [coordinates[j] for j in columns])
+                        break
+                    except (requests.RequestException, RuntimeError, ValueError, KeyError) as error:
+                        if attempt == retries - 1:
+                            # The error text holds the request url with the key, only its type is printed
+                            print("Tile from", origins[0], "to", destinations[0], "failed:", type(error).__name__)
+                            failed.append((rows, columns))
+                            return None
+                        await asyncio.sleep(2 ** attempt)
+            tile = {'origins': origins, 'destinations': destinations}
+            tile.update(result)
+            checkpoint.append(tile)
+            return tile
+
+        results = await asyncio.gather(*(fetch(rows, columns) for rows, columns in tiles))
+    return [tile for tile in results if tile is not None], failed
+
+
+def write_json(path, ids, times, addresses):
+    # Same layout as the times.json written pair by pair: "id1_id2": [minutes, address 1, address 2]
+    time_json = {}
+    for i, id_1 in enumerate(ids):
+        for j, id_2 in enumerate(ids):
+            if not np.isnan(times[i, j]):
+                time_json[id_1 + '_' + id_2] = [float(times[i, j]), addresses[i], addresses[j]]
+    with open(path, 'w') as fp:
+        json.dump(time_json, fp)
+
+
+def acquire_driving_times(station_path="Data_processing/station.json", out_path=default_path, checkpoint_path=None,
+                          url=base, key=None, tile_size=10, concurrency=4, rate=10):
+    # Starts from the times already in out_path and in the checkpoint and only requests the missing pairs,
+    # so new stations cost their rows and columns. The diagonal is zero and never requested. Stations that left
+    # station.json keep their times in out_path, they come after the current stations and are not requested
+    if key is None:
+        key = os.environ.get('KEY')
+    if checkpoint_path is None:
+        checkpoint_path = os.path.splitext(out_path)[0] + "_tiles.jsonl"
+    with open(station_path, 'r') as f:
+        station_json = json.load(f)
+    ids = [str(station_id) for station_id in station_json]
+    coordinates = [(float(station[0]), float(station[1])) for station in station_json.values()]
+    n = len(ids)
+    known = DrivingTimeStore.from_json(out_path) if os.path.exists(out_path) else None
+    if known is not None:
+        ids += [station_id for station_id in known.ids if station_id not in station_json]
+    index = {station_id: k for k, station_id in enumerate(ids)}
+
+    times = np.full((len(ids), len(ids)), np.nan)
+    np.fill_diagonal(times, 0)
+    addresses = [None] * len(ids)
+    if known is not None:
+        apply_tile({'origins': known.ids, 'destinations': known.ids, 'times': np.where(
+            np.isnan(known.times), None, known.times).tolist(), 'origin_addresses': known.addresses,
+            'destination_addresses': known.addresses}, index, times, addresses)
+    checkpoint = TileCheckpoint(checkpoint_path)
+    for tile in checkpoint.load():
+        apply_tile(tile, index, times, addresses)
+
+    tiles = plan_tiles(times[:n, :n], tile_size)
+    print("{} of {} pairs missing, {} tiles to request".format(int(np.isnan(times[:n, :n]).sum()), n * n,
+                                                               len(tiles)))
+    fetched, failed = asyncio.run(fetch_tiles(tiles, ids, coordinates, checkpoint, url, key, concurrency, rate))
+    for tile in fetched:
+        apply_tile(tile, index, times, addresses)
+
+    write_json(out_path, ids, times, addresses)
+    store = save_store(DrivingTimeStore(ids, times, addresses), out_path)
+    # Everything fetched is now in out_path, the checkpoint is only kept for tiles that still failed
+    if not failed and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return store, failed
@@ -0,0 +1,110 @@
+import json
+import os
+import numpy as np
+
+default_path = "Data_processing/times.json"
+
+_stores = {}
+
+
+class DrivingTimeStore:
+
+    def __init__(self, ids, times, addresses=None):
+        self.ids = [str(station_id) for station_id in ids]
+        self.index = {station_id: k for k, station_id in enumerate(self.ids)}
+        self.times = times
+        if addresses is None:
+            addresses = [None] * len(self.ids)
+        self.addresses = list(addresses)
+
+    @classmethod
+    def from_json(cls, path=default_path):
+        with open(path, 'r') as f:
+            time_json = json.load(f)
+
+        ids = []
+        index = {}
+        pairs = []
+        for id_key, value in time_json.items():
+            id_1, id_2 = id_key.split('_')
+            for station_id in (id_1, id_2):
+                if station_id not in index:
+                    index[station_id] = len(ids)
+                    ids.append(station_id)
+            pairs.append((index[id_1], index[id_2], value))
+
+        times = np.full((len(ids), len(ids)), np.nan)
+        addresses = [None] * len(ids)
+        rows = np.array([pair[0] for pair in pairs], dtype=np.intp)
+        cols = np.array([pair[1] for pair in pairs], dtype=np.intp)
+        times[rows, cols] = [pair[2][0] for pair in pairs]
+        for i, j, value in pairs:
+            addresses[i] = value[1]
+            addresses[j] = value[2]
+        return cls(ids, times, addresses)
+
+    @classmethod
+    def load(cls, stem, mmap=False):
+        with open(stem + "_index.json", 'r') as f:
+            index = json.load(f)
+        times = np.load(stem + ".npy", mmap_mode='r' if mmap else None)
+        return cls(index['ids'], times, index['addresses'])
+
+    def save(self, stem):
+        np.save(stem + ".npy", np.asarray(self.times, dtype=np.float64))
+        with open(stem + "_index.json", 'w') as fp:
+            json.dump({'ids': self.ids, 'addresses': self.addresses}, fp)
+
+    def positions(self, station_ids):
+        return np.array([self.index[str(station_id)] for station_id in station_ids], dtype=np.intp)
+
+    def get_sub_matrix(self, station_ids):
+        pos = self.positions(station_ids)
+        sub = np.asarray(self.times[np.ix_(pos, pos)])
+        missing = np.argwhere(np.isnan(sub))
+        if len(missing) > 0:
+            i, j = missing[0]
+            raise KeyError(str(station_ids[i]) + '_' + str(station_ids[j]))
+        return sub
+
+    def get_partial_sub_matrix(self, station_ids):
+        # Like get_sub_matrix, with NaN for missing pairs and for stations that are not in the store
+        known = np.array([str(station_id) in self.index for station_id in station_ids], dtype=bool)
+        sub = np.full((len(station_ids), len(station_ids)), np.nan)
+        pos = self.positions([station_id for station_id, k in zip(station_ids, known) if k])
+        sub[np.ix_(known, known)] = self.times[np.ix_(pos, pos)]
+        return sub
+
+    def get_addresses(self, station_ids):
+        return [self.addresses[self.index[str(station_id)]] if str(station_id) in self.index else None
+                for station_id in station_ids]
+
+    def get_driving_time(self, station_id_1, station_id_2):
+        i = self.index[str(station_id_1)]
+        j = self.index[str(station_id_2)]
+        time_x = float(self.times[i, j])
+        if np.isnan(time_x):
+            raise KeyError(str(station_id_1) + '_' + str(station_id_2))
+        return [time_x, self.addresses[i], self.addresses[j]]
+
+
+def get_store(path=default_path, mmap=False):
+    # The binary form is used whenever it is at least as new as the json file
+    if path not in _stores:
+        stem = os.path.splitext(path)[0]
+        if os.path.exists(stem + ".npy") and os.path.getmtime(stem + ".npy") >= os.path.getmtime(path):
+            _stores[path] = DrivingTimeStore.load(stem, mmap=mmap)
+        else:
+            _stores[path] = DrivingTimeStore.from_json(path)
+    return _stores[path]
+
+
+def write_binary_store(path=default_path):
+    return save_store(DrivingTimeStore.from_json(path), path)
+
+
+def save_store(store, path=default_path):
+    # Writes the binary form next to path and replaces the store this process has cached for it
+    store.save(os.path.splitext(path)[0])
+    _stores[path] = store
+    return store
@@ -0,0 +1,87 @@
+import json
+import os
+import numpy as np
+from Data_processing.driving_time_store import get_store, default_path
+
+calibration_path = "Data_processing/travel_time_estimator.json"
+earth_radius = 6371.0
+
+_estimators = {}
+
+
+def haversine_matrix(latitude, longitude):
+    # Great-circle distance in km between every pair of points, in one pass
+    lat = np.radians(np.asarray(latitude, dtype=float))
+    lon = np.radians(np.asarray(longitude, dtype=float))
+    d_lat = lat[:, None] - lat[None, :]
+    d_lon = lon[:, None] - lon[None, :]
+    a = np.sin(d_lat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(d_lon / 2) ** 2
+    return 2 * earth_radius * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class TravelTimeEstimator:
+    # Driving minutes as intercept + minutes_per_km * great-circle km, zero on the diagonal.
+    # The defaults are a rough city road factor, calibrate_estimator fits both to times.json
+
+    def __init__(self, intercept=2.0, minutes_per_km=2.5, errors=None):
+        self.intercept = intercept
+        self.minutes_per_km = minutes_per_km
+        self.errors = errors
+
+    def estimate(self, latitude, longitude):
+        times = self.intercept + self.minutes_per_km * haversine_matrix(latitude, longitude)
+        np.fill_diagonal(times, 0)
+        return times
+
+    @classmethod
+    def calibrate(cls, station_ids, latitude, longitude, store):
+        # Least squares over every known off-diagonal pair of the given stations
+        known = np.array([str(station_id) in store.index for station_id in station_ids])
+        ids = [station_id for station_id, k in zip(station_ids, known) if k]
+        distances = haversine_matrix(np.asarray(latitude)[known], np.asarray(longitude)[known])
+        pos = store.positions(ids)
+        times = np.asarray(store.times[np.ix_(pos, pos)], dtype=float)
+        pairs = ~np.isnan(times) & ~np.eye(len(ids), dtype=bool)
+        x = distances[pairs]
+        y = times[pairs]
+        (intercept, minutes_per_km), *_ = np.linalg.lstsq(np.column_stack([np.ones_like(x), x]), y, rcond=None)
+        estimator = cls(float(intercept), float(minutes_per_km))
+        estimator.errors = estimator.error_report(x, y)
+        return estimator
+
+    def error_report(self, distances, times):
+        error = self.intercept + self.minutes_per_km * distances - times
+        positive = times > 0
+        return {'pairs': int(len(times)), 'mean_absolute_error': float(np.mean(np.abs(error))),
+                'root_mean_squared_error': float(np.sqrt(np.mean(error ** 2))),
+                'mean_absolute_percentage_error': float(np.mean(np.abs(error[positive]) / times[positive])),
+                'r_squared': float(1 - np.sum(error ** 2) / np.sum((times - times.mean()) ** 2))}
+
+    def save(self, path=calibration_path):
+        with open(path, 'w') as fp:
+            json.dump({'intercept': self.intercept, 'minutes_per_km': self.minutes_per_km, 'errors': self.errors},
+                      fp, indent=2)
+
+    @classmethod
+    def load(cls, path=calibration_path):
+        with open(path, 'r') as f:
+            calibration = json.load(f)
+        return cls(calibration['intercept'], calibration['minutes_per_km'], calibration.get('errors'))
+
+
+def calibrate_estimator(station_path="Data_processing/station.json", times_path=default_path, path=calibration_path):
+    with open(station_path, 'r') as f:
+        stations = json.load(f)
+    estimator = TravelTimeEstimator.calibrate(list(stations.keys()), [float(row[0]) for row in stations.values()],
+                                              [float(row[1]) for row in stations.values()], get_store(times_path))
+    estimator.save(path)
+    _estimators[path] = estimator
+    print("Travel time estimator:", estimator.errors)
+    return estimator
+
+
+def get_estimator(path=calibration_path):
+    # The saved calibration, or the default road factor when the estimator has not been calibrated yet
+    if path not in _estimators:
+        _estimators[path] = TravelTimeEstimator.load(path) if os.path.exists(path) else TravelTimeEstimator()
+    return _estimators[path]
@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from Data_processing.create_station_json import scenarios, flat_rate, battery_rate, length_time_interval, \
+    calculate_demand
+
+station_path = "Data_processing/station.json"
+state_path = "Data_processing/trip_aggregates.json"
+
+# Start of the interval of every scenario in minutes after midnight, each length_time_interval long
+interval_starts = [7*60, 9*60, 11*60, 13*60, 15*60]
+
+# Column names of the Oslo Bysykkel open data exports, the battery column is optional
+default_columns = {'started_at': 'started_at', 'ended_at': 'ended_at', 'start_station': 'start_station_id',
+                   'end_station': 'end_station_id', 'start_latitude': 'start_station_latitude',
+                   'start_longitude': 'start_station_longitude', 'battery': None}
+
+# Totals per station and scenario
+totals = ['departures', 'charged_arrivals', 'flat_arrivals', 'empty_minutes']
+
+
+class TripLogAggregator:
+    # Station rates and demand from raw trip logs, read in chunks. Departures and arrivals are counted per station,
+    # scenario interval, day and minute, and a day is closed as soon as the log has passed it: its empty minutes
+    # are found from the stock of bikes walked over the minutes, then only the totals per station and scenario are
+    # kept. Memory is bounded by the stations and the days still open, not by the length of the log, as long as the
+    # log is in order of started_at like the exports are. The totals and the days they cover are kept in a state
+    # file, so a new log adds to them and only the stations it touches are rewritten in station.json. Days that are
+    # counted already are skipped, so a log that grew since it was ingested only adds its new days.
+    # The stock at the start of an interval is the init load of station.json, raised to what the departures of the
+    # day prove was there. A station without an init load has no empty minutes, its stock is not known. Without a
+    # battery column the arrivals are split between charged and flat like read_excel splits them
+
+    def __init__(self, state=state_path, stations=station_path, columns=None, timezone=None, chunksize=100000,
+                 flat_battery=0.2):
+        self.state_path = state
+        self.station_path = stations
+        self.columns = dict(default_columns, **(columns or {}))
+        self.timezone = timezone
+        self.chunksize = chunksize
+        self.flat_battery = flat_battery
+        self.totals = {}
+        self.coordinates = {}
+        self.days = set()
+        self.ingested = {}
+        self.open_days = {}
+        self.closed_days = set()
+        self.late_rows = 0
+        self.skipped_rows = 0
+        if state is not None and os.path.exists(state):
+            with open(state, 'r') as fp:
+                saved = json.load(fp)
+            self.totals = {station: np.array(values, dtype=float) for station, values in saved['totals'].items()}
+            self.coordinates = saved['coordinates']
+            self.days = set(saved['days'])
+            self.ingested = saved['ingested']
+        self.counted_days = set(self.days)
+        self.station_file = {}
+        if stations is not None and os.path.exists(stations):
+            with open(stations, 'r') as fp:
+                self.station_file = json.load(fp)
+
+    def start_stock(self, station, scenario):
+        entry = self.station_file.get(station)
+        if entry is None or scenario not in entry[2]:
+            return np.nan
+        return entry[2][scenario][0] + entry[2][scenario][1]
+
+    def timestamps(self, values):
+        times = pd.to_datetime(values)
+        if self.timezone is not None:
+            times = (times.dt.tz_localize('UTC') if times.dt.tz is None else times).dt.tz_convert(self.timezone)
+        return times
+
+    def events(self, station, times, departures, charged, flat):
+        # (day, station, scenario, minute of the interval) with the counts, for the events inside an interval
+        minute = (times.dt.hour * 60 + times.dt.minute).to_numpy()
+        scenario = np.searchsorted(interval_starts, minute, side='right') - 1
+        offset = minute - np.asarray(interval_starts)[np.maximum(scenario, 0)]
+        inside = (scenario >= 0) & (offset < length_time_interval)
+        frame = pd.DataFrame({'day': times.dt.strftime('%Y-%m-%d').to_numpy(), 'station': station.to_numpy(),
+                              'scenario': scenario, 'minute': offset, 'departures': departures,
+                              'charged_arrivals': charged, 'flat_arrivals': flat})
+        return frame[inside]
+
+    def add_chunk(self, chunk):
+        c = self.columns
+        chunk = chunk.dropna(subset=[c['started_at'], c['ended_at'], c['start_station'], c['end_station']])
+        started = self.timestamps(chunk[c['started_at']])
+        ended = self.timestamps(chunk[c['ended_at']])
+        start_station = chunk[c['start_station']].astype('int64').astype(str)
+        end_station = chunk[c['end_station']].astype('int64').astype(str)
+        n = len(chunk)
+        if c['battery'] is not None and c['battery'] in chunk:
+            charged = (chunk[c['battery']].to_numpy(dtype=float) > self.flat_battery).astype(float)
+            flat = 1 - charged
+        else:
+            charged = np.full(n, battery_rate)
+            flat = np.full(n, flat_rate)
+        frame = pd.concat([self.events(start_station, started, np.ones(n), np.zeros(n), np.zeros(n)),
+                           self.events(end_station, ended, np.zeros(n), charged, flat)])
+        if c['start_latitude'] in chunk and c['start_longitude'] in chunk:
+            last = chunk.drop_duplicates(c['start_station'], keep='last')
+            for station, latitude, longitude in zip(last[c['start_station']].astype('int64').astype(str),
+                                                    last[c['start_latitude']], last[c['start_longitude']]):
+                self.coordinates[station] = [float(latitude), float(longitude)]
+        self.days.update(started.dt.strftime('%Y-%m-%d').unique())
+
+        counted = frame['day'].isin(self.counted_days)
+        self.skipped_rows += int(counted.sum())
+        late = frame['day'].isin(self.closed_days) & ~counted
+        self.late_rows += int(late.sum())
+        grouped = frame[~late & ~counted].groupby(['day', 'station', 'scenario', 'minute'], sort=False).sum()
+        for day, counts in grouped.groupby(level='day', sort=False):
+            self.open_days.setdefault(day, []).append(counts.droplevel('day'))
+        if n:
+            # Trips started later cannot add events to the days before
+            self.close_days(started.min().strftime('%Y-%m-%d'))
+
+    def close_days(self, before=None):
+        for day in sorted(self.open_days):
+            if before is not None and day >= before:
+                break
+            counts = pd.concat(self.open_days.pop(day))
+            counts = counts.groupby(level=['station', 'scenario', 'minute']).sum()
+            self.close_day(counts)
+            self.closed_days.add(day)
+
+    def close_day(self, counts):
+        station_ids, station = np.unique(counts.index.get_level_values('station'), return_inverse=True)
+        scenario = counts.index.get_level_values('scenario').to_numpy()
+        minute = counts.index.get_level_values('minute').to_numpy()
+        shape = (len(station_ids), len(scenarios), length_time_interval)
+        net = np.zeros(shape)
+        np.add.at(net, (station, scenario, minute), counts['charged_arrivals'].to_numpy()
+                  + counts['flat_arrivals'].to_numpy() - counts['departures'].to_numpy())
+        active = np.zeros(shape[:2], dtype=bool)
+        active[station, scenario] = True
+        stock = np.cumsum(net, axis=2)
+        known = np.array([[self.start_stock(station_id, name) for name in scenarios] for station_id in station_ids])
+        start = np.maximum(known, -np.minimum(stock.min(axis=2), 0))
+        empty = np.where(active & ~np.isnan(known), ((start[:, :, None] + stock) <= 1e-9).sum(axis=2), 0)
+
+        day_totals = np.zeros((len(station_ids), len(scenarios), len(totals)))
+        for k, name in enumerate(totals[:-1]):
+            np.add.at(day_totals[:, :, k], (station, scenario), counts[name].to_numpy())
+        day_totals[:, :, -1] = empty
+        for station_id, values in zip(station_ids, day_totals):
+            self.totals[station_id] = self.totals.get(station_id, 0) + values
+
+    def ingest(self, path):
+        # A log that was ingested before with the same size is skipped, so a directory can be ingested again
+        size = os.path.getsize(path)
+        if self.ingested.get(os.path.abspath(path)) == size:
+            print("Skipping", path)
+            return False
+        self.counted_days = set(self.days)
+        c = self.columns
+        names = [name for name in c.values() if name is not None]
+        for chunk in pd.read_csv(path, chunksize=self.chunksize, usecols=lambda column: column in names):
+            self.add_chunk(chunk)
+        self.close_days()
+        self.ingested[os.path.abspath(path)] = size
+        return True
+
+    def rates(self):
+        # station id -> scenario -> [incoming_battery_rate, incoming_flat_rate, outgoing_rate, demand], per minute
+        # like read_excel, averaged over the days of the logs
+        n_days = max(1, len(self.days))
+        rates = {}
+        for station, values in self.totals.items():
+            daily = (values / n_days).tolist()
+            rates[station] = {}
+            for k, scenario in enumerate(scenarios):
+                departures, charged, flat, empty = daily[k]
+                if empty > length_time_interval:
+                    print("Station {} scenario {}: {:.1f} empty minutes per day, more than the interval".format(
+                        station, scenario, empty))
+                    empty = length_time_interval
+                rates[station][scenario] = [round(charged / length_time_interval, 3),
+                                            round(flat / length_time_interval, 3),
+                                            round(departures / length_time_interval, 3),
+                                            calculate_demand(departures, min(empty, length_time_interval - 1))]
+        return rates
+
+    def update_station_file(self, path=None):
+        # Only the rates of the stations in the logs change, init loads are kept. New stations start empty and get
+        # their coordinates from the logs. Returns the number of stations that changed
+        path = path or self.station_path
+        changed = 0
+        for station, station_rates in self.rates().items():
+            entry = self.station_file.get(station)
+            if entry is None:
+                if station not in self.coordinates:
+                    continue
+                entry = self.coordinates[station] + [{}]
+            updated = {scenario: entry[2].get(scenario, [0, 0])[:2] + values
+                       for scenario, values in station_rates.items()}
+            if updated != entry[2]:
+                self.station_file[station] = entry[:2] + [updated]
+                changed += 1
+        if changed:
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, 'w') as fp:
+                json.dump(self.station_file, fp)
+            os.replace(tmp_path, path)
+        return changed
+
+    def save(self):
+        saved = {'totals': {station: values.tolist() for station, values in self.totals.items()},
+                 'coordinates': self.coordinates, 'days': sorted(self.days), 'ingested': self.ingested}
+        tmp_path = "{}.{}.tmp".format(self.state_path, os.getpid())
+        with open(tmp_path, 'w') as fp:
+            json.dump(saved, fp)
+        os.replace(tmp_path, self.state_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Update station.json from raw trip logs")
+    parser.add_argument('logs', nargs='+', help="trip log csv files")
+    parser.add_argument('--stations', default=station_path)
+    parser.add_argument('--state', default=state_path)
+    parser.add_argument('--timezone', default='Europe/Oslo')
+    parser.add_argument('--battery-column', default=None)
+    parser.add_argument('--chunksize', type=int, default=100000)
+    args = parser.parse_args()
+
+    aggregator = TripLogAggregator(args.state, args.stations, {'battery': args.battery_column}, args.timezone,
+                                   args.chunksize)
+    for log in args.logs:
+        aggregator.ingest(log)
+    if aggregator.late_rows:
+        print(aggregator.late_rows, "events fell on days that were already closed and were left out")
+    if aggregator.skipped_rows:
+        print(aggregator.skipped_rows, "events fell on days that were counted before and were skipped")
+    print(aggregator.update_station_file(), "stations updated")
+    aggregator.save()
@@ -1,6 +1,9 @@
 
 class DynamicFileVariables:
 
+    __slots__ = ('start_stations', 'init_vehicle_load', 'init_station_load', 'init_flat_station_load', 'ideal_state',
+                 'driving_to_start', 'demand', 'incoming_rate', 'incoming_flat_rate')
+
     def __init__(self):
         self.start_stations = [3, 4]
         self.init_vehicle_load = [5, 6]
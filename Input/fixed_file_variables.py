@@ -1,6 +1,11 @@
 
 class FixedFileVariables:
 
+    __slots__ = ('stations', 'vehicles', 'time_horizon', 'vehicle_cap', 'station_cap', 'driving_times', 'parking_time',
+                 'handling_time', 'M_1', 'M_2', 'M_3', 'M_4', 'M_5', 'M_6', 'M_7', 'M_7A', 'M_7B', 'M_8', 'M_8A',
+                 'M_8B', 'M_9', 'M_10', 'M_11', 'M_12', 'M_13', 'M_14', 'w_dev_reward', 'w_driving_time',
+                 'w_violation', 'w_dev_obj', 'w_reward', 'demand_scenario', 'initial_size')
+
     def __init__(self):
         self.stations = [0, 1, 2, 3, 4, 5]
         self.vehicles = [0, 1]
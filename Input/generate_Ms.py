@@ -3,142 +3,102 @@ import numpy as np
 
 class GenMs:
 
-    def __init__(self, fixed, dynamic):
+    def __init__(self, fixed, dynamic, arc_mask=None):
         self.fixed = fixed
         self.dynamic = dynamic
+        self.driving_times = np.asarray(self.fixed.driving_times, dtype=float)
+        # With a sparse arc set the longest driving times are taken over the kept arcs only
+        if arc_mask is None:
+            self.arc_times = self.driving_times
+        else:
+            self.arc_times = np.where(arc_mask, self.driving_times, 0)
+        self.station_cap = np.asarray(self.fixed.station_cap, dtype=float)
+        self.vehicle_cap = np.asarray(self.fixed.vehicle_cap, dtype=float)
+        self.max_qv = max(self.fixed.vehicle_cap)
+        self.max_t = self.get_max_t()
         self.set_all_Ms()
 
     def get_max_t(self):
-        max_t = []
-        for station in self.fixed.stations:
-            time_horizon = self.fixed.time_horizon
-            handling_time = self.fixed.handling_time
-            max_Qv = max(self.fixed.vehicle_cap)
-            max_Qs = max(self.fixed.station_cap)
-            max_qB = min(max_Qv, max_Qs)
-            park_time = self.fixed.parking_time
-            max_dist = np.amax(self.fixed.driving_times, axis=0)[station]
-            max_t_st = time_horizon + handling_time*max_qB + park_time + max_dist
-            max_t.append(max_t_st)
-        return max_t
+        max_qB = min(self.max_qv, max(self.fixed.station_cap))
+        base = self.fixed.time_horizon + self.fixed.handling_time*max_qB + self.fixed.parking_time
+        return base + np.amax(self.arc_times, axis=0)
 
     def getM_1(self):
-        M_1 = []
-        max_t_array = self.get_max_t()
-        park_time = self.fixed.parking_time
-        handling_time = self.fixed.handling_time
-        for i in range (len(self.fixed.stations)):
-            i_list = []
-            max_t_i = max_t_array[i]
-            max_qv = max(self.fixed.vehicle_cap)
-            max_qs = self.fixed.station_cap[i]
-            max_qb = min(max_qv, max_qs)
-            for j in range(len(self.fixed.stations)):
-                max_t_j = 0
-                d_time = self.fixed.driving_times[i][j]
-                j_val = max_t_i + park_time + handling_time*max_qb + d_time - max_t_j
-                i_list.append(j_val)
-            M_1.append(i_list)
+        # max_t_j is taken as 0 for every j
+        max_qb = np.minimum(self.max_qv, self.station_cap)
+        M_1 = (self.max_t + self.fixed.parking_time + self.fixed.handling_time*max_qb)[:, None] + self.driving_times
         return M_1
 
-
     def getM_2(self):
-        M_2 = np.array(self.get_max_t()) - self.fixed.time_horizon
-        M_2 = list(M_2)
+        M_2 = self.max_t - self.fixed.time_horizon
         return M_2
 
     def getM_3(self):
-        M_3 = self.get_max_t()
+        M_3 = self.max_t.copy()
         return M_3
 
     def getM_4(self):
-        M_4 = max(self.fixed.vehicle_cap)
+        M_4 = self.max_qv
         return M_4
 
     def getM_5(self):
-        max_qv = max(self.fixed.vehicle_cap)
-        max_qs = max(self.fixed.station_cap)
-        res = min(max_qv, max_qs)
+        res = min(self.max_qv, max(self.fixed.station_cap))
         M_5 = 2*res
         return M_5
 
     def getM_6(self):
-        M_6 = self.get_max_t()
+        M_6 = self.max_t.copy()
         return M_6
 
     def getM_7A(self):
-        batt_flow = self.dynamic.incoming_rate
-        init_load = self.dynamic.init_station_load
         T = self.fixed.time_horizon
-        viol = np.array(self.dynamic.demand) * T
-        M_7A = list(np.array(init_load) + np.array(batt_flow) * T + viol)
+        viol = np.asarray(self.dynamic.demand) * T
+        M_7A = np.asarray(self.dynamic.init_station_load) + np.asarray(self.dynamic.incoming_rate) * T + viol
         return M_7A
 
     def getM_7B(self):
-        flat_flow = self.dynamic.incoming_flat_rate
-        init_flat_load = self.dynamic.init_flat_station_load
         T = self.fixed.time_horizon
-        M_7B= list(np.array(init_flat_load) + np.array(flat_flow) * T)
+        M_7B = np.asarray(self.dynamic.init_flat_station_load) + np.asarray(self.dynamic.incoming_flat_rate) * T
         return M_7B
 
     def getM_8A(self):
-        M_8A = []
-        Q_s = self.fixed.station_cap
-        batt_flow = self.dynamic.incoming_rate
         T = self.fixed.time_horizon
-        viol = np.array(self.dynamic.demand) * T
-        for i in range (len(self.fixed.stations)):
-            max_qv = max(self.fixed.vehicle_cap)
-            max_qs = self.fixed.station_cap[i]
-            max_qb = min(max_qv, max_qs)
-            M_8A.append(Q_s[i] + max_qb + batt_flow[i] * T + viol[i])
+        viol = np.asarray(self.dynamic.demand) * T
+        max_qb = np.minimum(self.max_qv, self.station_cap)
+        M_8A = self.station_cap + max_qb + np.asarray(self.dynamic.incoming_rate) * T + viol
         return M_8A
 
     def getM_8B(self):
-        Q_s = self.fixed.station_cap
-        flat_flow = self.dynamic.incoming_flat_rate
-        T = self.fixed.time_horizon
-        M_8B = list(Q_s + np.array(flat_flow) * T)
+        M_8B = self.station_cap + np.asarray(self.dynamic.incoming_flat_rate) * self.fixed.time_horizon
         return M_8B
 
     def getM_9(self):
-        station_cap = self.fixed.station_cap
-        flow_batt = np.array(self.dynamic.incoming_rate)
-        time = np.array(self.get_max_t()) - self.fixed.time_horizon
-        M_9 = list((np.array(station_cap) + flow_batt*time))
+        time = self.max_t - self.fixed.time_horizon
+        M_9 = self.station_cap + np.asarray(self.dynamic.incoming_rate)*time
         return M_9
 
     def getM_10(self):
-        station_cap = self.fixed.station_cap
-        flow_flat = self.dynamic.incoming_flat_rate
-        time = np.array(self.get_max_t()) - self.fixed.time_horizon
-        M_10 = list(np.array(station_cap) + flow_flat*time)
+        time = self.max_t - self.fixed.time_horizon
+        M_10 = self.station_cap + np.asarray(self.dynamic.incoming_flat_rate)*time
         return M_10
 
     def getM_11(self):
-        M_11 = list(np.absolute(self.dynamic.demand) * self.fixed.time_horizon)
+        M_11 = np.absolute(self.dynamic.demand) * self.fixed.time_horizon
         return M_11
 
     def getM_12(self):
-        M_12 = list(np.absolute(self.dynamic.demand) * (np.array(self.get_max_t())-self.fixed.time_horizon))
+        M_12 = np.absolute(self.dynamic.demand) * (self.max_t - self.fixed.time_horizon)
         return M_12
 
     def getM_13(self):
-        M_13 = list(np.absolute(self.dynamic.demand) * (np.array(self.get_max_t()) - self.fixed.time_horizon))
+        M_13 = np.absolute(self.dynamic.demand) * (self.max_t - self.fixed.time_horizon)
         return M_13
 
     def getM_14(self):
-        max_tv = []
-        for vehicle in self.fixed.vehicles:
-            handling_time = self.fixed.handling_time
-            max_Qv = self.fixed.vehicle_cap[vehicle]
-            max_Qs = max(self.fixed.station_cap)
-            max_qB = min(max_Qv, max_Qs)
-            park_time = self.fixed.parking_time
-            max_dist = np.amax(self.fixed.driving_times)
-            tv = park_time + handling_time * max_qB + max_dist
-            max_tv.append(tv - 0 + self.fixed.time_horizon)
-        return max_tv
+        max_qB = np.minimum(self.vehicle_cap, max(self.fixed.station_cap))
+        tv = self.fixed.parking_time + self.fixed.handling_time * max_qB + np.amax(self.arc_times)
+        M_14 = tv - 0 + self.fixed.time_horizon
+        return M_14
 
     def set_all_Ms(self):
         self.fixed.M_1 = self.getM_1()
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import numpy as np
+from Data_processing.driving_time_store import default_path
+from Data_processing.travel_time_estimator import calibration_path
+from Input.instance_generator import Instance
+from Input.fixed_file_variables import FixedFileVariables
+from Input.dynamic_file_variables import DynamicFileVariables
+from Input.station import StationArrays
+
+cache_dir = "Input/instance_cache"
+last_instance_path = "Input/input_params.npz"
+
+station_fields = ['latitude', 'longitude', 'init_station_load', 'init_flat_station_load', 'incoming_rate',
+                  'incoming_flat_rate', 'outgoing_rate', 'demand']
+
+
+def time_files_stamp(path=default_path):
+    # Modification time and size of the files the driving times are read from, a refetch or a new calibration
+    # changes them
+    stem = os.path.splitext(path)[0]
+    stamp = []
+    for name in (path, stem + ".npy", stem + "_index.json", calibration_path):
+        if os.path.exists(name):
+            stat = os.stat(name)
+            stamp.append([name, stat.st_mtime_ns, stat.st_size])
+    return stamp
+
+
+def instance_key(stations, **params):
+    # Hash of the generation parameters and of the data of the selected stations, so a changed station.json
+    # gives a new key. Unless the times only come from the coordinates, a changed time store does too
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode())
+    digest.update(json.dumps(stations.ids).encode())
+    for name in station_fields:
+        digest.update(np.ascontiguousarray(getattr(stations, name), dtype=float).tobytes())
+    if params.get('time_mode') != 'haversine':
+        digest.update(json.dumps(time_files_stamp()).encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_path(key, directory=cache_dir):
+    return os.path.join(directory, key + ".npz")
+
+
+def save_instance(instance, path):
+    # Every slot of the fixed and dynamic variables and the station arrays, written atomically
+    arrays = {'n_stations': instance.n_stations, 'n_vehicles': instance.n_vehicles,
+              'estimated_pairs': getattr(instance, 'estimated_pairs', -1),
+              'stations.ids': np.array(instance.stations.ids),
+              'stations.addresses': np.array([address or '' for address in instance.stations.addresses])}
+    for name in station_fields:
+        arrays['stations.' + name] = getattr(instance.stations, name)
+    for prefix, variables in (('fixed.', instance.fixed), ('dynamic.', instance.dynamic)):
+        for name in variables.__slots__:
+            if hasattr(variables, name):
+                arrays[prefix + name] = np.asarray(getattr(variables, name))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, 'wb') as fp:
+        np.savez(fp, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_instance(path):
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+
+    def value(name):
+        # 0-d arrays go back to Python scalars, the index sets back to lists
+        array = arrays[name]
+        if array.ndim == 0:
+            return array.item()
+        if name in ('fixed.stations', 'fixed.vehicles'):
+            return array.tolist()
+        return array
+
+    instance = Instance.__new__(Instance)
+    instance.n_stations = value('n_stations')
+    instance.n_vehicles = value('n_vehicles')
+    # -1 and older files without the count: not known
+    instance.estimated_pairs = value('estimated_pairs') if 'estimated_pairs' in arrays else -1
+    if instance.estimated_pairs == -1:
+        instance.estimated_pairs = None
+    instance.stations = StationArrays(arrays['stations.ids'].tolist(),
+                                      *(arrays['stations.' + name] for name in station_fields))
+    instance.stations.addresses = [address or None for address in arrays['stations.addresses'].tolist()]
+    instance.fixed = FixedFileVariables()
+    instance.dynamic = DynamicFileVariables()
+    for prefix, variables in (('fixed.', instance.fixed), ('dynamic.', instance.dynamic)):
+        for name in variables.__slots__:
+            if prefix + name in arrays:
+                setattr(variables, name, value(prefix + name))
+    instance.gen_ms = None
+    return instance
+
+
+def cached_instance(key, build, directory=cache_dir):
+    # Loads the instance stored under key, or builds and stores it
+    path = cache_path(key, directory)
+    if os.path.exists(path):
+        return load_instance(path)
+    instance = build()
+    save_instance(instance, path)
+    return instance
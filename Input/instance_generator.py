@@ -1,17 +1,29 @@
 from Input.fixed_file_variables import FixedFileVariables
 from Input.dynamic_file_variables import DynamicFileVariables
+import copy
 import numpy as np
-from Data_processing.Google_API import get_driving_time_from_id
+from Data_processing.driving_time_store import get_store
+from Data_processing.travel_time_estimator import get_estimator, TravelTimeEstimator
 from Input.generate_Ms import GenMs
+from Input.station import StationArrays
+
+
+def as_list(value):
+    return value.tolist() if isinstance(value, np.ndarray) else value
 
 
 class Instance:
+    # stations is a StationArrays (or a list of Station objects) with the depot first. Every station and
+    # vehicle parameter is stored as one contiguous array on the fixed and dynamic variables
 
     def __init__(self, n_stations, n_vehicles, n_time_hor, stations, scenario='A', initial_size=20, station_cap=30,
                  vehicle_cap=10, ideal_state=5, w_violation=0.8, w_dev_obj=0.1, w_reward=0.1, w_dev_reward=0.8,
-                 w_driving_time=0.2):
+                 w_driving_time=0.2, write_file=True, time_mode='store'):
         self.n_stations = n_stations
         self.n_vehicles = n_vehicles
+        if not isinstance(stations, StationArrays):
+            stations = StationArrays.from_stations(stations)
+        self.stations = stations
 
         self.fixed = FixedFileVariables()
         self.fixed.time_horizon = n_time_hor
@@ -32,32 +44,56 @@ class Instance:
         self.set_ideal_state(ideal_state)
 
         self.set_station_rates(stations)
-        self.set_time_matrix(stations)
+        self.set_time_matrix(stations, time_mode)
 
         self.set_init_vehicle_load(vehicle_cap//2)
         self.set_start_stations()
         self.set_time_to_start()
 
         self.gen_ms = GenMs(self.fixed, self.dynamic)
-        self.write_to_file()
-
-    def set_time_matrix(self, station_obj):
+        if write_file:
+            self.write_to_file()
+
+    def set_time_matrix(self, stations, time_mode='store'):
+        # Only the upper triangle is looked up and mirrored, the artificial end station keeps zero times.
+        # time_mode 'store' only uses times.json and fails on a missing pair, 'fallback' estimates the pairs
+        # missing from it from the coordinates and 'estimate' estimates every pair. 'haversine' estimates every
+        # pair with the uncalibrated road factor without reading times.json, so the times only depend on the
+        # coordinates. estimated_pairs counts the pairs that are not from times.json
+        ids = stations.ids[:self.n_stations-1]
+        latitude = stations.latitude[:self.n_stations-1]
+        longitude = stations.longitude[:self.n_stations-1]
+        pairs = len(ids) * (len(ids) - 1) // 2
+        store = None
+        if time_mode == 'haversine':
+            sub = TravelTimeEstimator().estimate(latitude, longitude)
+            self.estimated_pairs = pairs
+        else:
+            store = get_store()
+            if time_mode == 'store':
+                sub = store.get_sub_matrix(ids)
+                self.estimated_pairs = 0
+            elif time_mode == 'estimate':
+                sub = get_estimator().estimate(latitude, longitude)
+                self.estimated_pairs = pairs
+            else:
+                sub = store.get_partial_sub_matrix(ids)
+                missing = np.isnan(sub)
+                self.estimated_pairs = int(np.triu(missing, 1).sum())
+                if missing.any():
+                    print("Estimated driving times for {} of {} station pairs missing from the store".format(
+                        self.estimated_pairs, pairs))
+                    sub[missing] = get_estimator().estimate(latitude, longitude)[missing]
+        # Python's round keeps the times identical to the ones computed pair by pair
+        sub = np.triu(np.array([round(time_x, 1) for time_x in sub.ravel().tolist()]).reshape(sub.shape), 1)
         matrix = np.zeros((self.n_stations, self.n_stations))
-        for i in range(self.n_stations-1):
-            for j in range(i, self.n_stations-1):
-                if i == j:
-                    continue
-                else:
-                    google_response = get_driving_time_from_id(station_obj[i].id, station_obj[j].id)
-                    time_x = round(google_response[0], 1)
-                    matrix[i][j] = time_x
-                    matrix[j][i] = time_x
-                    station_obj[i].address = google_response[1]
-                    station_obj[j].address = google_response[2]
+        matrix[:-1, :-1] = sub + sub.T
+        if store is not None:
+            stations.addresses[:self.n_stations-1] = store.get_addresses(ids)
         self.fixed.driving_times = matrix
 
     def set_time_to_start(self):
-        self.dynamic.driving_to_start = [0] * self.n_vehicles
+        self.dynamic.driving_to_start = np.zeros(self.n_vehicles)
 
     def set_stations(self):
         self.fixed.stations = [i for i in range(self.n_stations)]
@@ -72,79 +108,110 @@ class Instance:
                 start.append(i+1)
             else:
                 start.append(0)
-        self.dynamic.start_stations = start
+        self.dynamic.start_stations = np.array(start, dtype=int)
 
     def set_vehicle_cap(self, cap):
-        self.fixed.vehicle_cap = [0] * self.n_vehicles
-        for i in range(self.n_vehicles):
-            self.fixed.vehicle_cap[i] = cap
+        self.fixed.vehicle_cap = np.full(self.n_vehicles, cap, dtype=float)
 
     def set_init_vehicle_load(self, load):
-        self.dynamic.init_vehicle_load = [load for i in self.fixed.vehicles]
+        self.dynamic.init_vehicle_load = np.full(self.n_vehicles, load, dtype=float)
+
+    def swap_station_array(self, values):
+        # The depot and the artificial end station keep zeros
+        array = np.zeros(self.n_stations)
+        array[1:-1] = values
+        return array
 
     def set_station_cap(self, cap):
-        self.fixed.station_cap = [0] * self.n_stations
-        for i in self.fixed.stations[1:-1]:
-            self.fixed.station_cap[i] = cap
-
-    def set_station_rates(self, station_obj):
-        self.dynamic.demand = [0] * self.n_stations
-        self.dynamic.incoming_rate = [0] * self.n_stations
-        self.dynamic.incoming_flat_rate = [0] * self.n_stations
-        self.dynamic.init_flat_station_load = [0] * self.n_stations
-        self.dynamic.init_station_load = [0] * self.n_stations
-        for station in self.fixed.stations[1:-1]:
-            self.dynamic.demand[station] = station_obj[station].demand
-            self.dynamic.incoming_rate[station] = station_obj[station].battery_rate
-            self.dynamic.incoming_flat_rate[station] = station_obj[station].flat_rate
-            self.dynamic.init_station_load[station] = station_obj[station].init_station_load
-            self.dynamic.init_flat_station_load[station] = station_obj[station].init_flat_station_load
+        self.fixed.station_cap = self.swap_station_array(cap)
+
+    def set_station_rates(self, stations, dynamic=None):
+        if dynamic is None:
+            dynamic = self.dynamic
+        swap = slice(1, self.n_stations-1)
+        dynamic.demand = self.swap_station_array(stations.demand[swap])
+        dynamic.incoming_rate = self.swap_station_array(stations.incoming_rate[swap])
+        dynamic.incoming_flat_rate = self.swap_station_array(stations.incoming_flat_rate[swap])
+        dynamic.init_station_load = self.swap_station_array(stations.init_station_load[swap])
+        dynamic.init_flat_station_load = self.swap_station_array(stations.init_flat_station_load[swap])
+
+    def scenario_dynamic(self, stations):
+        # A copy of the dynamic variables with the loads and rates of stations, which holds the same stations
+        # in another demand scenario. Start stations, vehicle loads and ideal states are kept
+        dynamic = copy.copy(self.dynamic)
+        self.set_station_rates(stations, dynamic)
+        return dynamic
 
     def set_ideal_state(self, ideal):
-        self.dynamic.ideal_state = [0] * self.n_stations
-        for station in self.fixed.stations[1:-1]:
-            self.dynamic.ideal_state[station] = ideal
+        self.dynamic.ideal_state = self.swap_station_array(ideal)
+
+    def sub_instance(self, rows, vehicles):
+        # The instance on the swap stations at rows with the given vehicles, between the depot and the end
+        # station. The start station of every vehicle has to be among rows or be the depot
+        index = np.concatenate(([0], rows, [self.n_stations - 1])).astype(int)
+        vehicles = list(vehicles)
+        sub = Instance.__new__(Instance)
+        sub.n_stations = len(index)
+        sub.n_vehicles = len(vehicles)
+        sub.stations = self.stations.take(index[:-1])
+        sub.fixed = copy.copy(self.fixed)
+        sub.fixed.stations = [i for i in range(sub.n_stations)]
+        sub.fixed.vehicles = [v for v in range(sub.n_vehicles)]
+        sub.fixed.station_cap = np.asarray(self.fixed.station_cap)[index]
+        sub.fixed.vehicle_cap = np.asarray(self.fixed.vehicle_cap)[vehicles]
+        sub.fixed.driving_times = np.asarray(self.fixed.driving_times)[np.ix_(index, index)]
+        sub.dynamic = copy.copy(self.dynamic)
+        for name in ('init_station_load', 'init_flat_station_load', 'ideal_state', 'demand', 'incoming_rate',
+                     'incoming_flat_rate'):
+            setattr(sub.dynamic, name, np.asarray(getattr(self.dynamic, name))[index])
+        position = {int(station): k for k, station in enumerate(index)}
+        sub.dynamic.start_stations = np.array([position[int(self.dynamic.start_stations[v])] for v in vehicles],
+                                              dtype=int)
+        sub.dynamic.init_vehicle_load = np.asarray(self.dynamic.init_vehicle_load)[vehicles]
+        sub.dynamic.driving_to_start = np.asarray(self.dynamic.driving_to_start)[vehicles]
+        sub.gen_ms = GenMs(sub.fixed, sub.dynamic)
+        return sub
 
     def write_to_file(self):
         f = open("Input/input_params.txt", 'w')
         f.write("------------ FIXED ------------------------ \n")
-        f.write("self.stations = " + str(self.fixed.stations) + "\n")
-        f.write("self.vehicles = " + str(self.fixed.vehicles) + "\n")
-        f.write("self.time_horizon = " + str(self.fixed.time_horizon) + "\n")
-        f.write("self.vehicle_cap = " + str(self.fixed.vehicle_cap) + "\n")
-        f.write("self.station_cap = " + str(self.fixed.station_cap) + "\n")
-        f.write("self.driving_times = " + repr(self.fixed.driving_times) + "\n")
-        f.write("self.parking_time = " + str(self.fixed.parking_time) + "\n")
-        f.write("self.handling_time = " + str(self.fixed.handling_time) + "\n")
-        f.write("self.M_1 = " + str(self.fixed.M_1) + "\n")
-        f.write("self.M_2 = " + str(self.fixed.M_2) + "\n")
-        f.write("self.M_3 = " + str(self.fixed.M_3) + "\n")
-        f.write("self.M_4 = " + str(self.fixed.M_4) + "\n")
-        f.write("self.M_5 = " + str(self.fixed.M_5) + "\n")
-        f.write("self.M_6 = " + str(self.fixed.M_6) + "\n")
-        f.write("self.M_7A = " + str(self.fixed.M_7A) + "\n")
-        f.write("self.M_7B = " + str(self.fixed.M_7B) + "\n")
-        f.write("self.M_8A = " + str(self.fixed.M_8A) + "\n")
-        f.write("self.M_8B = " + str(self.fixed.M_8B) + "\n")
-        f.write("self.M_9 = " + str(self.fixed.M_9) + "\n")
-        f.write("self.M_10 = " + str(self.fixed.M_10) + "\n")
-        f.write("self.M_11 = " + str(self.fixed.M_11) + "\n")
-        f.write("self.M_12 = " + str(self.fixed.M_12) + "\n")
-        f.write("self.M_13 = " + str(self.fixed.M_13) + "\n")
-        f.write("self.M_14 = " + str(self.fixed.M_14) + "\n")
-        f.write("Reward weight deviation = " + str(self.fixed.w_dev_reward) + "\n")
-        f.write("Reward weight driving time = " + str(self.fixed.w_driving_time) + "\n")
-        f.write("Weight deviation = " + str(self.fixed.w_dev_obj) + "\n")
-        f.write("Weight violation = " + str(self.fixed.w_violation) + "\n")
-        f.write("Weight reward = " + str(self.fixed.w_reward) + "\n \n")
+        f.write("self.stations = " + str(as_list(self.fixed.stations)) + "\n")
+        f.write("self.vehicles = " + str(as_list(self.fixed.vehicles)) + "\n")
+        f.write("self.time_horizon = " + str(as_list(self.fixed.time_horizon)) + "\n")
+        f.write("self.vehicle_cap = " + str(as_list(self.fixed.vehicle_cap)) + "\n")
+        f.write("self.station_cap = " + str(as_list(self.fixed.station_cap)) + "\n")
+        f.write("self.driving_times = " + str(as_list(self.fixed.driving_times)) + "\n")
+        f.write("self.parking_time = " + str(as_list(self.fixed.parking_time)) + "\n")
+        f.write("self.handling_time = " + str(as_list(self.fixed.handling_time)) + "\n")
+        f.write("self.M_1 = " + str(as_list(self.fixed.M_1)) + "\n")
+        f.write("self.M_2 = " + str(as_list(self.fixed.M_2)) + "\n")
+        f.write("self.M_3 = " + str(as_list(self.fixed.M_3)) + "\n")
+        f.write("self.M_4 = " + str(as_list(self.fixed.M_4)) + "\n")
+        f.write("self.M_5 = " + str(as_list(self.fixed.M_5)) + "\n")
+        f.write("self.M_6 = " + str(as_list(self.fixed.M_6)) + "\n")
+        f.write("self.M_7A = " + str(as_list(self.fixed.M_7A)) + "\n")
+        f.write("self.M_7B = " + str(as_list(self.fixed.M_7B)) + "\n")
+        f.write("self.M_8A = " + str(as_list(self.fixed.M_8A)) + "\n")
+        f.write("self.M_8B = " + str(as_list(self.fixed.M_8B)) + "\n")
+        f.write("self.M_9 = " + str(as_list(self.fixed.M_9)) + "\n")
+        f.write("self.M_10 = " + str(as_list(self.fixed.M_10)) + "\n")
+        f.write("self.M_11 = " + str(as_list(self.fixed.M_11)) + "\n")
+        f.write("self.M_12 = " + str(as_list(self.fixed.M_12)) + "\n")
+        f.write("self.M_13 = " + str(as_list(self.fixed.M_13)) + "\n")
+        f.write("self.M_14 = " + str(as_list(self.fixed.M_14)) + "\n")
+        f.write("Reward weight deviation = " + str(as_list(self.fixed.w_dev_reward)) + "\n")
+        f.write("Reward weight driving time = " + str(as_list(self.fixed.w_driving_time)) + "\n")
+        f.write("Weight deviation = " + str(as_list(self.fixed.w_dev_obj)) + "\n")
+        f.write("Weight violation = " + str(as_list(self.fixed.w_violation)) + "\n")
+        f.write("Weight reward = " + str(as_list(self.fixed.w_reward)) + "\n \n")
 
         f.write("------------ DYNAMIC ------------------------ \n")
-        f.write("self.start_stations = " + str(self.dynamic.start_stations) + "\n")
-        f.write("self.init_vehicle_load = " + str(self.dynamic.init_vehicle_load) + "\n")
-        f.write("self.init_station_load = " + str(self.dynamic.init_station_load) + "\n")
-        f.write("self.init_flat_station_load = " + str(self.dynamic.init_flat_station_load) + "\n")
-        f.write("self.ideal_state = " + str(self.dynamic.ideal_state) + "\n")
-        f.write("self.driving_to_start = " + str(self.dynamic.driving_to_start) + "\n")
-        f.write("self.demand = " + str(self.dynamic.demand) + "\n")
-        f.write("self.incoming_rate = " + str(self.dynamic.incoming_rate) + "\n")
-        f.write("self.incoming_flat_rate = " + str(self.dynamic.incoming_flat_rate) + "\n")
+        f.write("self.start_stations = " + str(as_list(self.dynamic.start_stations)) + "\n")
+        f.write("self.init_vehicle_load = " + str(as_list(self.dynamic.init_vehicle_load)) + "\n")
+        f.write("self.init_station_load = " + str(as_list(self.dynamic.init_station_load)) + "\n")
+        f.write("self.init_flat_station_load = " + str(as_list(self.dynamic.init_flat_station_load)) + "\n")
+        f.write("self.ideal_state = " + str(as_list(self.dynamic.ideal_state)) + "\n")
+        f.write("self.driving_to_start = " + str(as_list(self.dynamic.driving_to_start)) + "\n")
+        f.write("self.demand = " + str(as_list(self.dynamic.demand)) + "\n")
+        f.write("self.incoming_rate = " + str(as_list(self.dynamic.incoming_rate)) + "\n")
+        f.write("self.incoming_flat_rate = " + str(as_list(self.dynamic.incoming_flat_rate)) + "\n")
@@ -1,3 +1,5 @@
+import numpy as np
+
 
 class Station:
 
@@ -14,3 +16,45 @@ class Station:
         self.ideal_state = ideal_state
         self.address = None
         self.id = id
+
+
+class StationArrays:
+    # The stations of an instance as contiguous arrays indexed like the model: the depot first, then the swap
+    # stations. The depot has zero loads and rates, like the artificial end station added by the instance
+
+    __slots__ = ('ids', 'addresses', 'latitude', 'longitude', 'init_station_load', 'init_flat_station_load',
+                 'incoming_rate', 'incoming_flat_rate', 'outgoing_rate', 'demand')
+
+    def __init__(self, ids, latitude, longitude, init_station_load, init_flat_station_load, incoming_rate,
+                 incoming_flat_rate, outgoing_rate, demand):
+        self.ids = [str(station_id) for station_id in ids]
+        self.addresses = [None] * len(self.ids)
+        self.latitude = np.asarray(latitude, dtype=float)
+        self.longitude = np.asarray(longitude, dtype=float)
+        self.init_station_load = np.asarray(init_station_load, dtype=float)
+        self.init_flat_station_load = np.asarray(init_flat_station_load, dtype=float)
+        self.incoming_rate = np.asarray(incoming_rate, dtype=float)
+        self.incoming_flat_rate = np.asarray(incoming_flat_rate, dtype=float)
+        self.outgoing_rate = np.asarray(outgoing_rate, dtype=float)
+        self.demand = np.asarray(demand, dtype=float)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def take(self, rows):
+        # The stations at rows, in that order
+        rows = np.asarray(rows, dtype=int)
+        stations = StationArrays([self.ids[k] for k in rows], *(getattr(self, name)[rows] for name in (
+            'latitude', 'longitude', 'init_station_load', 'init_flat_station_load', 'incoming_rate',
+            'incoming_flat_rate', 'outgoing_rate', 'demand')))
+        stations.addresses = [self.addresses[k] for k in rows]
+        return stations
+
+    @classmethod
+    def from_stations(cls, station_obj):
+        # Station takes the latitude as its first argument, so it is stored in Station.longitude
+        def column(name):
+            return [getattr(station, name) or 0 for station in station_obj]
+        return cls([station.id for station in station_obj], column('longitude'), column('latitude'),
+                   column('init_station_load'), column('init_flat_station_load'), column('battery_rate'),
+                   column('flat_rate'), column('outgoing_rate'), column('demand'))
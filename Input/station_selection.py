@@ -0,0 +1,59 @@
+from Input.instance_generator import Instance
+from Input.station import Station
+from Input.station_table import StationTable
+from Input.instance_cache import instance_key, cached_instance, save_instance, last_instance_path
+
+
+def load_stations(path="Data_processing/station.json"):
+    return StationTable.from_json(path)
+
+
+def get_depot():
+    return Station(59.93791, 10.73048, None, None, None, None, None, None, None, 465)
+
+
+def get_n_stations(stations, n, scenario, time_horizon, ideal_state, latitude=None, longitude=None,
+                   by_deficit=False):
+    rows = stations.select(n, scenario, time_horizon, ideal_state, latitude, longitude, by_deficit)
+    return stations.to_stations(rows, scenario, ideal_state)
+
+
+def check_demand(incoming_bat_rate, init_bat_load, dem, ideal, time_horizon):
+    # Works on single stations and on columns of a StationTable
+    return init_bat_load + time_horizon * (incoming_bat_rate - dem) < ideal
+
+
+def build_instance(stations, n_instance, scenario, n_vehicles, time_horizon, vehicle_cap, station_cap, ideal_state,
+                   w_violation, w_dev_obj, w_reward, w_dev_reward, w_driving_time, write_file=True, latitude=None,
+                   longitude=None, by_deficit=False, cache=True, time_mode='store'):
+    # Instances are loaded from the binary cache when the same stations and parameters were generated before
+    rows = stations.select(n_instance, scenario, time_horizon, ideal_state, latitude, longitude, by_deficit)
+    station_arrays = stations.station_arrays(rows, scenario, get_depot())
+
+    def build():
+        return Instance(len(rows)+2, n_vehicles, time_horizon, station_arrays, scenario=scenario,
+                        initial_size=n_instance, vehicle_cap=vehicle_cap, station_cap=station_cap,
+                        ideal_state=ideal_state, w_violation=w_violation, w_dev_obj=w_dev_obj,
+                        w_reward=w_reward, w_dev_reward=w_dev_reward, w_driving_time=w_driving_time,
+                        write_file=False, time_mode=time_mode)
+
+    if cache:
+        key = instance_key(station_arrays, scenario=scenario, initial_size=n_instance, n_vehicles=n_vehicles,
+                           time_horizon=time_horizon, vehicle_cap=vehicle_cap, station_cap=station_cap,
+                           ideal_state=ideal_state, w_violation=w_violation, w_dev_obj=w_dev_obj,
+                           w_reward=w_reward, w_dev_reward=w_dev_reward, w_driving_time=w_driving_time,
+                           time_mode=time_mode)
+        instance = cached_instance(key, build)
+    else:
+        instance = build()
+    if write_file:
+        instance.write_to_file()
+        save_instance(instance, last_instance_path)
+    return instance, instance.stations
+
+
+def scenario_dynamics(stations, instance, scenarios=('A', 'B', 'C', 'D', 'E')):
+    # The dynamic variables of every scenario for the stations of instance, the instance itself is not changed
+    rows = stations.rows(instance.stations.ids[1:instance.n_stations-1])
+    return {scenario: instance.scenario_dynamic(stations.station_arrays(rows, scenario, get_depot()))
+            for scenario in scenarios}
@@ -0,0 +1,92 @@
+import json
+import numpy as np
+from Input.station import Station, StationArrays
+
+scenario_fields = ['init_battery_load', 'init_flat_load', 'incoming_battery_rate', 'incoming_flat_rate',
+                   'outgoing_rate', 'demand']
+
+
+class StationTable:
+    # The stations of station.json as columns: ids, latitude and longitude per station and every scenario field
+    # as an (n_stations, n_scenarios) array, so selections are array queries instead of loops over the dict
+
+    def __init__(self, ids, latitude, longitude, scenarios, columns):
+        self.ids = np.asarray(ids)
+        self.latitude = np.asarray(latitude, dtype=float)
+        self.longitude = np.asarray(longitude, dtype=float)
+        self.scenarios = list(scenarios)
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_dict(cls, stations):
+        ids = list(stations.keys())
+        rows = list(stations.values())
+        scenarios = sorted(rows[0][2].keys()) if rows else []
+        data = np.array([[row[2][scenario] for scenario in scenarios] for row in rows], dtype=float)
+        data = data.reshape(len(rows), len(scenarios), len(scenario_fields))
+        columns = {field: data[:, :, k] for k, field in enumerate(scenario_fields)}
+        return cls(ids, [float(row[0]) for row in rows], [float(row[1]) for row in rows], scenarios, columns)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def scenario(self, scenario):
+        # The fields of one scenario, one array per field
+        k = self.scenarios.index(scenario)
+        return {field: column[:, k] for field, column in self.columns.items()}
+
+    def projected_load(self, scenario, time_horizon):
+        data = self.scenario(scenario)
+        return data['init_battery_load'] + time_horizon * (data['incoming_battery_rate'] - data['demand'])
+
+    def demand_mask(self, scenario, time_horizon, ideal_state):
+        # Stations that end up below the ideal state without a visit
+        return self.projected_load(scenario, time_horizon) < ideal_state
+
+    def box_mask(self, latitude=None, longitude=None):
+        # latitude and longitude are (min, max) tuples, None leaves that direction open
+        mask = np.ones(len(self), dtype=bool)
+        if latitude is not None:
+            mask &= (self.latitude >= latitude[0]) & (self.latitude <= latitude[1])
+        if longitude is not None:
+            mask &= (self.longitude >= longitude[0]) & (self.longitude <= longitude[1])
+        return mask
+
+    def select(self, n, scenario, time_horizon, ideal_state, latitude=None, longitude=None, by_deficit=False):
+        # Row indices of the selected stations, in file order or with the largest projected deficit first
+        mask = self.demand_mask(scenario, time_horizon, ideal_state) & self.box_mask(latitude, longitude)
+        rows = np.flatnonzero(mask)
+        if by_deficit:
+            deficit = ideal_state - self.projected_load(scenario, time_horizon)[rows]
+            rows = rows[np.argsort(-deficit, kind='stable')]
+        return rows[:n]
+
+    def rows(self, ids):
+        # Row indices of the given station ids
+        index = {str(station_id): k for k, station_id in enumerate(self.ids)}
+        return np.array([index[str(station_id)] for station_id in ids], dtype=int)
+
+    def to_stations(self, rows, scenario, ideal_state):
+        # Station objects are only created for the selected rows
+        data = self.scenario(scenario)
+        return [Station(self.latitude[k].item(), self.longitude[k].item(), data['init_battery_load'][k].item(),
+                        data['init_flat_load'][k].item(), data['incoming_battery_rate'][k].item(),
+                        data['incoming_flat_rate'][k].item(), data['outgoing_rate'][k].item(),
+                        data['demand'][k].item(), ideal_state, str(self.ids[k])) for k in rows]
+
+    def station_arrays(self, rows, scenario, depot):
+        # The selected rows behind the depot, without creating a Station per row
+        data = self.scenario(scenario)
+
+        def column(values, depot_value=0):
+            return np.concatenate(([depot_value], values[rows]))
+        return StationArrays([depot.id] + list(self.ids[rows]),
+                             column(self.latitude, depot.longitude), column(self.longitude, depot.latitude),
+                             column(data['init_battery_load']), column(data['init_flat_load']),
+                             column(data['incoming_battery_rate']), column(data['incoming_flat_rate']),
+                             column(data['outgoing_rate']), column(data['demand']))
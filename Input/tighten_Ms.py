@@ -0,0 +1,55 @@
+import copy
+import numpy as np
+from Input.generate_Ms import GenMs
+
+M_names = ['M_1', 'M_2', 'M_3', 'M_4', 'M_5', 'M_6', 'M_7A', 'M_7B', 'M_8A', 'M_8B', 'M_9', 'M_10', 'M_11', 'M_12',
+           'M_13', 'M_14']
+
+
+class TightMs(GenMs):
+    # The Ms of GenMs, tightened where the bound follows from the arrival windows the model itself enforces. M_3 and
+    # M_6 bound the arrival time t directly, so they stay as in GenMs: a vehicle may wait, and a smaller bound would
+    # cut solutions off. Within that window [earliest, max_t] the depot rows of M_1 have no handling term and subtract
+    # the earliest arrival at start stations, M_14 needs no more than the latest arrival past the horizon and M_5 no
+    # more than the largest vehicle load. Every M is the elementwise minimum of this bound and the one from GenMs,
+    # so none gets looser
+
+    def __init__(self, fixed, dynamic, arc_mask=None):
+        self.loose = GenMs(copy.copy(fixed), dynamic, arc_mask).fixed
+        super().__init__(fixed, dynamic, arc_mask)
+
+    def earliest_arrival(self):
+        # A start station is reached at its driving time to start at the earliest, any other station at 0
+        earliest = np.zeros(len(self.fixed.stations))
+        for v in self.fixed.vehicles:
+            start = self.dynamic.start_stations[v]
+            if start != self.fixed.stations[0]:
+                earliest[start] = max(earliest[start], self.dynamic.driving_to_start[v])
+        return earliest
+
+    def getM_1(self):
+        M_1 = super().getM_1()
+        # Nothing is swapped at the depot
+        M_1[0] = self.max_t[0] + self.fixed.parking_time + self.driving_times[0]
+        return np.maximum(M_1 - self.earliest_arrival()[None, :], 0)
+
+    def getM_5(self):
+        # Vehicle loads stay between 0 and the largest capacity or initial load
+        return max(self.max_qv, max(self.dynamic.init_vehicle_load))
+
+    def getM_14(self):
+        # t_f is non-negative and a swap station is reached by max_t at the latest
+        latest = np.max(self.max_t[1:-1], initial=self.fixed.time_horizon)
+        return np.full(len(self.vehicle_cap), latest - self.fixed.time_horizon)
+
+    def set_all_Ms(self):
+        super().set_all_Ms()
+        self.report = {}
+        for name in M_names:
+            loose = getattr(self.loose, name)
+            tight = np.minimum(getattr(self.fixed, name), loose)
+            if np.ndim(tight) == 0:
+                tight = tight.item()
+            setattr(self.fixed, name, tight)
+            self.report[name] = {'loose_mean': float(np.mean(loose)), 'tight_mean': float(np.mean(tight)),
+                                 'reduction': float(1 - np.sum(tight) / np.sum(loose)) if np.sum(loose) else 0.0}
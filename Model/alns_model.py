@@ -0,0 +1,367 @@
+from Model.heuristic_start import construct_routes, projected_deficit, swap_quantity
+from Model.solution import Solution
+import numpy as np
+import math
+import time
+
+
+class RouteEvaluator:
+    # Scores routes with the station-load dynamics of the MIP: every swap station ends up in situation 1
+    # (not visited), 2 (visited within the horizon) or 3 (visited after the horizon as the last station)
+
+    def __init__(self, f, d):
+        self.f = f
+        self.d = d
+        self.Stations = f.stations
+        self.driving_times = np.asarray(f.driving_times, dtype=float)
+        self.init_load = np.asarray(d.init_station_load, dtype=float)
+        self.net_rate = np.asarray(d.incoming_rate, dtype=float) - np.asarray(d.demand, dtype=float)
+        self.init_flat = np.asarray(d.init_flat_station_load, dtype=float)
+        self.flat_rate = np.asarray(d.incoming_flat_rate, dtype=float)
+        self.ideal = np.asarray(d.ideal_state, dtype=float)
+        self.station_cap = np.asarray(f.station_cap, dtype=float)
+        self.deficit = projected_deficit(f, d)
+
+        self.load_at_T = self.init_load + self.net_rate * f.time_horizon
+        self.unvisited_cost = np.zeros(len(self.Stations))
+        swap = np.array(self.Stations[1:-1], dtype=int)
+        self.unvisited_cost[swap] = self.station_costs(swap, np.zeros(len(swap)), np.zeros(len(swap)),
+                                                       np.zeros(len(swap), dtype=bool), visited=False)
+
+    def station_costs(self, stations, t, q, delta, visited=True):
+        f = self.f
+        load_at_T = self.load_at_T[stations]
+        violation_T = np.maximum(0, -load_at_T)
+        if not visited:
+            s_B = load_at_T + violation_T
+            return f.w_violation * violation_T + f.w_dev_obj * np.abs(self.ideal[stations] - s_B)
+
+        raw_l_B = self.init_load[stations] + self.net_rate[stations] * t
+        v_S = np.maximum(0, -raw_l_B)
+        after = raw_l_B + v_S + q + self.net_rate[stations] * (f.time_horizon - t)
+        v_Sf = np.maximum(0, -after)
+        violation = np.where(delta, violation_T, v_S + v_Sf)
+        s_B = np.where(delta, load_at_T + violation_T, after + v_Sf)
+        r_D = np.where(delta, np.minimum(q, self.station_cap[stations]), 0)
+        return (f.w_violation * violation + f.w_dev_obj * np.abs(self.ideal[stations] - s_B)
+                - f.w_reward * f.w_dev_reward * r_D)
+
+    def simulate(self, v, route):
+        f = self.f
+        d = self.d
+        start = d.start_stations[v]
+        arrival = float(d.driving_to_start[v])
+        load = d.init_vehicle_load[v]
+        stations = []
+        arrivals = []
+        quantities = []
+        loads = []
+        if start == self.Stations[0]:
+            if len(route) == 0:
+                return None
+            leave = arrival + f.parking_time
+            load = f.vehicle_cap[v]
+        else:
+            q = max(0, swap_quantity(f, d, self.deficit, start, arrival, load))
+            stations.append(start)
+            arrivals.append(arrival)
+            quantities.append(q)
+            loads.append(load)
+            leave = arrival + f.parking_time + f.handling_time * q
+            load -= q
+
+        current = start
+        for k, j in enumerate(route):
+            arrival = leave + self.driving_times[current][j]
+            # Only the last station of a route may be reached after the horizon
+            if arrival > f.time_horizon and k < len(route) - 1:
+                return None
+            q = swap_quantity(f, d, self.deficit, j, arrival, load)
+            if q < 1:
+                return None
+            stations.append(j)
+            arrivals.append(arrival)
+            quantities.append(q)
+            loads.append(load)
+            leave = arrival + f.parking_time + f.handling_time * q
+            load -= q
+            current = j
+        return np.array(stations, dtype=int), np.array(arrivals), np.array(quantities), np.array(loads), leave, load
+
+    def route_cost(self, v, route):
+        simulated = self.simulate(v, route)
+        if simulated is None:
+            return math.inf
+        stations, arrivals, quantities, loads, leave, load = simulated
+        if len(stations) == 0:
+            return 0
+        delta = arrivals > self.f.time_horizon
+        cost = np.sum(self.station_costs(stations, arrivals, quantities, delta) - self.unvisited_cost[stations])
+        t_f = max(0, arrivals[-1] - self.f.time_horizon)
+        return cost + self.f.w_reward * self.f.w_driving_time * t_f
+
+    def objective(self, routes, route_costs=None):
+        if route_costs is None:
+            route_costs = [self.route_cost(v, route) for v, route in routes.items()]
+        return np.sum(self.unvisited_cost) + sum(route_costs)
+
+    def solution_values(self, routes):
+        f = self.f
+        d = self.d
+        Stations = self.Stations
+        end = Stations[-1]
+        values = {}
+        t_end = 0
+        visited = {}
+        for v, route in routes.items():
+            stations, arrivals, quantities, loads, leave, load = self.simulate(v, route)
+            path = list(stations)
+            if d.start_stations[v] == Stations[0]:
+                path.insert(0, Stations[0])
+                values["t_D[{}]".format(v)] = float(d.driving_to_start[v])
+                values["l_V[{},{}]".format(Stations[0], v)] = d.init_vehicle_load[v]
+            path.append(end)
+            for i, j in zip(path[:-1], path[1:]):
+                values["x[{},{},{}]".format(i, j, v)] = 1
+            for i, t_i, q_i, load_i in zip(stations, arrivals, quantities, loads):
+                values["t[{}]".format(i)] = float(t_i)
+                values["q[{},{}]".format(i, v)] = int(q_i)
+                values["l_V[{},{}]".format(i, v)] = int(load_i)
+                visited[int(i)] = (float(t_i), int(q_i))
+            values["l_V[{},{}]".format(end, v)] = int(load)
+            values["t_f[{}]".format(v)] = max(0.0, float(arrivals[-1]) - f.time_horizon) if len(arrivals) else 0.0
+            t_end = max(t_end, leave)
+        values["t[{}]".format(end)] = float(t_end)
+
+        for i in Stations[1:-1]:
+            load_at_T = self.load_at_T[i]
+            if i not in visited:
+                v_Sf = max(0.0, -load_at_T)
+                s_B = load_at_T + v_Sf
+                values["v_Sf[{}]".format(i)] = v_Sf
+                values["s_B[{}]".format(i)] = s_B
+            else:
+                t_i, q_i = visited[i]
+                values["gamma[{}]".format(i)] = 1
+                raw_l_B = self.init_load[i] + self.net_rate[i] * t_i
+                v_S = max(0.0, -raw_l_B)
+                values["l_B[{}]".format(i)] = raw_l_B + v_S
+                if t_i > f.time_horizon:
+                    values["delta[{}]".format(i)] = 1
+                    values["v_S[{}]".format(i)] = v_S
+                    values["v_SF[{}]".format(i)] = v_S - max(0.0, -load_at_T)
+                    values["r_D[{}]".format(i)] = min(q_i, f.station_cap[i])
+                    s_B = load_at_T + max(0.0, -load_at_T)
+                else:
+                    after = raw_l_B + v_S + q_i + self.net_rate[i] * (f.time_horizon - t_i)
+                    values["v_S[{}]".format(i)] = v_S
+                    values["v_Sf[{}]".format(i)] = max(0.0, -after)
+                    s_B = after + max(0.0, -after)
+                values["s_B[{}]".format(i)] = s_B
+            values["d[{}]".format(i)] = abs(d.ideal_state[i] - values["s_B[{}]".format(i)])
+        return values
+
+
+class ALNS:
+
+    def __init__(self, f, d, seed=0, max_candidates=20, segment=50, reaction=0.1, scores=(33, 9, 13)):
+        self.f = f
+        self.d = d
+        self.evaluator = RouteEvaluator(f, d)
+        self.rng = np.random.default_rng(seed)
+        self.max_candidates = max_candidates
+        self.segment = segment
+        self.reaction = reaction
+        self.scores = scores
+        self.swap_stations = np.array(f.stations[1:-1], dtype=int)
+        self.fixed_stations = set(d.start_stations)
+        self.destroy_operators = [self.random_removal, self.worst_removal, self.related_removal]
+        self.repair_operators = [self.greedy_insertion, self.random_insertion]
+
+    def initial_routes(self):
+        constructed = construct_routes(self.f, self.d)
+        routes = {}
+        for v in self.f.vehicles:
+            if constructed is None:
+                routes[v] = []
+            else:
+                routes[v] = [station for station, _, _, _ in constructed[v][1:-1]]
+        if any(self.evaluator.route_cost(v, route) == math.inf for v, route in routes.items()):
+            routes = {v: [] for v in self.f.vehicles}
+            self.greedy_insertion(routes, [], force=True)
+        return routes
+
+    # ------ DESTROY OPERATORS -----------------------------------------------------------------------
+    def visited(self, routes):
+        return [(v, k) for v, route in routes.items() for k in range(len(route))]
+
+    def removal_count(self, routes):
+        n_visited = sum(len(route) for route in routes.values())
+        if n_visited == 0:
+            return 0
+        return int(self.rng.integers(1, max(2, math.ceil(0.4 * n_visited)) + 1))
+
+    def remove(self, routes, positions):
+        removed = []
+        for v, k in sorted(positions, key=lambda pos: -pos[1]):
+            removed.append(routes[v].pop(k))
+        return removed
+
+    def random_removal(self, routes):
+        positions = self.visited(routes)
+        n_remove = min(self.removal_count(routes), len(positions))
+        chosen = self.rng.choice(len(positions), size=n_remove, replace=False) if n_remove > 0 else []
+        return self.remove(routes, [positions[k] for k in chosen])
+
+    def worst_removal(self, routes):
+        gains = []
+        for v, route in routes.items():
+            base = self.evaluator.route_cost(v, route)
+            for k in range(len(route)):
+                gains.append((self.evaluator.route_cost(v, route[:k] + route[k+1:]) - base, v, k))
+        gains.sort()
+        n_remove = min(self.removal_count(routes), len(gains))
+        return self.remove(routes, [(v, k) for _, v, k in gains[:n_remove]])
+
+    def related_removal(self, routes):
+        positions = self.visited(routes)
+        if len(positions) == 0:
+            return []
+        seed_v, seed_k = positions[self.rng.integers(len(positions))]
+        seed = routes[seed_v][seed_k]
+        distance = [self.evaluator.driving_times[seed][routes[v][k]] for v, k in positions]
+        order = np.argsort(distance)
+        n_remove = min(self.removal_count(routes), len(positions))
+        return self.remove(routes, [positions[k] for k in order[:n_remove]])
+
+    # ------ REPAIR OPERATORS ------------------------------------------------------------------------
+    def candidates(self, routes, removed):
+        in_routes = set(station for route in routes.values() for station in route)
+        free = [i for i in self.swap_stations if i not in in_routes and i not in self.fixed_stations
+                and i not in removed and self.evaluator.deficit[i] > 0]
+        if len(free) > self.max_candidates:
+            free = list(self.rng.choice(free, size=self.max_candidates, replace=False))
+        return [int(i) for i in removed] + [int(i) for i in free]
+
+    def best_insertion(self, routes, route_costs, station):
+        best = (0, None, None)
+        for v, route in routes.items():
+            for k in range(len(route) + 1):
+                cost = self.evaluator.route_cost(v, route[:k] + [station] + route[k:])
+                if cost - route_costs[v] < best[0]:
+                    best = (cost - route_costs[v], v, k)
+        return best
+
+    def greedy_insertion(self, routes, removed, force=False):
+        # Inserts the cheapest station at its best position until no insertion improves the objective;
+        # with force set, a route that is still infeasible (a depot start with no station) takes any station
+        candidates = self.candidates(routes, removed)
+        route_costs = {v: self.evaluator.route_cost(v, route) for v, route in routes.items()}
+        while candidates:
+            best = (0, None, None, None)
+            for station in candidates:
+                gain, v, k = self.best_insertion(routes, route_costs, station)
+                if v is not None and gain < best[0]:
+                    best = (gain, v, k, station)
+            if best[1] is None:
+                break
+            _, v, k, station = best
+            routes[v].insert(k, station)
+            route_costs[v] = self.evaluator.route_cost(v, routes[v])
+            candidates.remove(station)
+        if force:
+            self.repair_empty_routes(routes, candidates)
+
+    def random_insertion(self, routes, removed):
+        candidates = self.candidates(routes, removed)
+        self.rng.shuffle(candidates)
+        route_costs = {v: self.evaluator.route_cost(v, route) for v, route in routes.items()}
+        for station in candidates:
+            gain, v, k = self.best_insertion(routes, route_costs, station)
+            if v is not None:
+                routes[v].insert(k, station)
+                route_costs[v] = self.evaluator.route_cost(v, routes[v])
+
+    def repair_empty_routes(self, routes, candidates):
+        for v, route in routes.items():
+            if self.evaluator.route_cost(v, route) < math.inf:
+                continue
+            for station in list(candidates) + [int(i) for i in self.swap_stations]:
+                if station in self.fixed_stations or any(station in r for r in routes.values()):
+                    continue
+                if self.evaluator.route_cost(v, [station]) < math.inf:
+                    route.append(station)
+                    break
+
+    # ------ SEARCH ----------------------------------------------------------------------------------
+    def select(self, weights):
+        return int(self.rng.choice(len(weights), p=weights / weights.sum()))
+
+    def solve(self, iterations=2000, time_limit=10, start_temperature=0.05, cooling=0.9995):
+        start_time = time.time()
+        current = self.initial_routes()
+        current_obj = self.evaluator.objective(current)
+        best, best_obj = {v: list(route) for v, route in current.items()}, current_obj
+        temperature = -start_temperature * abs(current_obj) / math.log(0.5) if current_obj != 0 else 1
+
+        destroy_weights = np.ones(len(self.destroy_operators))
+        repair_weights = np.ones(len(self.repair_operators))
+        destroy_scores = np.zeros(len(self.destroy_operators))
+        repair_scores = np.zeros(len(self.repair_operators))
+        destroy_uses = np.zeros(len(self.destroy_operators))
+        repair_uses = np.zeros(len(self.repair_operators))
+
+        for iteration in range(iterations):
+            if time.time() - start_time > time_limit:
+                break
+            destroy = self.select(destroy_weights)
+            repair = self.select(repair_weights)
+            candidate = {v: list(route) for v, route in current.items()}
+            removed = self.destroy_operators[destroy](candidate)
+            self.repair_operators[repair](candidate, removed)
+            self.repair_empty_routes(candidate, removed)
+            candidate_obj = self.evaluator.objective(candidate)
+
+            score = 0
+            if candidate_obj < best_obj - 1e-9:
+                best, best_obj = {v: list(route) for v, route in candidate.items()}, candidate_obj
+                score = self.scores[0]
+            if candidate_obj < current_obj - 1e-9:
+                current, current_obj = candidate, candidate_obj
+                score = max(score, self.scores[1])
+            elif candidate_obj < math.inf and self.rng.random() < math.exp(
+                    -(candidate_obj - current_obj) / max(temperature, 1e-12)):
+                current, current_obj = candidate, candidate_obj
+                score = max(score, self.scores[2])
+            temperature *= cooling
+
+            destroy_scores[destroy] += score
+            repair_scores[repair] += score
+            destroy_uses[destroy] += 1
+            repair_uses[repair] += 1
+            if (iteration + 1) % self.segment == 0:
+                destroy_weights = self.update_weights(destroy_weights, destroy_scores, destroy_uses)
+                repair_weights = self.update_weights(repair_weights, repair_scores, repair_uses)
+                destroy_scores[:] = 0
+                repair_scores[:] = 0
+                destroy_uses[:] = 0
+                repair_uses[:] = 0
+        return best, best_obj
+
+    def update_weights(self, weights, scores, uses):
+        used = uses > 0
+        weights = weights.copy()
+        weights[used] = (1 - self.reaction) * weights[used] + self.reaction * scores[used] / uses[used]
+        return np.maximum(weights, 0.05)
+
+
+def run_alns(instance, iterations=2000, time_limit=10, seed=0):
+    f = instance.fixed
+    d = instance.dynamic
+    start_time = time.time()
+    alns = ALNS(f, d, seed=seed)
+    routes, obj_val = alns.solve(iterations=iterations, time_limit=time_limit)
+    exec_time = time.time() - start_time
+    print("Execution time was", exec_time)
+    solution = Solution.from_values(f, alns.evaluator.solution_values(routes), float(obj_val), runtime=exec_time)
+    return solution, exec_time
@@ -0,0 +1,141 @@
+import json
+import math
+import threading
+from gurobipy import GRB
+from Model.solution import Solution
+
+
+class AnytimeSolve:
+    # Streams every new incumbent and bound of a solve as one json line each and stops the solve when one of the
+    # rules is met: the gap reaches target_gap, the incumbent has not improved for stall_time seconds, or
+    # budget seconds have passed. The best solution so far can be read from another thread while the solve runs.
+    # run_model attaches the fixed variables and model handles once the model is built
+
+    def __init__(self, path=None, target_gap=None, stall_time=None, budget=None, on_incumbent=None):
+        self.fixed = None
+        self.handles = None
+        self.path = path
+        self.target_gap = target_gap
+        self.stall_time = stall_time
+        self.budget = budget
+        self.on_incumbent = on_incumbent
+        self.trajectory = []
+        self.stop_reason = None
+        self.best = None
+        self.best_objective = math.inf
+        self.bound = -math.inf
+        self.last_improvement = 0.0
+        self.variables = None
+        self.pending = None
+        self.lock = threading.Lock()
+
+    def attach(self, fixed, handles):
+        self.fixed = fixed
+        self.handles = handles
+
+    @staticmethod
+    def gap(objective, bound):
+        if math.isinf(objective) or math.isinf(bound):
+            return math.inf
+        if objective == 0:
+            return 0.0 if bound == 0 else math.inf
+        return abs(objective - bound) / abs(objective)
+
+    def record(self, event, runtime, nodes):
+        entry = {'event': event, 'time': runtime, 'objective': None if math.isinf(self.best_objective)
+                 else self.best_objective, 'bound': None if math.isinf(self.bound) else self.bound,
+                 'gap': self.gap(self.best_objective, self.bound), 'nodes': nodes}
+        if math.isinf(entry['gap']):
+            entry['gap'] = None
+        self.trajectory.append(entry)
+        if self.path is not None:
+            with open(self.path, 'a') as fp:
+                fp.write(json.dumps(entry) + "\n")
+        return entry
+
+    def accept(self, objective, solution, runtime, nodes):
+        with self.lock:
+            self.best = solution
+            self.best_objective = objective
+        self.last_improvement = runtime
+        entry = self.record('incumbent', runtime, nodes)
+        if self.on_incumbent is not None:
+            self.on_incumbent(entry, solution)
+
+    def confirm(self, best_objective):
+        # With lazy constraints a new solution can still be cut off by them, it only counts once Gurobi reports
+        # it as the incumbent
+        if self.pending is not None and best_objective <= self.pending[0] + 1e-9 * max(1.0, abs(best_objective)):
+            self.accept(*self.pending)
+        if self.pending is not None and best_objective < GRB.INFINITY:
+            self.pending = None
+
+    def callback(self, model, where):
+        if where == GRB.Callback.MIPSOL:
+            runtime = model.cbGet(GRB.Callback.RUNTIME)
+            objective = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+            self.bound = max(self.bound, model.cbGet(GRB.Callback.MIPSOL_OBJBND))
+            if objective < self.best_objective:
+                if self.variables is None:
+                    self.variables = model.getVars()
+                solution = Solution.from_vector(self.fixed, self.handles, model.cbGetSolution(self.variables),
+                                                objective, self.gap(objective, self.bound), runtime)
+                candidate = (objective, solution, runtime, int(model.cbGet(GRB.Callback.MIPSOL_NODCNT)))
+                if self.handles.lazy is None:
+                    self.accept(*candidate)
+                else:
+                    self.pending = candidate
+        elif where == GRB.Callback.MIP:
+            runtime = model.cbGet(GRB.Callback.RUNTIME)
+            self.confirm(model.cbGet(GRB.Callback.MIP_OBJBST))
+            bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+            if bound > self.bound + 1e-9 * max(1.0, abs(bound)):
+                self.bound = bound
+                self.record('bound', runtime, int(model.cbGet(GRB.Callback.MIP_NODCNT)))
+            self.check_stop(model, runtime)
+        elif where in (GRB.Callback.PRESOLVE, GRB.Callback.SIMPLEX, GRB.Callback.BARRIER):
+            # Before the branch and bound only the budget can apply
+            self.check_stop(model, model.cbGet(GRB.Callback.RUNTIME))
+
+    def finish(self, m):
+        # A solution found after the last MIP callback is confirmed from the final model
+        if m.SolCount > 0:
+            self.confirm(m.ObjVal)
+        self.pending = None
+
+    def check_stop(self, model, runtime):
+        if self.stop_reason is not None:
+            return
+        if self.best is not None and self.target_gap is not None \
+                and self.gap(self.best_objective, self.bound) <= self.target_gap:
+            self.stop_reason = 'target gap'
+        elif self.best is not None and self.stall_time is not None \
+                and runtime - self.last_improvement >= self.stall_time:
+            self.stop_reason = 'no improvement'
+        elif self.budget is not None and runtime >= self.budget:
+            self.stop_reason = 'budget'
+        if self.stop_reason is not None:
+            model.terminate()
+
+    def best_solution(self):
+        # The best incumbent so far as a Solution, None before the first one
+        with self.lock:
+            return self.best
+
+    def best_routes(self):
+        solution = self.best_solution()
+        return None if solution is None else solution.routes()
+
+    def summary(self):
+        incumbents = [entry for entry in self.trajectory if entry['event'] == 'incumbent']
+        return {'stop_reason': self.stop_reason, 'incumbents': len(incumbents),
+                'first_incumbent_time': incumbents[0]['time'] if incumbents else None,
+                'last_improvement_time': incumbents[-1]['time'] if incumbents else None,
+                'objective': None if math.isinf(self.best_objective) else self.best_objective,
+                'bound': None if math.isinf(self.bound) else self.bound}
+
+
+def time_to_quality(trajectory, reference):
+    # (time, relative gap of the incumbent to reference) at every improvement, for time-to-quality curves
+    return [(entry['time'], abs(entry['objective'] - reference) / max(abs(reference), 1e-10))
+            for entry in trajectory if entry['event'] == 'incumbent']
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+def earliest_arrivals(f, d):
+    # Lower bound on the arrival time of every vehicle at every station: the time to its start station plus the
+    # shortest path with a parking stop at each station on the way (handling times are left out)
+    n = len(f.stations)
+    weights = f.parking_time + np.asarray(f.driving_times, dtype=float)
+    shortest = weights.copy()
+    np.fill_diagonal(shortest, 0)
+    for k in range(n - 1):
+        shortest = np.minimum(shortest, shortest[:, k:k+1] + shortest[k:k+1, :])
+    earliest = np.empty((n, len(f.vehicles)))
+    for v in f.vehicles:
+        earliest[:, v] = d.driving_to_start[v] + shortest[d.start_stations[v]]
+    return earliest
+
+
+def prune_arcs(f, d=None, k_nearest=None):
+    # keep[i, j, v] is False for arcs no feasible solution can use. Without the dynamic state only the arcs that
+    # are always infeasible are removed, so the result can be shared by every state of a persistent model.
+    # With k_nearest, every station also keeps only the arcs to its k nearest swap stations (a heuristic cut),
+    # arcs to the depot and to the artificial end station are always kept
+    Stations = f.stations
+    depot = Stations[0]
+    end = Stations[-1]
+    n = len(Stations)
+    driving_times = np.asarray(f.driving_times, dtype=float)
+
+    keep = np.ones((n, n, len(f.vehicles)), dtype=bool)
+    keep[end] = False
+    keep[np.arange(n), np.arange(n)] = False
+    keep[depot, end] = False
+
+    if d is not None:
+        earliest = earliest_arrivals(f, d)
+        # A station with a successor other than the end station is left within the horizon,
+        # and so is the depot when it is visited
+        keep[:, :end] &= (earliest <= f.time_horizon)[:, None, :]
+        keep[:, depot] &= earliest + f.parking_time + driving_times[:, depot, None] <= f.time_horizon
+        # Returning to the start station closes a cycle in the arrival times
+        if f.parking_time > 0:
+            for v in f.vehicles:
+                keep[:, d.start_stations[v], v] = False
+
+    if k_nearest is not None:
+        swap = np.array(Stations[1:-1])
+        times = driving_times[:, swap].copy()
+        times[swap, np.arange(len(swap))] = np.inf
+        nearest = np.zeros((n, n), dtype=bool)
+        order = np.argsort(times, axis=1, kind='stable')[:, :k_nearest]
+        nearest[np.arange(n)[:, None], swap[order]] = True
+        nearest[:, depot] = True
+        nearest[:, end] = True
+        keep &= nearest[:, :, None]
+    return keep
+
+
+def arc_summary(keep):
+    n, _, n_vehicles = keep.shape
+    n_full = (n - 1) * n * n_vehicles
+    n_kept = int(keep.sum())
+    return {'arcs': n_full, 'kept_arcs': n_kept, 'reduction': 1 - n_kept / n_full}
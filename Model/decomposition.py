@@ -0,0 +1,140 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from gurobipy import Model
+from Data_processing.travel_time_estimator import haversine_matrix
+from Model.gurobi_model import run_model, build_model
+from Model.heuristic_start import projected_deficit
+from Model.solution import Solution, station_variables
+
+
+def station_distances(instance, metric='time'):
+    # Driving times, or great-circle km from the coordinates with the end station at the depot
+    if metric == 'time':
+        return np.asarray(instance.fixed.driving_times, dtype=float)
+    stations = instance.stations
+    index = list(range(instance.n_stations - 1)) + [0]
+    return haversine_matrix(stations.latitude[index], stations.longitude[index])
+
+
+def cluster_stations(fixed, dynamic, distances, balance=1.0):
+    # One cluster of swap stations per vehicle. Every cluster is seeded at the start station of its vehicle,
+    # vehicles starting at the depot get the swap station farthest from the seeds so far. Stations are then
+    # assigned in order of decreasing deficit to the nearest seed, with the distance scaled up by how much
+    # deficit the cluster already holds, so the work is shared between the vehicles
+    n = len(fixed.stations)
+    vehicles = fixed.vehicles
+    swap = np.arange(1, n - 1)
+    seeds = [int(dynamic.start_stations[v]) for v in vehicles]
+    # A start station has to be in the cluster of its vehicle and the clusters have to be disjoint
+    shared = sorted(set(seed for seed in seeds if seed != 0 and seeds.count(seed) > 1))
+    if shared:
+        raise ValueError("vehicles share the start stations {}, the clusters cannot be disjoint".format(shared))
+    for v in vehicles:
+        if seeds[v] == 0:
+            taken = [seed for seed in seeds if seed != 0]
+            free = [i for i in swap if i not in taken]
+            if not free:
+                continue
+            if taken:
+                seeds[v] = max(free, key=lambda i: min(distances[seed, i] + distances[i, seed] for seed in taken))
+            else:
+                seeds[v] = max(free, key=lambda i: distances[0, i])
+    # Only the swap stations are weighted, a station above its ideal state weighs as much as one at it
+    weight = np.maximum(0, projected_deficit(fixed, dynamic)) + 1
+    target = weight[swap].sum() / len(vehicles)
+    clusters = [[] for v in vehicles]
+    load = np.zeros(len(vehicles))
+    for v in vehicles:
+        if seeds[v] != 0:
+            clusters[v].append(seeds[v])
+            load[v] += weight[seeds[v]]
+    for i in sorted(set(swap) - set(seeds), key=lambda i: -weight[i]):
+        cost = [(distances[seeds[v], i] + distances[i, seeds[v]] + 1e-9) * (1 + balance * load[v] / target)
+                for v in vehicles]
+        v = int(np.argmin(cost))
+        clusters[v].append(int(i))
+        load[v] += weight[i]
+    return [sorted(cluster) for cluster in clusters]
+
+
+def solve_cluster(sub, time_limit, threads, arc_pruning, tight_ms):
+    # Runs in a worker process, the sub instance and the solution are pickled across
+    result = run_model(sub, mip_start=True, time_limit=time_limit, params={'Threads': threads, 'OutputFlag': 0},
+                       arc_pruning=arc_pruning, tight_ms=tight_ms)
+    if result is None or result[0].SolCount == 0:
+        return None
+    return Solution.from_model(result[0], sub.fixed)
+
+
+def merge_solutions(fixed, clusters, solutions):
+    # The cluster solutions in the indices of the full instance. The stations and vehicles of the clusters are
+    # disjoint and every objective term belongs to one station or one vehicle, so the objectives add up
+    n = len(fixed.stations)
+    merged = Solution(fixed, sum(solution.obj_val for solution in solutions),
+                      max(solution.gap for solution in solutions), None)
+    for v, (cluster, solution) in enumerate(zip(clusters, solutions)):
+        index = np.array([0] + list(cluster) + [n - 1])
+        values = solution.values
+        merged.values['x'][np.ix_(index, index, [v])] = values['x']
+        merged.values['q'][index, v] = values['q'][:, 0]
+        merged.values['l_V'][index, v] = values['l_V'][:, 0]
+        merged.values['t_D'][v] = values['t_D'][0]
+        merged.values['t_f'][v] = values['t_f'][0]
+        # The depot and end station are shared, the end station is reached when the last vehicle arrives
+        merged.values['t'][index[1:-1]] = values['t'][1:-1]
+        merged.values['t'][n - 1] = max(merged.values['t'][n - 1], values['t'][-1])
+        for name in station_variables:
+            merged.values[name][index[1:-1]] = values[name][1:-1]
+            merged.values[name][[0, n - 1]] = np.maximum(merged.values[name][[0, n - 1]], values[name][[0, -1]])
+    return merged
+
+
+def repair(instance, merged, time_limit=60, threads=None):
+    # Solves the full model for a short time from the merged routes, so stations on the cluster boundaries can
+    # move to another vehicle. The merged routes are kept when the full model finds nothing better
+    m = Model("Bicycle")
+    m.setParam('TimeLimit', time_limit)
+    m.setParam('OutputFlag', 0)
+    if threads is not None:
+        m.setParam('Threads', threads)
+    handles = build_model(m, instance.fixed, instance.dynamic)
+    m._handles = handles
+    x = handles.variables['x']
+    arcs = list(x.keys())
+    m.setAttr('Start', [x[arc] for arc in arcs], [round(merged.values['x'][arc]) for arc in arcs])
+    m.optimize()
+    if m.SolCount > 0 and m.ObjVal < merged.obj_val - 1e-9:
+        return Solution.from_model(m, instance.fixed)
+    return merged
+
+
+def run_decomposed(instance, time_limit=60*60, workers=None, metric='time', balance=1.0, repair_time=None,
+                   arc_pruning=False, tight_ms=False, cores=None):
+    # Cluster first, then one single-vehicle model per cluster in parallel processes. The cores are split
+    # between the workers, all of them by default
+    start_time = time.time()
+    f = instance.fixed
+    d = instance.dynamic
+    clusters = cluster_stations(f, d, station_distances(instance, metric), balance)
+    subs = [instance.sub_instance(cluster, [v]) for v, cluster in enumerate(clusters)]
+    cores = cores or os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(subs)))
+    threads = max(1, cores // workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(solve_cluster, sub, time_limit, threads, arc_pruning, tight_ms) for sub in subs]
+        solutions = [future.result() for future in futures]
+    for v, (cluster, solution) in enumerate(zip(clusters, solutions)):
+        print("Vehicle {}: {} stations, objective {}".format(
+            v, len(cluster), None if solution is None else round(solution.obj_val, 4)))
+    if any(solution is None for solution in solutions):
+        print("A cluster has no solution")
+        return None, time.time() - start_time
+    solution = merge_solutions(f, clusters, solutions)
+    if repair_time:
+        solution = repair(instance, solution, repair_time, threads=cores)
+    exec_time = time.time() - start_time
+    solution.runtime = exec_time
+    print("Execution time was", exec_time)
+    return solution, exec_time
@@ -1,208 +1,451 @@
 from gurobipy import *
 from Input.fixed_file_variables import FixedFileVariables
 from Input.dynamic_file_variables import DynamicFileVariables
+from Input.generate_Ms import GenMs
+from Input.tighten_Ms import TightMs
+from Input.instance_cache import load_instance, last_instance_path
+import copy
+import os
 import time
 import sys
+from Model.profiler import ModelProfile
+from Model.heuristic_start import set_mip_start
+from Model.arc_pruning import prune_arcs, arc_summary
+from Model.lazy_constraints import LazyConstraints, combine_callbacks
 
 
-def run_model(instance, last_mode=False):
+class ModelHandles:
 
-    if last_mode:
+    def __init__(self, variables, sums):
+        self.variables = variables
+        self.sums = sums
+        # Rows from add_dynamic_constraints, the start station rows and the rows of the other state
+        self.start_constrs = []
+        self.state_constrs = []
+        # LazyConstraints with the rows left out of the model in lazy mode
+        self.lazy = None
+
+
+def build_arcs(Stations, Vehicles, keep=None):
+    # Index lists are built once, so every constraint sums over its own arcs instead of scanning x.
+    # keep is a boolean array over (i, j, v) from Model/arc_pruning.py, all arcs are created without it
+    arcs = [(i, j, v) for i in Stations[:-1] for j in Stations for v in Vehicles]
+    if keep is not None:
+        arcs = [arc for arc in arcs if keep[arc]]
+    out_arcs = {(i, v): [] for i in Stations for v in Vehicles}
+    in_arcs = {(j, v): [] for j in Stations for v in Vehicles}
+    pair_arcs = {(i, j): [] for i in Stations[:-1] for j in Stations}
+    for (i, j, v) in arcs:
+        out_arcs[(i, v)].append((i, j, v))
+        in_arcs[(j, v)].append((i, j, v))
+        pair_arcs[(i, j)].append((i, j, v))
+    return arcs, out_arcs, in_arcs, pair_arcs
+
+
+def build_model(m, f, dyn, profile=None, keep=None, lazy=False):
+    if profile is None:
+        profile = ModelProfile(enabled=False)
+    profile.start(m)
+
+    # ------ SETS -----------------------------------------------------------------------------
+    Stations = f.stations
+    Swap_Stations = Stations[1:-1]
+    Vehicles = f.vehicles
+
+    # ------ FIXED PARAMETERS -----------------------------------------------------------------
+    time_horizon = f.time_horizon
+    vehicle_cap = f.vehicle_cap
+    station_cap = f.station_cap
+    driving_times = f.driving_times
+    parking_time = f.parking_time
+    handling_time = f.handling_time
+
+    M_1 = f.M_1
+    M_2 = f.M_2
+    M_3 = f.M_3
+    M_4 = f.M_4
+    M_5 = f.M_5
+    M_6 = f.M_6
+    M_14 = f.M_14
+
+    w_dev_reward = f.w_dev_reward
+    w_driving_times = f.w_driving_time
+    w_dev_obj = f.w_dev_obj
+    w_reward = f.w_reward
+    w_violation = f.w_violation
+
+    # ------ VARIABLES -------------------------------------------------------------------------
+    lazy = LazyConstraints(m) if lazy else None
+    arcs, out_arcs, in_arcs, pair_arcs = build_arcs(Stations, Vehicles, keep)
+    x = m.addVars(arcs, vtype=GRB.BINARY, lb=0, name="x")
+    t = m.addVars(Stations[1:], vtype=GRB.CONTINUOUS, lb=0, name="t")
+    q = m.addVars([(i, v) for i in Swap_Stations for v in Vehicles], vtype=GRB.INTEGER, lb=0, name="q")
+    l_B = m.addVars(Swap_Stations, vtype=GRB.CONTINUOUS, lb=0, name="l_B")
+    l_F = m.addVars(Swap_Stations, vtype=GRB.CONTINUOUS, lb=0, name="l_F")
+    l_V = m.addVars([(i, v) for i in Stations for v in Vehicles], vtype=GRB.INTEGER, lb=0, name="l_V")
+    s_B = m.addVars(Swap_Stations, vtype=GRB.CONTINUOUS, lb=0, name="s_B")
+    s_F = m.addVars(Swap_Stations, vtype=GRB.CONTINUOUS, lb=0, name="s_F")
+    v_S = m.addVars(Swap_Stations, vtype=GRB.CONTINUOUS, lb=0, name="v_S")
+    d = m.addVars(Swap_Stations, vtype=GRB.CONTINUOUS, lb=0, name="d")
+    delta = m.addVars(Swap_Stations, vtype=GRB.BINARY, name="delta")
+    gamma = m.addVars(Swap_Stations, vtype=GRB.BINARY, name="gamma")
+    v_Sf = m.addVars(Swap_Stations, vtype=GRB.CONTINUOUS, name="v_Sf")
+    v_SF = m.addVars(Swap_Stations, vtype=GRB.CONTINUOUS, name="v_SF")
+    omega = m.addVars(Stations, vtype=GRB.BINARY, name="omega")
+    r_D = m.addVars(Swap_Stations, vtype=GRB.CONTINUOUS, lb=0, name="r_D")
+    t_f = m.addVars(Vehicles, vtype=GRB.CONTINUOUS, lb=0, name="t_f")
+    t_D = m.addVars(Vehicles, vtype=GRB.CONTINUOUS, lb=0, name="t_D")
+
+    profile.mark(m, 'variables')
+
+    # ------ ARC SUMS --------------------------------------------------------------------------
+    x_out = {key: quicksum(x[arc] for arc in arc_list) for key, arc_list in out_arcs.items()}
+    x_in = {key: quicksum(x[arc] for arc in arc_list) for key, arc_list in in_arcs.items()}
+    x_out_all = {i: quicksum(x[arc] for v in Vehicles for arc in out_arcs[(i, v)]) for i in Stations}
+    x_in_all = {j: quicksum(x[arc] for v in Vehicles for arc in in_arcs[(j, v)]) for j in Stations}
+    x_ij = {key: quicksum(x[arc] for arc in arc_list) for key, arc_list in pair_arcs.items()}
+    q_sum = {i: quicksum(q[(i, v)] for v in Vehicles) for i in Swap_Stations}
+
+    profile.mark(m, 'arc sums')
+
+    # ------- FEASIBILITY CONSTRAINTS ----------------------------------------------------------
+    # Routing constraints (rows with a big-M on (1 - x) are only needed for arcs that exist)
+    m.addConstrs(x_in[(Stations[-1], v)] == 1 for v in Vehicles)
+    m.addConstrs(x_in_all[j] <= 1 for j in Swap_Stations)
+    m.addConstrs(x_in[(Stations[0], v)] <= 1 for v in Vehicles)
+    m.addConstrs(quicksum(x[arc] for i in Stations for arc in out_arcs[(i, v)]) <= (len(Stations)-1)
+                 for v in Vehicles)
+    for i in Stations[:-1]:
+        m.addConstrs(x[(i, i, v)] <= 0 for v in Vehicles if (i, i, v) in x)
+    m.addConstrs(x[(Stations[0], Stations[-1], v)] <= 0 for v in Vehicles if (Stations[0], Stations[-1], v) in x)
+
+    profile.mark(m, 'routing')
+
+    # Time Constraints (in lazy mode the M_1 rows are only added when a solution violates them)
+    time_rows = [
+        (t[i] + parking_time + handling_time * q_sum[i] + driving_times[i][j]
+         - t[j] - M_1[i][j] * (1 - x_ij[(i, j)]) for i in Swap_Stations for j in Stations[1:] if pair_arcs[(i, j)]),
+        (t[i] + parking_time + handling_time * q[(i, v)] + driving_times[i][Stations[0]]
+         - t_D[v] - M_1[i][Stations[0]] * (1 - x[(i, Stations[0], v)]) for i in Swap_Stations
+         for v in Vehicles if (i, Stations[0], v) in x),
+        (t_D[v] + parking_time + driving_times[Stations[0]][j]
+         - t[j] - M_1[0][j] * (1 - x[(Stations[0], j, v)]) for j in Stations[1:] for v in Vehicles
+         if (Stations[0], j, v) in x)]
+    for rows in time_rows:
+        if lazy is not None:
+            lazy.add_rows('time', rows)
+        else:
+            for row in rows:
+                m.addLConstr(row, GRB.LESS_EQUAL, 0)
+    m.addConstrs(t[i] - time_horizon - M_2[i] * x_ij[(i, Stations[-1])] <= 0 for i in Swap_Stations)
+    m.addConstrs(t_D[v] - time_horizon - M_2[0] * x.get((Stations[0], Stations[-1], v), 0) <= 0 for v in Vehicles)
+    m.addConstrs(t[i] - M_3[i] * x_out_all[i] <= 0 for i in Swap_Stations)
+    m.addConstrs(t_D[v] - M_3[0] * x_out[(Stations[0], v)] <= 0 for v in Vehicles)
+
+    profile.mark(m, 'time')
+
+    # Vehicle Loading Constraints
+    m.addConstrs(q[(i, v)] <= l_V[(i, v)] for i in Swap_Stations for v in Vehicles)
+    m.addConstrs(
+        l_V[(j, v)] - vehicle_cap[v] - M_4 * (1 - x[(Stations[0], j, v)]) <= 0 for j in Stations for v in Vehicles
+        if (Stations[0], j, v) in x)
+    m.addConstrs(
+        l_V[(j, v)] - vehicle_cap[v] + M_4 * (1 - x[(Stations[0], j, v)]) >= 0 for j in Stations for v in Vehicles
+        if (Stations[0], j, v) in x)
+    load_rows = [
+        ((-l_V[(j, v)] + l_V[(i, v)] - q[(i, v)] - M_5 * (1 - x[(i, j, v)]) for i in Swap_Stations for j in Stations
+          for v in Vehicles if (i, j, v) in x), GRB.LESS_EQUAL),
+        ((-l_V[(j, v)] + l_V[(i, v)] - q[(i, v)] + M_5 * (1 - x[(i, j, v)]) for i in Swap_Stations for j in Stations
+          for v in Vehicles if (i, j, v) in x), GRB.GREATER_EQUAL)]
+    for rows, sense in load_rows:
+        if lazy is not None:
+            lazy.add_rows('vehicle loading', rows, sense)
+        else:
+            for row in rows:
+                m.addLConstr(row, sense, 0)
+
+    profile.mark(m, 'vehicle loading')
+
+    # Station Loading Constraints
+    m.addConstrs(q_sum[i] <= l_F[i] for i in Swap_Stations)
+    m.addConstrs(q[(i, v)] - vehicle_cap[v] * x_out[(i, v)] <= 0 for i in Swap_Stations for v in Vehicles)
+    m.addConstrs(q[(j, v)] - x_in[(j, v)] >= 0 for j in Swap_Stations for v in Vehicles)
+
+    profile.mark(m, 'station loading')
+
+    # ------- VIOLATION CONSTRAINTS ------------------------------------------------------------------
+    m.addConstrs(t[i] <= time_horizon + M_6[i] * delta[i] for i in Swap_Stations)
+    m.addConstrs(t[i] >= time_horizon * delta[i] for i in Swap_Stations)
+    m.addConstrs(delta[i] <= x_ij[(i, Stations[-1])] for i in Swap_Stations)
+    m.addConstrs(gamma[i] == x_out_all[i] for i in Swap_Stations)
+
+    profile.mark(m, 'violation')
+
+    # ------- OBJECTIVE CONSTRAINTS ------------------------------------------------------------------
+    m.addConstrs(r_D[i] <= q_sum[i] + station_cap[i] * (1 - delta[i])
+                 for i in Swap_Stations)
+    m.addConstrs(r_D[i] <= delta[i] * station_cap[i] for i in Swap_Stations)
+    m.addConstrs(t_f[v] - t[i] + time_horizon + M_14[v] * (1 - x[(i, Stations[-1], v)]) >= 0
+                 for i in Swap_Stations for v in Vehicles if (i, Stations[-1], v) in x)
+
+    # ------- OBJECTIVE ------------------------------------------------------------------------------
+    m.setObjective(w_violation * (v_S.sum('*') - v_SF.sum('*') + v_Sf.sum('*')) + w_dev_obj * d.sum('*')
+                   - w_reward * (w_dev_reward * r_D.sum('*') - w_driving_times * t_f.sum('*')), GRB.MINIMIZE)
+    profile.mark(m, 'objective')
+
+    variables = {'x': x, 't': t, 'q': q, 'l_B': l_B, 'l_F': l_F, 'l_V': l_V, 's_B': s_B, 's_F': s_F,
+                 'v_S': v_S, 'd': d, 'delta': delta, 'gamma': gamma, 'v_Sf': v_Sf, 'v_SF': v_SF, 'omega': omega,
+                 'r_D': r_D, 't_f': t_f, 't_D': t_D}
+    sums = {'x_out': x_out, 'x_in': x_in, 'x_out_all': x_out_all, 'x_in_all': x_in_all, 'x_ij': x_ij,
+            'q_sum': q_sum}
+    handles = ModelHandles(variables, sums)
+    handles.lazy = lazy
+    add_dynamic_constraints(m, f, dyn, handles, profile)
+    return handles
+
+
+def row(lhs, sense, rhs):
+    # A row as (lhs - rhs, sense) against 0, the constant of the expression is the RHS of the row
+    return lhs - rhs, sense
+
+
+def start_rows(f, dyn, handles):
+    # The rows of the start stations, their structure changes when a vehicle starts somewhere else
+    Stations = f.stations
+    Vehicles = f.vehicles
+    start_stations = dyn.start_stations
+    init_vehicle_load = dyn.init_vehicle_load
+    driving_to_start = dyn.driving_to_start
+
+    t = handles.variables['t']
+    l_V = handles.variables['l_V']
+    t_D = handles.variables['t_D']
+    x_out = handles.sums['x_out']
+    x_in = handles.sums['x_in']
+
+    # Routing constraints
+    routing = [row(x_out[(start_stations[v], v)], GRB.EQUAL, 1) for v in Vehicles]
+    routing += [row(x_in[(j, v)] - x_out[(j, v)], GRB.EQUAL, 0) for j in Stations[:-1] for v in Vehicles
+                if j != start_stations[v]]
+
+    # Time Constraints
+    time_start = [row(t[start_stations[v]], GRB.GREATER_EQUAL, driving_to_start[v])
+                  if start_stations[v] != Stations[0] else row(t_D[v], GRB.GREATER_EQUAL, driving_to_start[v])
+                  for v in Vehicles]
+
+    # Vehicle Loading Constraints
+    loading = [row(l_V[(start_stations[v], v)], GRB.EQUAL, init_vehicle_load[v]) for v in Vehicles]
+
+    return [('routing (start)', routing), ('time (start)', time_start), ('vehicle loading (start)', loading)]
+
+
+def state_rows(f, dyn, handles):
+    # The rows of the loads, rates and Ms, the same rows for every state with other coefficients and RHS
+
+    # ------ SETS -----------------------------------------------------------------------------
+    Stations = f.stations
+    Swap_Stations = Stations[1:-1]
+
+    # ------ FIXED PARAMETERS -----------------------------------------------------------------
+    time_horizon = f.time_horizon
+
+    M_7A = f.M_7A
+    M_7B = f.M_7B
+    M_8A = f.M_8A
+    M_8B = f.M_8B
+    M_9 = f.M_9
+    M_10 = f.M_10
+    M_11 = f.M_11
+    M_12 = f.M_12
+    M_13 = f.M_13
+    M_15 = f.station_cap
+
+    # ------- DYNAMIC PARAMETERS --------------------------------------------------------------
+    init_station_load = dyn.init_station_load
+    init_flat_station_load = dyn.init_flat_station_load
+    ideal_state = dyn.ideal_state
+    demand = dyn.demand
+    incoming_rate = dyn.incoming_rate
+    incoming_flat_rate = dyn.incoming_flat_rate
+
+    # ------ VARIABLES -------------------------------------------------------------------------
+    t = handles.variables['t']
+    l_B = handles.variables['l_B']
+    l_F = handles.variables['l_F']
+    s_B = handles.variables['s_B']
+    s_F = handles.variables['s_F']
+    v_S = handles.variables['v_S']
+    d = handles.variables['d']
+    delta = handles.variables['delta']
+    gamma = handles.variables['gamma']
+    v_Sf = handles.variables['v_Sf']
+    v_SF = handles.variables['v_SF']
+    omega = handles.variables['omega']
+    q_sum = handles.sums['q_sum']
+
+    # Station Loading Constraints
+    loading = [row(l_F[i], GRB.EQUAL, init_flat_station_load[i] + incoming_flat_rate[i] * t[i])
+               for i in Swap_Stations]
+    loading += [row(l_B[i], GRB.EQUAL, init_station_load[i] + (incoming_rate[i] - demand[i]) * t[i] + v_S[i])
+                for i in Swap_Stations]
+
+    # Situation 1
+    situation_1 = []
+    for i in Swap_Stations:
+        s_B_end = init_station_load[i] + (incoming_rate[i] - demand[i]) * time_horizon + v_Sf[i]
+        s_F_end = init_flat_station_load[i] + incoming_flat_rate[i] * time_horizon
+        situation_1 += [row(s_B[i], GRB.LESS_EQUAL, s_B_end + M_7A[i] * gamma[i]),
+                        row(s_B[i], GRB.GREATER_EQUAL, s_B_end - M_7A[i] * gamma[i]),
+                        row(s_F[i], GRB.LESS_EQUAL, s_F_end + M_7B[i] * gamma[i]),
+                        row(s_F[i], GRB.GREATER_EQUAL, s_F_end - M_7B[i] * gamma[i])]
+
+    # Situation 2
+    situation_2 = []
+    for i in Swap_Stations:
+        s_B_end = l_B[i] + q_sum[i] + (incoming_rate[i] - demand[i]) * (time_horizon - t[i]) + v_Sf[i]
+        s_F_end = l_F[i] - q_sum[i] + incoming_flat_rate[i] * (time_horizon - t[i])
+        situation_2 += [row(s_B[i], GRB.LESS_EQUAL, s_B_end + M_8A[i] * (1 - gamma[i] + delta[i])),
+                        row(s_B[i], GRB.GREATER_EQUAL, s_B_end - M_8A[i] * (1 - gamma[i] + delta[i])),
+                        row(s_F[i], GRB.LESS_EQUAL, s_F_end + M_8B[i] * (1 - gamma[i] + delta[i])),
+                        row(s_F[i], GRB.GREATER_EQUAL, s_F_end - M_8B[i] * (1 - gamma[i] + delta[i]))]
+
+    # Situation 3
+    situation_3 = []
+    for i in Swap_Stations:
+        l_B_arrival = s_B[i] + (incoming_rate[i] - demand[i]) * (t[i] - time_horizon) + v_SF[i]
+        l_F_arrival = s_F[i] + incoming_flat_rate[i] * (t[i] - time_horizon)
+        situation_3 += [row(l_B[i], GRB.LESS_EQUAL, l_B_arrival + M_9[i] * (1 - delta[i])),
+                        row(l_B[i], GRB.GREATER_EQUAL, l_B_arrival - M_9[i] * (1 - delta[i])),
+                        row(l_F[i], GRB.LESS_EQUAL, l_F_arrival + M_10[i] * (1 - delta[i])),
+                        row(l_F[i], GRB.GREATER_EQUAL, l_F_arrival - M_10[i] * (1 - delta[i])),
+                        row(l_B[i] - M_15[i] * (1 - omega[i]), GRB.LESS_EQUAL, 0),
+                        row(sys.float_info.epsilon - omega[i], GRB.LESS_EQUAL, l_B[i]),
+                        row((v_S[i] - v_SF[i]) - M_11[i] * (omega[i] - delta[i] + 1), GRB.LESS_EQUAL, 0),
+                        row(v_SF[i], GRB.LESS_EQUAL, M_12[i] * delta[i]),
+                        row(v_SF[i] - M_13[i] * (1 - delta[i]), GRB.LESS_EQUAL, v_S[i])]
+
+    # ------- DEVIATIONS -----------------------------------------------------------------------------
+    deviations = [row(d[i], GRB.GREATER_EQUAL, ideal_state[i] - s_B[i]) for i in Swap_Stations]
+    deviations += [row(d[i], GRB.GREATER_EQUAL, s_B[i] - ideal_state[i]) for i in Swap_Stations]
+
+    return [('station loading (rates)', loading), ('situation 1', situation_1), ('situation 2', situation_2),
+            ('situation 3', situation_3), ('deviations', deviations)]
+
+
+def add_rows(m, groups, profile):
+    constrs = []
+    for name, rows in groups:
+        constrs += [m.addLConstr(expr, sense, 0) for expr, sense in rows]
+        profile.mark(m, name)
+    return constrs
+
+
+def set_rows(m, constrs, groups):
+    # The rows keep their place in the model, so the basis and MIP start stay valid. Only the coefficients and
+    # the RHS are set, a term that appears more than once in an expression is summed first
+    rows = [row for _, rows in groups for row in rows]
+    for constr, (expr, sense) in zip(constrs, rows):
+        coefficients = {}
+        for k in range(expr.size()):
+            var = expr.getVar(k)
+            coefficients[var.index] = (var, coefficients.get(var.index, (var, 0))[1] + expr.getCoeff(k))
+        for var, coefficient in coefficients.values():
+            m.chgCoeff(constr, var, coefficient)
+    m.setAttr('RHS', constrs, [-expr.getConstant() for expr, sense in rows])
+
+
+def add_dynamic_constraints(m, f, dyn, handles, profile=None):
+    # Every row that depends on DynamicFileVariables (or on the Ms derived from it) is added here,
+    # so a persistent model can update exactly these rows when the state changes
+    if profile is None:
+        profile = ModelProfile(enabled=False)
+    handles.start_constrs = add_rows(m, start_rows(f, dyn, handles), profile)
+    handles.state_constrs = add_rows(m, state_rows(f, dyn, handles), profile)
+
+
+def update_dynamic_constraints(m, f, dyn, handles, same_starts=True):
+    # The rows of a new state in place, only the start station rows are replaced when a start station changed
+    if same_starts:
+        set_rows(m, handles.start_constrs, start_rows(f, dyn, handles))
+    else:
+        m.remove(handles.start_constrs)
+        handles.start_constrs = add_rows(m, start_rows(f, dyn, handles), ModelProfile(enabled=False))
+    set_rows(m, handles.state_constrs, state_rows(f, dyn, handles))
+
+
+def run_model(instance, last_mode=False, profile=None, mip_start=False, time_limit=60*60, params=None,
+              arc_pruning=False, k_nearest=None, tight_ms=False, lazy=False, anytime=None, start_routes=None):
+
+    if last_mode and os.path.exists(last_instance_path):
+        # Replays the instance saved by the last generated run
+        last_instance = load_instance(last_instance_path)
+        f = last_instance.fixed
+        d = last_instance.dynamic
+    elif last_mode:
         f = FixedFileVariables()
         d = DynamicFileVariables()
     else:
         f = instance.fixed
         d = instance.dynamic
 
+    keep = None
+    arc_mask = None
+    if arc_pruning or k_nearest is not None or tight_ms:
+        # The Ms are recomputed on a copy, the instance keeps the ones for the full graph
+        f = copy.copy(f)
+    if arc_pruning or k_nearest is not None:
+        keep = prune_arcs(f, d, k_nearest)
+        arc_mask = keep.any(axis=2)
+        GenMs(f, d, arc_mask)
+        arcs = arc_summary(keep)
+        print("Kept {} of {} arcs ({:.1%} removed)".format(arcs['kept_arcs'], arcs['arcs'], arcs['reduction']))
+        if profile is not None:
+            profile.arcs = arcs
+    if tight_ms:
+        ms = TightMs(f, d, arc_mask).report
+        print("Tight Ms: " + ", ".join("{} {:.1%}".format(name, value['reduction']) for name, value in ms.items()
+                                       if value['reduction'] > 0))
+        if profile is not None:
+            profile.ms = ms
+
     try:
         m = Model("Bicycle")
-        m.setParam('TimeLimit', 60*60)
+        m.setParam('TimeLimit', time_limit)
+        if params is not None:
+            for name, value in params.items():
+                m.setParam(name, value)
         start_time = time.time()
 
-        # ------ SETS -----------------------------------------------------------------------------
-        Stations = f.stations
-        Swap_Stations = Stations[1:-1]
-        Vehicles = f.vehicles
-
-        # ------ FIXED PARAMETERS -----------------------------------------------------------------
-        time_horizon = f.time_horizon
-        vehicle_cap = f.vehicle_cap
-        station_cap = f.station_cap
-        driving_times = f.driving_times
-        parking_time = f.parking_time
-        handling_time = f.handling_time
-
-        M_1 = f.M_1
-        M_2 = f.M_2
-        M_3 = f.M_3
-        M_4 = f.M_4
-        M_5 = f.M_5
-        M_6 = f.M_6
-        M_7A = f.M_7A
-        M_7B = f.M_7B
-        M_8A = f.M_8A
-        M_8B = f.M_8B
-        M_9 = f.M_9
-        M_10 = f.M_10
-        M_11 = f.M_11
-        M_12 = f.M_12
-        M_13 = f.M_13
-        M_14 = f.M_14
-        M_15 = f.station_cap
-
-        w_dev_reward = f.w_dev_reward
-        w_driving_times = f.w_driving_time
-        w_dev_obj = f.w_dev_obj
-        w_reward = f.w_reward
-        w_violation = f.w_violation
-
-        # ------- DYNAMIC PARAMETERS --------------------------------------------------------------
-        start_stations = d.start_stations
-        init_vehicle_load = d.init_vehicle_load
-        init_station_load = d.init_station_load
-        init_flat_station_load = d.init_flat_station_load
-        ideal_state = d.ideal_state
-        driving_to_start = d.driving_to_start
-        demand = d.demand
-        incoming_rate = d.incoming_rate
-        incoming_flat_rate = d.incoming_flat_rate
-
-        # ------ VARIABLES -------------------------------------------------------------------------
-        x = m.addVars({(i, j, v) for i in Stations[:-1]
-                         for j in Stations for v in Vehicles}, vtype=GRB.BINARY, lb=0, name="x")
-        t = m.addVars({i for i in Stations[1:]}, vtype=GRB.CONTINUOUS, lb=0, name="t")
-        q = m.addVars({(i, v) for i in Swap_Stations for v in Vehicles}, vtype=GRB.INTEGER, lb=0, name="q")
-        l_B = m.addVars({i for i in Swap_Stations}, vtype=GRB.CONTINUOUS, lb=0, name="l_B")
-        l_F = m.addVars({i for i in Swap_Stations}, vtype=GRB.CONTINUOUS, lb=0, name="l_F")
-        l_V = m.addVars({(i, v) for i in Stations for v in Vehicles}, vtype=GRB.INTEGER, lb=0, name="l_V")
-        s_B = m.addVars({i for i in Swap_Stations}, vtype=GRB.CONTINUOUS, lb=0, name="s_B")
-        s_F = m.addVars({i for i in Swap_Stations}, vtype=GRB.CONTINUOUS, lb=0, name="s_F")
-        v_S = m.addVars({i for i in Swap_Stations}, vtype=GRB.CONTINUOUS, lb=0, name="v_S")
-        d = m.addVars({i for i in Swap_Stations}, vtype=GRB.CONTINUOUS, lb=0, name="d")
-        delta = m.addVars({i for i in Swap_Stations}, vtype=GRB.BINARY, name="delta")
-        gamma = m.addVars({i for i in Swap_Stations}, vtype=GRB.BINARY, name="gamma")
-        v_Sf = m.addVars({i for i in Swap_Stations}, vtype=GRB.CONTINUOUS, name="v_Sf")
-        v_SF = m.addVars({i for i in Swap_Stations}, vtype=GRB.CONTINUOUS, name="v_SF")
-        omega = m.addVars({i for i in Stations}, vtype=GRB.BINARY, name="omega")
-        r_D = m.addVars({i for i in Swap_Stations}, vtype=GRB.CONTINUOUS, lb=0, name="r_D")
-        t_f = m.addVars({v for v in Vehicles}, vtype=GRB.CONTINUOUS, lb=0, name="t_f")
-        t_D = m.addVars({v for v in Vehicles}, vtype=GRB.CONTINUOUS, lb=0, name="t_D")
-
-        # ------- FEASIBILITY CONSTRAINTS ----------------------------------------------------------
-        # Routing constraints
-        m.addConstrs(x.sum(start_stations[v], '*', v) == 1 for v in Vehicles)
-        m.addConstrs(x.sum('*', Stations[-1], v) == 1 for v in Vehicles)
-        for j in Stations[:-1]:
-            for v in Vehicles:
-                if j != start_stations[v]:
-                    m.addConstr(x.sum('*', j, v) - x.sum(j, '*', v) == 0)
-        m.addConstrs(x.sum('*', j, '*') <= 1 for j in Swap_Stations)
-        m.addConstrs(x.sum('*', Stations[0], v) <= 1 for v in Vehicles)
-        m.addConstrs(x.sum('*', '*', v) <= (len(Stations)-1) for v in Vehicles)
-        for i in Stations[:-1]:
-            for j in Stations:
-                if i == j:
-                    m.addConstrs(x[(i, j, v)] <= 0 for v in Vehicles)
-        m.addConstrs(x[(Stations[0], Stations[-1], v)] <= 0 for v in Vehicles)
-
-        # Time Constraints
-        m.addConstrs(t[i] + parking_time + handling_time * q.sum(i, '*') + driving_times[i][j]
-                     - t[j] - M_1[i][j] * (1 - x.sum(i, j, '*')) <= 0 for i in Swap_Stations for j in Stations[1:])
-        m.addConstrs(t[i] + parking_time + handling_time * q.sum(i, v) + driving_times[i][Stations[0]]
-                     - t_D[v] - M_1[i][Stations[0]] * (1 - x.sum(i, Stations[0], v)) <= 0 for i in Swap_Stations
-                     for v in Vehicles)
-        m.addConstrs(t_D[v] + parking_time + driving_times[Stations[0]][j]
-                     - t[j] - M_1[0][j] * (1 - x.sum(Stations[0], j, v)) <= 0 for j in Stations[1:] for v in Vehicles)
-        for v in Vehicles:
-            if start_stations[v] != Stations[0]:
-                m.addConstr(t[start_stations[v]] >= driving_to_start[v])
-            else:
-                m.addConstr(t_D[v] >= driving_to_start[v])
-        m.addConstrs(t[i] - time_horizon - M_2[i] * x.sum(i, Stations[-1], '*') <= 0 for i in Swap_Stations)
-        m.addConstrs(t_D[v] - time_horizon - M_2[0] * x.sum(Stations[0], Stations[-1], v) <= 0 for v in Vehicles)
-        m.addConstrs(t[i] - M_3[i] * x.sum(i, '*', '*') <= 0 for i in Swap_Stations)
-        m.addConstrs(t_D[v] - M_3[0] * x.sum(Stations[0], '*', v) <= 0 for v in Vehicles)
-
-        # Vehicle Loading Constraints
-        m.addConstrs(q[(i, v)] <= l_V[(i, v)] for i in Swap_Stations for v in Vehicles)
-        m.addConstrs(l_V[(start_stations[v], v)] == init_vehicle_load[v] for v in Vehicles)
-        m.addConstrs(
-            l_V[(j, v)] - vehicle_cap[v] - M_4 * (1 - x[(Stations[0], j, v)]) <= 0 for j in Stations for v in Vehicles)
-        m.addConstrs(
-            l_V[(j, v)] - vehicle_cap[v] + M_4 * (1 - x[(Stations[0], j, v)]) >= 0 for j in Stations for v in Vehicles)
-        m.addConstrs(-l_V[(j, v)] + l_V[(i, v)] - q[(i, v)] - M_5 * (
-                1 - x[(i, j, v)]) <= 0 for i in Swap_Stations for j in Stations for v in Vehicles)
-        m.addConstrs(-l_V[(j, v)] + l_V[(i, v)] - q[(i, v)] + M_5 * (
-                1 - x[(i, j, v)]) >= 0 for i in Swap_Stations for j in Stations for v in Vehicles)
-
-        # Station Loading Constraints
-        m.addConstrs(l_F[i] == init_flat_station_load[i] + incoming_flat_rate[i] * t[i] for i in Swap_Stations)
-
-        m.addConstrs(l_B[i] == init_station_load[i] + (
-                incoming_rate[i] - demand[i]) * t[i] + v_S[i] for i in Swap_Stations)
-
-        m.addConstrs(q.sum(i, '*') <= l_F[i] for i in Swap_Stations)
-        m.addConstrs(q[(i, v)] - vehicle_cap[v] * x.sum(i, '*', v) <= 0 for i in Swap_Stations for v in Vehicles)
-        m.addConstrs(q[(j, v)] - x.sum('*', j, v) >= 0 for j in Swap_Stations for v in Vehicles)
-
-        # ------- VIOLATION CONSTRAINTS ------------------------------------------------------------------
-        m.addConstrs(t[i] <= time_horizon + M_6[i] * delta[i] for i in Swap_Stations)
-        m.addConstrs(t[i] >= time_horizon * delta[i] for i in Swap_Stations)
-        m.addConstrs(delta[i] <= x.sum(i, Stations[-1], '*') for i in Swap_Stations)
-        m.addConstrs(gamma[i] == x.sum(i, '*', '*') for i in Swap_Stations)
-
-        # Situation 1
-        m.addConstrs(s_B[i] <= init_station_load[i] + (incoming_rate[i] - demand[i]
-                                                        ) * time_horizon + v_Sf[i] + M_7A[i] * gamma[i] for i in
-                     Swap_Stations)
-        m.addConstrs(s_B[i] >= init_station_load[i] + (incoming_rate[i] - demand[i]
-                                                        ) * time_horizon + v_Sf[i] - M_7A[i] * gamma[i] for i in Swap_Stations)
-        m.addConstrs(s_F[i] <= init_flat_station_load[i] +
-                     incoming_flat_rate[i] * time_horizon + M_7B[i] * gamma[i] for i in Swap_Stations)
-        m.addConstrs(s_F[i] >= init_flat_station_load[i] +
-                     incoming_flat_rate[i] * time_horizon - M_7B[i] * gamma[i] for i in Swap_Stations)
-
-        # Situation 2
-        m.addConstrs(s_B[i] <= l_B[i] + q.sum(i, '*') + (incoming_rate[i]-demand[i]) * (
-                    time_horizon - t[i]) + v_Sf[i] + M_8A[i] * (1 - gamma[i] + delta[i]) for i in Swap_Stations)
-        m.addConstrs(s_B[i] >= l_B[i] + q.sum(i, '*') + (incoming_rate[i] - demand[i]) * (
-                    time_horizon - t[i]) + v_Sf[i] - M_8A[i] * (1 - gamma[i] + delta[i]) for i in Swap_Stations)
-        m.addConstrs(s_F[i] <= l_F[i] - q.sum(i, '*') + incoming_flat_rate[i] * (
-                    time_horizon - t[i]) + M_8B[i] * (1 - gamma[i] + delta[i]) for i in Swap_Stations)
-        m.addConstrs(s_F[i] >= l_F[i] - q.sum(i, '*') + incoming_flat_rate[i] * (
-                    time_horizon - t[i]) - M_8B[i] * (1 - gamma[i] + delta[i]) for i in Swap_Stations)
-
-        # Situation 3
-        m.addConstrs(l_B[i] <= s_B[i] + (incoming_rate[i] - demand[i]) * (
-                    t[i] - time_horizon) + v_SF[i] + M_9[i] * (1 - delta[i]) for i in Swap_Stations)
-        m.addConstrs(l_B[i] >= s_B[i] + (incoming_rate[i] - demand[i]) * (
-                t[i] - time_horizon) + v_SF[i] - M_9[i] * (1 - delta[i]) for i in Swap_Stations)
-        m.addConstrs(l_F[i] <= s_F[i] + incoming_flat_rate[i] * (t[i]-time_horizon) + M_10[i] * (1 - delta[i]
-                                                                                           ) for i in Swap_Stations)
-        m.addConstrs(l_F[i] >= s_F[i] + incoming_flat_rate[i] * (t[i] - time_horizon) - M_10[i] * (1 - delta[i]
-                                                                                             ) for i in Swap_Stations)
-        m.addConstrs(l_B[i] - M_15[i] * (1-omega[i]) <= 0 for i in Swap_Stations)
-        m.addConstrs(sys.float_info.epsilon - omega[i] <= l_B[i] for i in Swap_Stations)
-        m.addConstrs((v_S[i] - v_SF[i]) - M_11[i] * (omega[i] - delta[i] + 1) <= 0 for i in Swap_Stations)
-        m.addConstrs(v_SF[i] <= M_12[i] * delta[i] for i in Swap_Stations)
-        m.addConstrs(v_SF[i] - M_13[i] * (1 - delta[i]) <= v_S[i] for i in Swap_Stations)
-
-        # ------- DEVIATIONS -----------------------------------------------------------------------------
-        m.addConstrs(d[i] >= ideal_state[i] - s_B[i] for i in Swap_Stations)
-        m.addConstrs(d[i] >= s_B[i] - ideal_state[i] for i in Swap_Stations)
-
-        # ------- OBJECTIVE CONSTRAINTS ------------------------------------------------------------------
-        m.addConstrs(r_D[i] <= q.sum(i, '*') + station_cap[i] * (1 - delta[i])
-                     for i in Swap_Stations)
-        m.addConstrs(r_D[i] <= delta[i] * station_cap[i] for i in Swap_Stations)
-        m.addConstrs(t_f[v] - t[i] + time_horizon + M_14[v] * (1 - x[(i, Stations[-1], v)]) >= 0
-                     for i in Swap_Stations for v in Vehicles)
-
-        # ------- OBJECTIVE ------------------------------------------------------------------------------
-        m.setObjective(w_violation * (v_S.sum('*') - v_SF.sum('*') + v_Sf.sum('*')) + w_dev_obj * d.sum('*')
-                       - w_reward * (w_dev_reward * r_D.sum('*') - w_driving_times * t_f.sum('*')), GRB.MINIMIZE)
-
-        m.optimize()
+        handles = build_model(m, f, d, profile, keep, lazy)
+        m._handles = handles
+        if start_routes is not None:
+            set_mip_start(m, handles, f, d, start_routes)
+        elif mip_start:
+            set_mip_start(m, handles, f, d)
+
+        callbacks = []
+        if profile is not None:
+            callbacks.append(profile.callback)
+        if handles.lazy is not None:
+            m.setParam('LazyConstraints', 1)
+            callbacks.append(handles.lazy.callback)
+        if anytime is not None:
+            # An AnytimeSolve from Model/anytime.py, it streams the incumbents and applies its stopping rules
+            anytime.attach(f, handles)
+            callbacks.append(anytime.callback)
+        if callbacks:
+            m.optimize(combine_callbacks(callbacks))
+        else:
+            m.optimize()
+        if anytime is not None:
+            anytime.finish(m)
+        if profile is not None:
+            if handles.lazy is not None:
+                profile.lazy = handles.lazy.summary()
+            if anytime is not None:
+                profile.anytime = anytime.summary()
+            profile.record_solve(m)
+            profile.stop()
         end_time = time.time()
 
         exec_time = end_time - start_time
@@ -212,3 +455,71 @@ def run_model(instance, last_mode=False):
 
     except GurobiError:
         print("Error")
+
+
+def profile_build_memory(instance, keep=None, lazy=False):
+    # A separate build with tracemalloc on for the peak memory per phase, the times of this pass are not the
+    # build times. Nothing is solved
+    m = Model("Bicycle")
+    profile = ModelProfile(memory=True)
+    try:
+        build_model(m, instance.fixed, instance.dynamic, profile, keep, lazy)
+    finally:
+        profile.stop()
+        m.dispose()
+    return profile
+
+
+def compare_arc_pruning(instance, k_nearest=None, time_limit=60):
+    results = {}
+    for arc_pruning in (False, True):
+        profile = ModelProfile()
+        m, exec_time = run_model(instance, profile=profile, time_limit=time_limit, arc_pruning=arc_pruning,
+                                 k_nearest=k_nearest if arc_pruning else None)
+        results['pruned' if arc_pruning else 'full'] = {
+            'arcs': len(m._handles.variables['x']), 'build_time': profile.build_time(),
+            'columns': profile.solver['columns'], 'rows': profile.solver['rows'],
+            'objective': profile.solver.get('objective'),
+            'gap': profile.solver.get('gap'), 'runtime': profile.solver['runtime']}
+    return results
+
+
+def compare_tight_ms(instance, time_limit=60, arc_pruning=False):
+    results = {}
+    for tight_ms in (False, True):
+        profile = ModelProfile()
+        m, exec_time = run_model(instance, profile=profile, time_limit=time_limit, arc_pruning=arc_pruning,
+                                 tight_ms=tight_ms)
+        results['tight' if tight_ms else 'loose'] = {
+            'ms': profile.ms, 'build_time': profile.build_time(), 'root_gap': profile.solver.get('root_gap'),
+            'objective': profile.solver.get('objective'), 'gap': profile.solver.get('gap'),
+            'node_count': profile.solver['node_count'], 'runtime': profile.solver['runtime']}
+    return results
+
+
+def compare_lazy(instance, time_limit=60, arc_pruning=False, tight_ms=False):
+    results = {}
+    for lazy in (False, True):
+        profile = ModelProfile()
+        m, exec_time = run_model(instance, profile=profile, time_limit=time_limit, arc_pruning=arc_pruning,
+                                 tight_ms=tight_ms, lazy=lazy)
+        runtime = profile.solver['runtime']
+        results['lazy' if lazy else 'eager'] = {
+            'rows': profile.solver['rows'], 'nonzeros': profile.solver['nonzeros'], 'lazy': profile.lazy,
+            'build_time': profile.build_time(), 'node_count': profile.solver['node_count'],
+            'nodes_per_second': profile.solver['node_count'] / runtime if runtime > 0 else None,
+            'objective': profile.solver.get('objective'), 'gap': profile.solver.get('gap'), 'runtime': runtime}
+    return results
+
+
+def compare_mip_start(instance, time_limit=60):
+    results = {}
+    for mip_start in (False, True):
+        profile = ModelProfile()
+        m, exec_time = run_model(instance, profile=profile, mip_start=mip_start, time_limit=time_limit)
+        results['with start' if mip_start else 'without start'] = {
+            'first_incumbent_time': profile.solver.get('first_incumbent_time'),
+            'first_incumbent_objective': profile.solver.get('first_incumbent_objective'),
+            'objective': profile.solver.get('objective'), 'gap': profile.solver.get('gap'),
+            'runtime': profile.solver['runtime']}
+    return results
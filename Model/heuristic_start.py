@@ -0,0 +1,104 @@
+import numpy as np
+import math
+
+
+def projected_deficit(f, d):
+    # Battery bikes missing at the end of the horizon if the station is not visited
+    T = f.time_horizon
+    projected = np.asarray(d.init_station_load, dtype=float) + (
+            np.asarray(d.incoming_rate, dtype=float) - np.asarray(d.demand, dtype=float)) * T
+    return np.asarray(d.ideal_state, dtype=float) - projected
+
+
+def swap_quantity(f, d, deficit, station, arrival, load):
+    flat = d.init_flat_station_load[station] + d.incoming_flat_rate[station] * arrival
+    wanted = max(1, math.ceil(deficit[station]))
+    return int(min(load, math.floor(flat), wanted))
+
+
+def construct_routes(f, d):
+    # Greedy: every vehicle repeatedly drives to the unvisited station with the largest projected deficit
+    # per minute of driving and parking, as long as it arrives within the horizon and can swap a battery
+    Stations = f.stations
+    n = len(Stations)
+    end = Stations[-1]
+    T = f.time_horizon
+    driving_times = np.asarray(f.driving_times, dtype=float)
+    init_flat = np.asarray(d.init_flat_station_load, dtype=float)
+    flat_rate = np.asarray(d.incoming_flat_rate, dtype=float)
+    deficit = projected_deficit(f, d)
+
+    visited = np.zeros(n, dtype=bool)
+    visited[[Stations[0], end]] = True
+    visited[list(d.start_stations)] = True
+
+    routes = {}
+    for v in f.vehicles:
+        current = d.start_stations[v]
+        arrival = float(d.driving_to_start[v])
+        load = d.init_vehicle_load[v]
+        if current == Stations[0]:
+            route = [(current, arrival, 0, load)]
+            leave = arrival + f.parking_time
+            load = f.vehicle_cap[v]
+        else:
+            q = max(0, swap_quantity(f, d, deficit, current, arrival, load))
+            route = [(current, arrival, q, load)]
+            deficit[current] -= q
+            leave = arrival + f.parking_time + f.handling_time * q
+            load -= q
+
+        while load >= 1:
+            arrivals = leave + driving_times[current]
+            feasible = ~visited & (arrivals <= T) & (np.floor(init_flat + flat_rate * arrivals) >= 1)
+            candidates = feasible & (deficit > 0)
+            if not candidates.any():
+                # The depot has no arc to the end station, so a vehicle starting there must visit a station
+                if current != Stations[0] or not feasible.any():
+                    break
+                candidates = feasible
+            score = np.where(candidates, deficit / (driving_times[current] + f.parking_time), -np.inf)
+            j = int(np.argmax(score))
+            q = swap_quantity(f, d, deficit, j, arrivals[j], load)
+            route.append((j, float(arrivals[j]), q, load))
+            visited[j] = True
+            deficit[j] -= q
+            leave = arrivals[j] + f.parking_time + f.handling_time * q
+            load -= q
+            current = j
+
+        if current == Stations[0]:
+            return None
+        route.append((end, leave, 0, load))
+        routes[v] = route
+    return routes
+
+
+def set_mip_start(m, handles, f, d, routes=None):
+    # routes as from construct_routes, e.g. repaired from a cached solution, the greedy ones by default
+    if routes is None:
+        routes = construct_routes(f, d)
+    if routes is None:
+        return None
+    values = {name: {key: 0 for key in handles.variables[name].keys()} for name in ('x', 't', 't_D', 'q', 'l_V')}
+    end = f.stations[-1]
+    for v, route in routes.items():
+        for (i, t_i, q_i, load_i), (j, t_j, _, _) in zip(route[:-1], route[1:]):
+            # A route over an arc removed from a sparse arc set is no start for this model
+            if (i, j, v) not in values['x']:
+                return None
+            values['x'][(i, j, v)] = 1
+        for i, t_i, q_i, load_i in route:
+            if i == f.stations[0]:
+                values['t_D'][v] = t_i
+            elif i == end:
+                values['t'][end] = max(values['t'][end], t_i)
+            else:
+                values['t'][i] = t_i
+                values['q'][(i, v)] = q_i
+            values['l_V'][(i, v)] = load_i
+
+    for name, var_values in values.items():
+        var_dict = handles.variables[name]
+        m.setAttr('Start', [var_dict[key] for key in var_values], list(var_values.values()))
+    return routes
@@ -0,0 +1,85 @@
+import numpy as np
+from gurobipy import GRB, LinExpr
+
+
+class LazyConstraints:
+    # Rows that are left out of the model and only added from the callback when an incumbent or a node
+    # relaxation violates them. Every row is stored as lhs <= 0 over the model columns, so one pass over the
+    # solution values gives the violation of all rows
+
+    def __init__(self, m, tolerance=1e-6):
+        self.model = m
+        self.tolerance = tolerance
+        self.families = []
+        self.row_family = []
+        self.row_indices = []
+        self.row_coefs = []
+        self.row_const = []
+        self.added = {}
+        self.indices = None
+        self.variables = None
+
+    def add_rows(self, family, exprs, sense=GRB.LESS_EQUAL):
+        # exprs are LinExpr for rows expr <= 0, or expr >= 0 with sense GRB.GREATER_EQUAL
+        self.model.update()
+        sign = 1 if sense == GRB.LESS_EQUAL else -1
+        if family not in self.families:
+            self.families.append(family)
+            self.added[family] = 0
+        for expr in exprs:
+            terms = {}
+            for k in range(expr.size()):
+                index = expr.getVar(k).index
+                terms[index] = terms.get(index, 0) + sign * expr.getCoeff(k)
+            self.row_family.append(self.families.index(family))
+            self.row_indices.append(list(terms.keys()))
+            self.row_coefs.append(list(terms.values()))
+            self.row_const.append(sign * expr.getConstant())
+        self.indices = None
+
+    def __len__(self):
+        return len(self.row_const)
+
+    def finish(self):
+        lengths = [len(indices) for indices in self.row_indices]
+        self.starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(int)
+        self.indices = np.concatenate(self.row_indices).astype(int)
+        self.coefs = np.concatenate(self.row_coefs)
+        self.const = np.asarray(self.row_const, dtype=float)
+        self.family = np.asarray(self.row_family, dtype=int)
+
+    def violated(self, values):
+        if self.indices is None:
+            self.finish()
+        lhs = np.add.reduceat(self.coefs * values[self.indices], self.starts) + self.const
+        return np.flatnonzero(lhs > self.tolerance)
+
+    def callback(self, model, where):
+        if where == GRB.Callback.MIPSOL:
+            get_values = model.cbGetSolution
+        elif where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_STATUS) == GRB.OPTIMAL:
+            get_values = model.cbGetNodeRel
+        else:
+            return
+        if self.variables is None:
+            self.variables = model.getVars()
+        values = np.asarray(get_values(self.variables), dtype=float)
+        for row in self.violated(values):
+            start = self.starts[row]
+            end = start + len(self.row_indices[row])
+            model.cbLazy(LinExpr(self.coefs[start:end].tolist(),
+                                 [self.variables[k] for k in self.indices[start:end]]) <= -self.const[row])
+            self.added[self.families[self.family[row]]] += 1
+
+    def summary(self):
+        counts = np.bincount(np.asarray(self.row_family, dtype=int), minlength=len(self.families))
+        return {'rows': {family: int(count) for family, count in zip(self.families, counts)},
+                'added': dict(self.added)}
+
+
+def combine_callbacks(callbacks):
+    # Gurobi takes one callback, every callback in the list sees every call in order
+    def callback(model, where):
+        for function in callbacks:
+            function(model, where)
+    return callback
@@ -0,0 +1,152 @@
+import numpy as np
+
+
+def solution_plan(solution):
+    # (stations, arrivals, quantities) of the swap stations every vehicle visits, in route order
+    swap = set(solution.fixed.stations[1:-1])
+    plan = []
+    for v, route in sorted(solution.routes().items()):
+        visits = [(i, t, q) for i, j, t, driving_time, q in route if i in swap]
+        plan.append((v, np.array([i for i, t, q in visits], dtype=int), np.array([t for i, t, q in visits]),
+                     np.array([q for i, t, q in visits], dtype=float)))
+    return plan
+
+
+def route_plan(evaluator, routes):
+    # The same for the routes of the ALNS, simulated by its RouteEvaluator
+    plan = []
+    for v, route in sorted(routes.items()):
+        simulated = evaluator.simulate(v, route)
+        if simulated is not None:
+            stations, arrivals, quantities = simulated[:3]
+            plan.append((v, stations, arrivals, quantities.astype(float)))
+    return plan
+
+
+class PlanOutcome:
+    # Per sample and swap station values of one plan, with the objective of the model per sample
+
+    def __init__(self, violation, deviation, reward, t_f, score):
+        self.violation = violation
+        self.deviation = deviation
+        self.reward = reward
+        self.t_f = t_f
+        self.score = score
+
+    @staticmethod
+    def distribution(values, percentiles):
+        stats = {'mean': float(np.mean(values)), 'std': float(np.std(values))}
+        for p, value in zip(percentiles, np.percentile(values, percentiles)):
+            stats['p{}'.format(p)] = float(value)
+        return stats
+
+    def summary(self, percentiles=(5, 50, 95)):
+        return {'score': self.distribution(self.score, percentiles),
+                'violation': self.distribution(self.violation.sum(axis=1), percentiles),
+                'deviation': self.distribution(self.deviation.sum(axis=1), percentiles),
+                'violation_probability': float(np.mean(self.violation.sum(axis=1) > 0)),
+                'station_violation_probability': np.mean(self.violation > 0, axis=0).tolist()}
+
+
+class MonteCarloEvaluator:
+    # Scores plans against sampled realizations of the station rates instead of the rates themselves. The charged,
+    # flat and demand counts of every swap station are Poisson per time step, drawn once as a
+    # (samples x stations x steps) array, so every plan is scored on the same realizations. The charged load is a
+    # walk that is reflected at zero, demand that finds the station empty is a violation. A swap of q at step b lifts
+    # the walk by q from b on, so its lowest point is min(lowest before b, q + lowest from b): with the running minima
+    # from both ends kept, a plan costs one lookup per sample and station instead of another pass over the steps.
+    # With travel_noise every driving time is scaled by a lognormal factor per sample and destination, delays add up
+    # along a route and a visit pushed past the horizon counts like a late one in the model
+
+    def __init__(self, f, d, samples=1000, steps=50, travel_noise=0.0, seed=0):
+        self.f = f
+        self.d = d
+        self.samples = samples
+        self.steps = steps
+        self.step = f.time_horizon / steps
+        self.swap = np.array(f.stations[1:-1], dtype=int)
+        self.column = np.full(len(f.stations), -1)
+        self.column[self.swap] = np.arange(len(self.swap))
+        self.driving_times = np.asarray(f.driving_times, dtype=float)
+        self.init_load = np.asarray(d.init_station_load, dtype=float)[self.swap]
+        self.init_flat = np.asarray(d.init_flat_station_load, dtype=float)[self.swap]
+        self.ideal = np.asarray(d.ideal_state, dtype=float)[self.swap]
+        self.station_cap = np.asarray(f.station_cap, dtype=float)[self.swap]
+        rng = np.random.default_rng(seed)
+        shape = (samples, len(self.swap), steps)
+
+        def counts(rate):
+            return rng.poisson(np.asarray(rate, dtype=float)[self.swap, None] * self.step, shape)
+        self.set_paths(counts(d.incoming_rate), counts(d.demand), counts(d.incoming_flat_rate))
+        self.travel_factor = None
+        if travel_noise > 0:
+            # Mean one, so the driving times are right on average
+            self.travel_factor = rng.lognormal(-travel_noise ** 2 / 2, travel_noise, (samples, len(f.stations)))
+
+    def set_paths(self, incoming, demand, incoming_flat):
+        # Counts per sample, swap station and step, e.g. replayed from trip logs instead of sampled
+        samples, n_swap, steps = np.shape(demand)
+        increment = np.asarray(incoming) - np.asarray(demand)
+        net = np.zeros((samples, n_swap, steps + 1), dtype=np.result_type(increment, np.int32))
+        np.cumsum(increment, axis=2, out=net[:, :, 1:])
+        self.net_at_T = net[:, :, -1]
+        self.lowest_before = np.minimum.accumulate(net, axis=2)
+        self.lowest_from = np.minimum.accumulate(net[:, :, ::-1], axis=2)[:, :, ::-1]
+        self.flat = np.zeros((samples, n_swap, steps + 1), dtype=np.result_type(incoming_flat, np.int32))
+        np.cumsum(incoming_flat, axis=2, out=self.flat[:, :, 1:])
+        self.samples = samples
+        self.steps = steps
+        self.step = self.f.time_horizon / steps
+
+    def legs(self, v, stations):
+        # Driving time into every visit, the first one from where the vehicle is at the start of the horizon
+        start = self.d.start_stations[v]
+        previous = np.concatenate(([start], stations[:-1]))
+        legs = self.driving_times[previous, stations]
+        legs[0] = self.d.driving_to_start[v] + (0 if stations[0] == start else legs[0])
+        return legs
+
+    def visits(self, plan):
+        # Arrival time per sample and swap station, inf when not visited, the planned quantities and t_f
+        T = self.f.time_horizon
+        arrival = np.full((self.samples, len(self.swap)), np.inf)
+        quantity = np.zeros(len(self.swap))
+        t_f = np.zeros(self.samples)
+        for v, stations, arrivals, quantities in plan:
+            if len(stations) == 0:
+                continue
+            arrivals = np.broadcast_to(np.asarray(arrivals, dtype=float), (self.samples, len(stations)))
+            if self.travel_factor is not None:
+                delay = self.legs(v, stations) * (self.travel_factor[:, stations] - 1)
+                arrivals = arrivals + np.cumsum(delay, axis=1)
+            arrival[:, self.column[stations]] = arrivals
+            quantity[self.column[stations]] += quantities
+            t_f += np.maximum(0, arrivals[:, -1] - T)
+        return arrival, quantity, t_f
+
+    def evaluate(self, plan):
+        f = self.f
+        arrival, quantity, t_f = self.visits(plan)
+        within = arrival <= f.time_horizon
+        late = np.isfinite(arrival) & ~within
+        step = np.where(within, np.clip(np.rint(np.where(within, arrival, 0) / self.step), 0, self.steps),
+                        self.steps).astype(int)[:, :, None]
+        # No more is swapped than there are flat batteries at the station
+        flat = self.init_flat + np.take_along_axis(self.flat, step, axis=2)[:, :, 0]
+        q = np.where(within, np.minimum(quantity, flat), 0)
+        lowest = self.init_load + np.minimum(np.take_along_axis(self.lowest_before, step, axis=2)[:, :, 0],
+                                             q + np.take_along_axis(self.lowest_from, step, axis=2)[:, :, 0])
+        violation = np.maximum(0, -lowest)
+        s_B = self.init_load + self.net_at_T + q + violation
+        deviation = np.abs(self.ideal - s_B)
+        reward = np.where(late, np.minimum(quantity, self.station_cap), 0)
+        score = (f.w_violation * violation.sum(axis=1) + f.w_dev_obj * deviation.sum(axis=1)
+                 - f.w_reward * (f.w_dev_reward * reward.sum(axis=1) - f.w_driving_time * t_f))
+        return PlanOutcome(violation, deviation, reward, t_f, score)
+
+    def rank(self, plans, percentile=None):
+        # Indices of the plans from best to worst by mean score, or by a percentile of it for a risk averse choice
+        outcomes = [self.evaluate(plan) for plan in plans]
+        key = [np.mean(outcome.score) if percentile is None else np.percentile(outcome.score, percentile)
+               for outcome in outcomes]
+        return [int(k) for k in np.argsort(key, kind='stable')], outcomes
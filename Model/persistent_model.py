@@ -0,0 +1,155 @@
+from gurobipy import *
+import numpy as np
+from Input.generate_Ms import GenMs
+from Input.tighten_Ms import TightMs
+from Model.arc_pruning import prune_arcs
+from Model.gurobi_model import build_model, update_dynamic_constraints
+from Model.heuristic_start import set_mip_start
+from Model.lazy_constraints import combine_callbacks
+from Model.solution import Solution
+from Model.solution_cache import repair_routes
+import copy
+import time
+
+# The vehicle state the static rows depend on through the arc set and the tight Ms
+vehicle_state = ['start_stations', 'driving_to_start', 'init_vehicle_load']
+
+
+class PersistentModel:
+    # keep is the arc set of the model (Model/arc_pruning.py), it has to hold the arcs of every state the model is
+    # updated to. mip_start, tight_ms and lazy are the options of run_model
+
+    def __init__(self, instance, time_limit=60*60, mip_start=False, keep=None, k_nearest=None, tight_ms=False,
+                 lazy=False):
+        # The Ms of the dynamic rows are regenerated on every update, the instance keeps its own
+        self.fixed = copy.copy(instance.fixed)
+        self.dynamic = instance.dynamic
+        self.mip_start = mip_start
+        self.keep = keep
+        self.k_nearest = k_nearest
+        self.tight_ms = tight_ms
+        self.set_ms(self.dynamic)
+        self.m = Model("Bicycle")
+        self.m.setParam('TimeLimit', time_limit)
+        start_time = time.time()
+        self.handles = build_model(self.m, self.fixed, self.dynamic, keep=keep, lazy=lazy)
+        self.m._handles = self.handles
+        if self.handles.lazy is not None:
+            self.m.setParam('LazyConstraints', 1)
+        if mip_start:
+            set_mip_start(self.m, self.handles, self.fixed, self.dynamic)
+        self.build_time = time.time() - start_time
+        self.update_time = 0
+
+    def set_ms(self, dynamic):
+        arc_mask = None if self.keep is None else self.keep.any(axis=2)
+        if self.tight_ms:
+            TightMs(self.fixed, dynamic, arc_mask)
+        else:
+            GenMs(self.fixed, dynamic, arc_mask)
+
+    def check_state(self, dynamic):
+        # The static rows are not rebuilt, so a state they cut off is refused
+        if self.tight_ms and any(not np.array_equal(getattr(dynamic, name), getattr(self.dynamic, name))
+                                 for name in vehicle_state):
+            raise ValueError("tight Ms need the same vehicle start state in every update")
+        if self.keep is not None and (prune_arcs(self.fixed, dynamic, self.k_nearest) & ~self.keep).any():
+            raise ValueError("the arc set of the model does not hold every arc of the new state")
+
+    def update(self, dynamic):
+        # The dynamic rows get the coefficients and RHS of the new state in place, variables, static rows and the
+        # basis are kept. Only the start station rows are replaced, when a vehicle starts somewhere else
+        self.check_state(dynamic)
+        start_time = time.time()
+        same_starts = list(dynamic.start_stations) == list(self.dynamic.start_stations)
+        routes = None
+        if self.m.SolCount > 0:
+            swap = set(self.fixed.stations[1:-1])
+            routes = {v: [int(step[0]) for step in route if step[0] in swap]
+                      for v, route in Solution.from_model(self.m, self.fixed).routes().items()}
+
+        self.dynamic = dynamic
+        self.set_ms(dynamic)
+        update_dynamic_constraints(self.m, self.fixed, dynamic, self.handles, same_starts)
+
+        # The loads of the previous solution do not fit the new state, its routes are simulated again from the
+        # new state for the arcs, swaps and vehicle loads of the MIP start. The simulated times are left out,
+        # they can keep Gurobi from completing the start and follow from the routes anyway
+        variables = self.m.getVars()
+        self.m.setAttr('Start', variables, [GRB.UNDEFINED] * len(variables))
+        start_routes = None if routes is None else repair_routes(self.fixed, dynamic, routes)
+        started = start_routes is not None and set_mip_start(self.m, self.handles, self.fixed, dynamic,
+                                                             start_routes) is not None
+        if started:
+            for name in ('t', 't_D'):
+                times = list(self.handles.variables[name].values())
+                self.m.setAttr('Start', times, [GRB.UNDEFINED] * len(times))
+        elif self.mip_start:
+            set_mip_start(self.m, self.handles, self.fixed, dynamic)
+        self.m.update()
+        self.update_time = time.time() - start_time
+
+    def optimize(self, anytime=None):
+        # anytime is an AnytimeSolve from Model/anytime.py, for a solve within the deadline of a decision epoch
+        start_time = time.time()
+        callbacks = []
+        if self.handles.lazy is not None:
+            callbacks.append(self.handles.lazy.callback)
+        if anytime is not None:
+            anytime.attach(self.fixed, self.handles)
+            callbacks.append(anytime.callback)
+        if callbacks:
+            self.m.optimize(combine_callbacks(callbacks))
+        else:
+            self.m.optimize()
+        if anytime is not None:
+            anytime.finish(self.m)
+        exec_time = time.time() - start_time
+        print("Execution time was", exec_time)
+        return self.m, exec_time
+
+
+def solve_scenarios(instance, dynamics, time_limit=60*60, params=None, mip_start=False, arc_pruning=False,
+                    k_nearest=None, tight_ms=False, lazy=False):
+    # dynamics maps a scenario name to its DynamicFileVariables (Input/station_selection.scenario_dynamics).
+    # The model is built once and every scenario only updates the dynamic rows, the routes of the previous
+    # scenario are the MIP start of the next one. A pruned model keeps the arcs of any scenario
+    scenarios = list(dynamics.items())
+    first = copy.copy(instance)
+    first.dynamic = scenarios[0][1]
+    keep = None
+    if arc_pruning or k_nearest is not None:
+        keep = np.logical_or.reduce([prune_arcs(instance.fixed, dynamic, k_nearest) for _, dynamic in scenarios])
+    model = PersistentModel(first, time_limit, mip_start, keep, k_nearest, tight_ms, lazy)
+    if params is not None:
+        for name, value in params.items():
+            model.m.setParam(name, value)
+    results = {}
+    for k, (scenario, dynamic) in enumerate(scenarios):
+        if k > 0:
+            model.update(dynamic)
+        m, exec_time = model.optimize()
+        fixed = copy.copy(model.fixed)
+        fixed.demand_scenario = scenario
+        results[scenario] = {'solution': Solution.from_model(m, fixed) if m.SolCount > 0 else None,
+                             'dynamic': dynamic, 'time': exec_time,
+                             'setup_time': model.update_time if k > 0 else model.build_time}
+    print("Model set up in {:.2f}s for {} scenarios".format(
+        sum(result['setup_time'] for result in results.values()), len(results)))
+    return results
+
+
+def compare_scenarios(instance, dynamics, time_limit=60):
+    # One build per scenario against one shared build, setup_time is the build or update time of the model
+    results = {'separate': {}, 'shared': {}}
+    for scenario, dynamic in dynamics.items():
+        single = copy.copy(instance)
+        single.dynamic = dynamic
+        model = PersistentModel(single, time_limit)
+        m, exec_time = model.optimize()
+        results['separate'][scenario] = {'setup_time': model.build_time, 'time': exec_time,
+                                         'objective': m.ObjVal if m.SolCount > 0 else None}
+    for scenario, result in solve_scenarios(instance, dynamics, time_limit).items():
+        results['shared'][scenario] = {'setup_time': result['setup_time'], 'time': result['time'],
+                                       'objective': result['solution'].obj_val if result['solution'] else None}
+    return results
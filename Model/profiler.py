@@ -0,0 +1,123 @@
+import json
+import time
+import tracemalloc
+from gurobipy import GRB
+
+
+class ModelProfile:
+    # Wall time and size per build phase and the solver statistics. With memory the peak Python memory per phase
+    # is traced as well, which slows the build down several-fold, so the times of such a pass are not comparable
+    # and to_dict says which kind of pass it was
+
+    def __init__(self, enabled=True, memory=False):
+        self.enabled = enabled
+        self.memory = memory
+        self.phases = []
+        self.solver = {}
+        self.last_time = None
+        self.last_size = (0, 0, 0)
+        self.presolve_time = None
+        self.root_time = None
+        self.first_incumbent_time = None
+        self.first_incumbent_objective = None
+        self.root_bound = None
+        self.root_objective = None
+        self.arcs = None
+        self.ms = None
+        self.lazy = None
+        self.anytime = None
+
+    def start(self, m):
+        if not self.enabled:
+            return
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        m.update()
+        self.last_size = (m.NumConstrs, m.NumVars, m.NumNZs)
+        self.last_time = time.time()
+
+    def mark(self, m, name):
+        # Closes the phase that started at the previous mark
+        if not self.enabled:
+            return
+        m.update()
+        now = time.time()
+        size = (m.NumConstrs, m.NumVars, m.NumNZs)
+        phase = {'phase': name, 'wall_time': now - self.last_time, 'rows': size[0] - self.last_size[0],
+                 'columns': size[1] - self.last_size[1], 'nonzeros': size[2] - self.last_size[2]}
+        if self.memory:
+            phase['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+        self.phases.append(phase)
+        self.last_size = size
+        self.last_time = time.time()
+
+    def stop(self):
+        if self.enabled and self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def callback(self, model, where):
+        # Presolve ends at the first MIP or MIPNODE callback (MIPSOL can fire before presolve),
+        # the root ends when the first node is processed
+        if where in (GRB.Callback.MIP, GRB.Callback.MIPNODE):
+            runtime = model.cbGet(GRB.Callback.RUNTIME)
+            if self.presolve_time is None:
+                self.presolve_time = runtime
+            if self.root_time is None and where == GRB.Callback.MIP:
+                if model.cbGet(GRB.Callback.MIP_NODCNT) > 0:
+                    self.root_time = runtime
+                    self.root_bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+                    self.root_objective = model.cbGet(GRB.Callback.MIP_OBJBST)
+        if where == GRB.Callback.MIPSOL and self.first_incumbent_time is None:
+            self.first_incumbent_time = model.cbGet(GRB.Callback.RUNTIME)
+            self.first_incumbent_objective = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+
+    def record_solve(self, m):
+        if not self.enabled:
+            return
+        runtime = m.Runtime
+        presolve = runtime if self.presolve_time is None else self.presolve_time
+        root_end = runtime if self.root_time is None else self.root_time
+        self.solver = {'status': m.Status, 'runtime': runtime, 'presolve_time': presolve,
+                       'root_time': root_end - presolve, 'branch_and_bound_time': runtime - root_end,
+                       'node_count': m.NodeCount, 'iterations': m.IterCount,
+                       'rows': m.NumConstrs, 'columns': m.NumVars, 'nonzeros': m.NumNZs}
+        if m.SolCount > 0:
+            self.solver['objective'] = m.ObjVal
+            self.solver['gap'] = m.MIPGap
+            self.solver['root_gap'] = self.root_gap(m)
+            self.solver['first_incumbent_time'] = self.first_incumbent_time
+            self.solver['first_incumbent_objective'] = self.first_incumbent_objective
+
+    def root_gap(self, m):
+        # Gap between the incumbent and the bound when the root ended, the final gap when no node was branched
+        if self.root_time is None or self.root_objective is None or abs(self.root_objective) >= GRB.INFINITY:
+            return m.MIPGap
+        if self.root_objective == 0:
+            return 0.0 if self.root_bound == 0 else float('inf')
+        return abs(self.root_objective - self.root_bound) / abs(self.root_objective)
+
+    def build_time(self):
+        return sum(phase['wall_time'] for phase in self.phases)
+
+    def to_dict(self):
+        record = {'build_time': self.build_time(), 'memory_traced': self.memory, 'phases': self.phases,
+                  'solver': self.solver}
+        if self.arcs is not None:
+            record['arcs'] = self.arcs
+        if self.ms is not None:
+            record['ms'] = self.ms
+        if self.lazy is not None:
+            record['lazy'] = self.lazy
+        if self.anytime is not None:
+            record['anytime'] = self.anytime
+        return record
+
+
+def save_profile(profile, key, path="Output/profiles.jsonl"):
+    record = {'key': key}
+    record.update(profile.to_dict())
+    with open(path, 'a') as fp:
+        fp.write(json.dumps(record) + "\n")
@@ -0,0 +1,91 @@
+import numpy as np
+
+station_variables = ['l_B', 'l_F', 's_B', 's_F', 'v_S', 'd', 'delta', 'gamma', 'v_Sf', 'v_SF', 'omega', 'r_D']
+
+
+class Solution:
+    # Every variable of the model as a NumPy array indexed like the model: x[i, j, v], t[i], q[i, v], l_V[i, v],
+    # t_D[v], t_f[v] and one entry per station for the station variables
+
+    def __init__(self, fixed, obj_val, gap, runtime, status=None):
+        n = len(fixed.stations)
+        n_vehicles = len(fixed.vehicles)
+        self.fixed = fixed
+        self.obj_val = obj_val
+        self.gap = gap
+        self.runtime = runtime
+        self.status = status
+        self.values = {'x': np.zeros((n, n, n_vehicles)), 't': np.zeros(n), 'q': np.zeros((n, n_vehicles)),
+                       'l_V': np.zeros((n, n_vehicles)), 't_D': np.zeros(n_vehicles), 't_f': np.zeros(n_vehicles)}
+        for name in station_variables:
+            self.values[name] = np.zeros(n)
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    @classmethod
+    def from_model(cls, m, fixed, handles=None):
+        # One bulk query for all values
+        if handles is None:
+            handles = m._handles
+        return cls.from_vector(fixed, handles, m.getAttr('X', m.getVars()), m.ObjVal, m.MIPGap, m.Runtime,
+                               m.Status)
+
+    @classmethod
+    def from_vector(cls, fixed, handles, values, obj_val, gap=float('nan'), runtime=None, status=None):
+        # values holds every model column in model order, as from getAttr('X') or cbGetSolution in a callback.
+        # addVars creates each variable family as a contiguous block
+        solution = cls(fixed, obj_val, gap, runtime, status)
+        values = np.asarray(values, dtype=float)
+        for name, var_dict in handles.variables.items():
+            if len(var_dict) == 0:
+                continue
+            first = next(iter(var_dict.values())).index
+            keys = np.array(list(var_dict.keys()))
+            index = tuple(keys.T) if keys.ndim > 1 else keys
+            solution.values[name][index] = values[first:first + len(var_dict)]
+        return solution
+
+    @classmethod
+    def from_values(cls, fixed, values, obj_val, gap=float('nan'), runtime=None):
+        # values maps model variable names such as "x[1,2,0]" to their value
+        solution = cls(fixed, obj_val, gap, runtime)
+        for var_name, value in values.items():
+            name, _, idx = var_name.partition('[')
+            index = tuple(int(k) for k in idx.rstrip(']').split(','))
+            solution.values[name][index] = value
+        return solution
+
+    def variable_items(self, tolerance=1e-9):
+        # (name, value) for the non-zero values, named like the model variables
+        for name, array in self.values.items():
+            for index in np.argwhere(np.abs(array) > tolerance):
+                yield "{}[{}]".format(name, ",".join(str(k) for k in index)), float(array[tuple(index)])
+
+    def routes(self):
+        # Follows a successor map from the station without an incoming arc to the artificial end station
+        x = self.values['x']
+        stations = self.fixed.stations
+        route_dict = {}
+        for v in self.fixed.vehicles:
+            arcs = np.argwhere(x[:, :, v] > 0.5)
+            if len(arcs) == 0:
+                continue
+            successor = {int(i): int(j) for i, j in arcs}
+            starts = set(successor) - set(successor.values())
+            current = starts.pop() if starts else int(arcs[0][0])
+            route = []
+            while current in successor and len(route) < len(arcs):
+                j = successor[current]
+                if current == stations[0]:
+                    t = float(self.values['t_D'][v])
+                else:
+                    t = float(self.values['t'][current])
+                if current in stations[1:-1]:
+                    q = int(round(self.values['q'][current, v]))
+                else:
+                    q = 0
+                route.append([current, j, t, float(self.fixed.driving_times[current][j]), q])
+                current = j
+            route_dict[v] = route
+        return route_dict
@@ -0,0 +1,200 @@
+import fcntl
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from Model.alns_model import RouteEvaluator
+from Model.gurobi_model import run_model
+from Model.solution import Solution
+
+cache_dir = "Output/solution_cache"
+
+# Everything but the state of the stations and vehicles at the start of the horizon
+structure_fixed = ['time_horizon', 'parking_time', 'handling_time', 'vehicle_cap', 'station_cap', 'driving_times',
+                   'w_violation', 'w_dev_obj', 'w_reward', 'w_dev_reward', 'w_driving_time']
+structure_dynamic = ['incoming_rate', 'incoming_flat_rate', 'demand', 'ideal_state']
+state_dynamic = ['init_station_load', 'init_flat_station_load', 'init_vehicle_load', 'driving_to_start']
+
+
+def structure_key(instance):
+    f = instance.fixed
+    d = instance.dynamic
+    digest = hashlib.sha1(str(len(f.stations)).encode())
+    if getattr(instance, 'stations', None) is not None:
+        digest.update(json.dumps(list(instance.stations.ids[:instance.n_stations - 1])).encode())
+    for variables, names in ((f, structure_fixed), (d, structure_dynamic)):
+        for name in names:
+            digest.update(name.encode())
+            digest.update(np.ascontiguousarray(getattr(variables, name), dtype=float).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def state_vector(instance):
+    d = instance.dynamic
+    return (np.concatenate([np.asarray(getattr(d, name), dtype=float).ravel() for name in state_dynamic]),
+            np.asarray(d.start_stations, dtype=int))
+
+
+def repair_routes(f, d, routes):
+    # Routes of another state made feasible for this one: every vehicle starts at its own start station, the start
+    # stations of the other vehicles are left out and so is every station the vehicle cannot reach in time or swap
+    # at. Quantities and times follow from the new loads. None when a vehicle starting at the depot keeps no
+    # station, the model needs one there
+    evaluator = RouteEvaluator(f, d)
+    starts = set(int(i) for i in d.start_stations)
+    Stations = f.stations
+    repaired = {}
+    for v in f.vehicles:
+        kept = []
+        for j in routes.get(v, []):
+            if j not in starts and evaluator.simulate(v, kept + [j]) is not None:
+                kept.append(j)
+        simulated = evaluator.simulate(v, kept)
+        if simulated is None:
+            return None
+        stations, arrivals, quantities, loads, leave, load = simulated
+        route = [(int(i), float(t_i), int(q_i), int(load_i)) for i, t_i, q_i, load_i in
+                 zip(stations, arrivals, quantities, loads)]
+        if d.start_stations[v] == Stations[0]:
+            route.insert(0, (Stations[0], float(d.driving_to_start[v]), 0, d.init_vehicle_load[v]))
+        route.append((Stations[-1], float(leave), 0, int(load)))
+        repaired[v] = route
+    return repaired
+
+
+class SolutionCache:
+    # Solved instances by structure, one npz file per structure key with the start state, the swap stations of
+    # every route and the non-zero variable values of each solve. A state solved before is answered from the
+    # file, any other is solved from the routes of the nearest cached state as MIP start. The distance between
+    # states is the L1 distance of the loads and driving times to start, plus start_penalty per vehicle that
+    # starts somewhere else. Only a full solve, without k_nearest and with a gap of at most optimal_gap, answers a
+    # state directly, a time limited or k_nearest one is only the MIP start of the next solve
+
+    def __init__(self, directory=cache_dir, start_penalty=10.0, max_distance=None, optimal_gap=0.0):
+        self.directory = directory
+        self.start_penalty = start_penalty
+        self.max_distance = max_distance
+        self.optimal_gap = optimal_gap
+        self.loaded = {}
+        self.stats = {'lookups': 0, 'exact': 0, 'warm': 0, 'miss': 0, 'time_saved': 0.0}
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npz")
+
+    def entries(self, key):
+        # Columns as Python lists, the fixed-width string arrays of the file would cut a longer replacement short
+        if key not in self.loaded:
+            path = self.path(key)
+            if os.path.exists(path):
+                with np.load(path) as data:
+                    entries = {name: data[name].tolist() for name in data.files}
+                # Files from before the column was kept cannot tell a full solve apart
+                entries.setdefault('full', [False] * len(entries['objectives']))
+                self.loaded[key] = entries
+            else:
+                self.loaded[key] = None
+        return self.loaded[key]
+
+    def lookup(self, instance):
+        # ('exact' or 'nearest', index of the entry, distance), or (None, None, None) when nothing is close enough
+        entries = self.entries(structure_key(instance))
+        if entries is None:
+            return None, None, None
+        state, starts = state_vector(instance)
+        distance = (np.abs(np.asarray(entries['states']) - state).sum(axis=1)
+                    + self.start_penalty * (np.asarray(entries['starts']) != starts).sum(axis=1))
+        k = int(np.argmin(distance))
+        if distance[k] <= 1e-9:
+            return 'exact', k, 0.0
+        if self.max_distance is not None and distance[k] > self.max_distance:
+            return None, None, None
+        return 'nearest', k, float(distance[k])
+
+    def answers(self, instance, k):
+        entries = self.entries(structure_key(instance))
+        return bool(entries['full'][k]) and float(entries['gaps'][k]) <= self.optimal_gap
+
+    def solution(self, instance, k):
+        entries = self.entries(structure_key(instance))
+        return Solution.from_values(instance.fixed, json.loads(entries['values'][k]),
+                                    float(entries['objectives'][k]), float(entries['gaps'][k]))
+
+    def add(self, instance, solution, runtime, full=True):
+        # A state solved again replaces its entry when the new solution is better, or when the new one answers the
+        # state and the old one does not. full is False for a solve limited by k_nearest. The file is read again
+        # under a lock just before the merge, so workers sharing the directory keep each other's entries
+        key = structure_key(instance)
+        state, starts = state_vector(instance)
+        routes = {v: [int(step[0]) for step in route if step[0] in instance.fixed.stations[1:-1]]
+                  for v, route in solution.routes().items()}
+        entry = {'states': state.tolist(), 'starts': starts.tolist(), 'objectives': solution.obj_val,
+                 'gaps': solution.gap, 'runtimes': runtime, 'routes': json.dumps(routes),
+                 'values': json.dumps(dict(solution.variable_items())), 'full': full}
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(key) + ".lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.loaded.pop(key, None)
+            kind, k, _ = self.lookup(instance)
+            entries = self.entries(key)
+            if entries is None:
+                entries = self.loaded[key] = {name: [] for name in entry}
+            if kind == 'exact':
+                answers = full and solution.gap <= self.optimal_gap
+                if solution.obj_val >= entries['objectives'][k] and (not answers or self.answers(instance, k)):
+                    return
+                for name, value in entry.items():
+                    entries[name][k] = value
+            else:
+                for name, value in entry.items():
+                    entries[name].append(value)
+            tmp_path = "{}.{}.tmp".format(self.path(key), os.getpid())
+            with open(tmp_path, 'wb') as fp:
+                np.savez(fp, **{name: np.asarray(values) for name, values in entries.items()})
+            os.replace(tmp_path, self.path(key))
+
+    def solve(self, instance, **kwargs):
+        # Like run_model, but returns (Solution, time). kwargs go to run_model
+        start_time = time.time()
+        self.stats['lookups'] += 1
+        kind, k, distance = self.lookup(instance)
+        if kind == 'exact' and not self.answers(instance, k):
+            # Solved before, but only to a time limit or over the k_nearest arcs
+            kind = 'nearest'
+        if kind == 'exact':
+            solution = self.solution(instance, k)
+            exec_time = time.time() - start_time
+            solution.runtime = exec_time
+            self.stats['exact'] += 1
+            self.stats['time_saved'] += max(0.0, float(self.entries(structure_key(instance))['runtimes'][k])
+                                            - exec_time)
+            print("Cache hit, objective", solution.obj_val)
+            return solution, exec_time
+
+        start_routes = None
+        if kind == 'nearest':
+            entries = self.entries(structure_key(instance))
+            routes = {int(v): route for v, route in json.loads(entries['routes'][k]).items()}
+            start_routes = repair_routes(instance.fixed, instance.dynamic, routes)
+            print("Warm start from a cached state at distance {:.2f}{}".format(
+                distance, "" if start_routes is not None else ", routes could not be repaired"))
+        result = run_model(instance, start_routes=start_routes, **kwargs)
+        if result is None or result[0].SolCount == 0:
+            self.stats['miss'] += 1
+            return None, time.time() - start_time
+        m, _ = result
+        solution = Solution.from_model(m, instance.fixed)
+        exec_time = time.time() - start_time
+        if start_routes is not None:
+            # Estimated against the solve of the nearest state
+            self.stats['warm'] += 1
+            self.stats['time_saved'] += max(0.0, float(entries['runtimes'][k]) - exec_time)
+        else:
+            self.stats['miss'] += 1
+        self.add(instance, solution, exec_time, full=kwargs.get('k_nearest') is None)
+        return solution, exec_time
+
+    def summary(self):
+        lookups = self.stats['lookups']
+        return dict(self.stats, hit_rate=self.stats['exact'] / lookups if lookups else 0.0,
+                    warm_rate=self.stats['warm'] / lookups if lookups else 0.0)
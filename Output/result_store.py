@@ -0,0 +1,99 @@
+import atexit
+import json
+import sqlite3
+import time
+import uuid
+import pandas as pd
+
+run_columns = ['run_id', 'key', 'created', 'init_stations', 'n_stations', 'n_vehicles', 'objective', 'vehicle_cap',
+               'station_cap', 'time_horizon', 'scenario', 'solution_time', 'gap', 'w_violation', 'w_dev_obj',
+               'w_reward', 'w_dev_reward', 'w_driving_time', 'start_vehicles']
+
+excel_columns = {'init_stations': 'Init #stations', 'n_stations': 'No. of stations', 'n_vehicles': 'No. of vehicles',
+                 'objective': 'Objective Value', 'vehicle_cap': 'Vehicle capacity',
+                 'station_cap': 'Station capacity', 'time_horizon': 'Time Horizon', 'scenario': 'Demand scenario',
+                 'solution_time': 'Solution time', 'gap': 'Gap', 'w_violation': 'weight violation',
+                 'w_dev_obj': 'weight deviation', 'w_reward': 'weight reward', 'w_dev_reward': 'reward weight dev',
+                 'w_driving_time': 'reward weight time'}
+
+
+class ResultStore:
+    # Runs and their non-zero variable values are appended to sqlite in batches, nothing is rewritten
+
+    def __init__(self, path="Output/results.sqlite", batch_size=50):
+        self.path = path
+        self.batch_size = batch_size
+        self.runs = []
+        self.values = []
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS runs ({})".format(
+            ", ".join(column + (" TEXT PRIMARY KEY" if column == 'run_id' else "") for column in run_columns)))
+        self.connection.execute("CREATE TABLE IF NOT EXISTS variables (run_id TEXT, name TEXT, idx TEXT, value REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS variables_run ON variables (run_id)")
+        self.connection.commit()
+        atexit.register(self.close)
+
+    def add_run(self, metadata, variables, tolerance=1e-9):
+        run_id = uuid.uuid4().hex
+        row = dict(metadata)
+        row['run_id'] = run_id
+        row['created'] = time.time()
+        row['start_vehicles'] = json.dumps(row.get('start_vehicles'))
+        self.runs.append(tuple(row.get(column) for column in run_columns))
+        for var_name, value in variables:
+            if abs(value) > tolerance:
+                name, _, idx = var_name.partition('[')
+                self.values.append((run_id, name, idx.rstrip(']'), value))
+        if len(self.runs) >= self.batch_size:
+            self.flush()
+        return run_id
+
+    def flush(self):
+        if not self.runs:
+            return
+        with self.connection:
+            self.connection.executemany("INSERT INTO runs VALUES ({})".format(", ".join("?" * len(run_columns))),
+                                        self.runs)
+            self.connection.executemany("INSERT INTO variables VALUES (?, ?, ?, ?)", self.values)
+        self.runs = []
+        self.values = []
+
+    def close(self):
+        if self.connection is not None:
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+    def read_runs(self):
+        self.flush()
+        return pd.read_sql("SELECT * FROM runs ORDER BY created", self.connection)
+
+    def read_variables(self, run_ids=None):
+        self.flush()
+        if run_ids is None:
+            return pd.read_sql("SELECT * FROM variables", self.connection)
+        query = "SELECT * FROM variables WHERE run_id IN ({})".format(", ".join("?" * len(run_ids)))
+        return pd.read_sql(query, self.connection, params=list(run_ids))
+
+    def export_excel(self, path="Output/output.xlsx"):
+        # Same sheets as the old workbook: one per instance size with the variables as columns
+        # (only the ones that are non-zero in some run) and a solution_time sheet
+        runs = self.read_runs()
+        variables = self.read_variables()
+        variables['column'] = variables['name'] + '[' + variables['idx'] + ']'
+        wide = variables.pivot(index='run_id', columns='column', values='value')
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            for key, key_runs in runs.groupby('key', sort=False):
+                sheet = key_runs.rename(columns=excel_columns)
+                starts = key_runs['start_vehicles'].map(json.loads)
+                for v in range(int(key_runs['n_vehicles'].max())):
+                    sheet['Start vehicle' + str(v)] = [start[v] if start and v < len(start) else None
+                                                       for start in starts]
+                sheet_vars = wide.reindex(key_runs['run_id']).dropna(axis=1, how='all').fillna(0)
+                sheet = pd.concat([sheet.set_index('run_id'), sheet_vars], axis=1)
+                sheet = sheet.drop(columns=['key', 'created', 'start_vehicles'])
+                sheet.to_excel(writer, index=False, sheet_name=key[:31])
+            time_columns = ['init_stations', 'n_stations', 'n_vehicles', 'scenario', 'time_horizon', 'solution_time',
+                            'gap']
+            runs[time_columns].rename(columns=excel_columns).to_excel(writer, index=False,
+                                                                       sheet_name='solution_time')
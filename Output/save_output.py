@@ -1,62 +1,31 @@
-import pandas as pd
-from openpyxl import load_workbook
+from Output.result_store import ResultStore
 
-book = load_workbook("Output/output.xlsx")
-writer = pd.ExcelWriter("Output/output.xlsx", engine='openpyxl')
-writer.book = book
+_store = None
 
-df_keys = []
 
+def get_result_store(path="Output/results.sqlite"):
+    global _store
+    if _store is None:
+        _store = ResultStore(path)
+    return _store
 
-def save_output(model, time, fixed, dynamic, station_obj):
+
+def save_output(solution, time, fixed, dynamic, stations, store=None):
+    if store is None:
+        store = get_result_store()
     key = "solvable_instance_" + str(len(fixed.stations)) + '_' + str(len(fixed.vehicles))
 
-    df = pd.DataFrame(columns=['Init #stations', 'No. of stations', 'No. of vehicles', 'Objective Value',
-                                                 'Vehicle capacity', 'Station capacity', 'Time Horizon',
-                                                 'Demand scenario', 'Solution time', 'Gap', 'weight violation',
-                                                 'weight deviation', 'weight reward', 'reward weight dev',
-                                                 'reward weight time'])
-    for v in range(len(fixed.vehicles)):
-        df['Start vehicle' + str(v)] = ""
-
-    new_row = {'Init #stations': fixed.initial_size, 'No. of stations': len(fixed.stations)-2,
-               'No. of vehicles': len(fixed.vehicles), 'Objective Value': model.objVal,
-               'Vehicle capacity': fixed.vehicle_cap[0], 'Station capacity': fixed.station_cap[1],
-               'Time Horizon': fixed.time_horizon, 'Demand scenario': fixed.demand_scenario,
-               'Solution time': time, 'Gap': model.mipgap, 'weight violation': fixed.w_violation,
-               'weight deviation': fixed.w_dev_obj, 'weight reward': fixed.w_reward,
-               'reward weight dev': fixed.w_dev_reward, 'reward weight time': fixed.w_driving_time}
-
-    for v in range(len(fixed.vehicles)):
-        new_row['Start vehicle' + str(v)] = station_obj[dynamic.start_stations[v]].address
-
-    for var in model.getVars():
-        new_row[var.varName] = var.x
-    df = df.append(new_row, ignore_index=True)
-
-    if key in df_keys:
-        start_row = writer.sheets[key].max_row
-        df.to_excel(writer, startrow=start_row, index=False, header=False, sheet_name=key)
-        writer.save()
-    else:
-        df.to_excel(writer, index=False, sheet_name=key)
-        writer.save()
-        df_keys.append(key)
-
-    time_df = pd.DataFrame(columns=['Init #stations', 'No. of stations', 'No. of vehicles', 'Demand scenario',
-                                    'Time Horizon', 'Solution time', 'Gap'])
-
-    new_row_time = {'Init #stations': fixed.initial_size, 'No. of stations': len(fixed.stations) - 2,
-                    'No. of vehicles': len(fixed.vehicles), 'Demand scenario': fixed.demand_scenario,
-                    'Time Horizon': fixed.time_horizon, 'Solution time': time, 'Gap': model.mipgap}
-
-    time_df = time_df.append(new_row_time, ignore_index=True)
-
-    if 'solution_time' in df_keys:
-        start_row = writer.sheets['solution_time'].max_row
-        time_df.to_excel(writer, startrow=start_row, index=False, header=False, sheet_name='solution_time')
-        writer.save()
-    else:
-        time_df.to_excel(writer, index=False, sheet_name='solution_time')
-        writer.save()
-        df_keys.append('solution_time')
+    metadata = {'key': key, 'init_stations': fixed.initial_size, 'n_stations': len(fixed.stations)-2,
+                'n_vehicles': len(fixed.vehicles), 'objective': solution.obj_val,
+                'vehicle_cap': fixed.vehicle_cap[0], 'station_cap': fixed.station_cap[1],
+                'time_horizon': fixed.time_horizon, 'scenario': fixed.demand_scenario,
+                'solution_time': time, 'gap': solution.gap, 'w_violation': fixed.w_violation,
+                'w_dev_obj': fixed.w_dev_obj, 'w_reward': fixed.w_reward,
+                'w_dev_reward': fixed.w_dev_reward, 'w_driving_time': fixed.w_driving_time,
+                'start_vehicles': [stations.addresses[dynamic.start_stations[v]] for v in range(len(fixed.vehicles))]}
+
+    return store.add_run(metadata, solution.variable_items())
+
+
+def export_output(path="Output/output.xlsx"):
+    get_result_store().export_excel(path)
@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from Input.station_selection import load_stations, build_instance
+from Model.gurobi_model import run_model
+from Model.alns_model import run_alns
+from Model.decomposition import run_decomposed
+from Model.profiler import ModelProfile
+
+default_config = {'n_instance': 10, 'scenario': 'A', 'n_vehicles': 1, 'time_horizon': 25, 'vehicle_cap': 30,
+                  'station_cap': 20, 'ideal_state': None, 'w_violation': 0.8, 'w_dev_obj': 0.1, 'w_reward': 0.1,
+                  'w_dev_reward': 0.8, 'w_driving_time': 0.2, 'backend': 'gurobi', 'mip_start': False,
+                  'arc_pruning': False, 'k_nearest': None, 'tight_ms': False, 'lazy': False,
+                  'time_limit': 60*60}
+
+_stations = {}
+
+
+def expand_grid(grid):
+    # Every key of the grid is either a single value or a list of values to combine
+    keys = sorted(grid.keys())
+    values = [grid[key] if isinstance(grid[key], list) else [grid[key]] for key in keys]
+    configs = []
+    for combination in itertools.product(*values):
+        config = dict(default_config)
+        config.update(zip(keys, combination))
+        if config['ideal_state'] is None:
+            config['ideal_state'] = config['station_cap'] // 2
+        configs.append(config)
+    return configs
+
+
+def job_id(config):
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def claim(jobs_dir, key, stale_after):
+    # Jobs are claimed when a worker starts them and the lock is created atomically,
+    # so runners on several machines can share one job directory
+    lock_path = os.path.join(jobs_dir, key + ".lock")
+    try:
+        stat = os.stat(lock_path)
+    except FileNotFoundError:
+        stat = None
+    if stat is not None and time.time() - stat.st_mtime > stale_after:
+        # A stale lock is taken over by renaming it, only one worker's rename succeeds. The lock that was renamed
+        # can still be a fresh one another worker created after the check, then it is put back
+        taken_path = "{}.stale.{}.{}".format(lock_path, socket.gethostname(), os.getpid())
+        try:
+            os.rename(lock_path, taken_path)
+        except FileNotFoundError:
+            return False
+        if os.stat(taken_path).st_ino != stat.st_ino:
+            try:
+                os.link(taken_path, lock_path)
+            except FileExistsError:
+                pass
+            os.remove(taken_path)
+            return False
+        os.remove(taken_path)
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w') as fp:
+        fp.write("{} {}".format(socket.gethostname(), os.getpid()))
+    return True
+
+
+def run_job(config, jobs_dir, threads, stale_after):
+    key = job_id(config)
+    if os.path.exists(os.path.join(jobs_dir, key + ".json")) or not claim(jobs_dir, key, stale_after):
+        return None
+    try:
+        result = solve_config(config, threads)
+        result['job'] = key
+        tmp_path = os.path.join(jobs_dir, key + ".json.tmp")
+        with open(tmp_path, 'w') as fp:
+            json.dump(result, fp)
+        os.replace(tmp_path, os.path.join(jobs_dir, key + ".json"))
+    finally:
+        os.remove(os.path.join(jobs_dir, key + ".lock"))
+    return key
+
+
+def solve_config(config, threads):
+    if config['station_file'] not in _stations:
+        _stations[config['station_file']] = load_stations(config['station_file'])
+    stations = _stations[config['station_file']]
+
+    start_time = time.time()
+    instance, station_obj = build_instance(stations, config['n_instance'], config['scenario'], config['n_vehicles'],
+                                           config['time_horizon'], config['vehicle_cap'], config['station_cap'],
+                                           config['ideal_state'], config['w_violation'], config['w_dev_obj'],
+                                           config['w_reward'], config['w_dev_reward'], config['w_driving_time'],
+                                           write_file=False)
+    instance_time = time.time() - start_time
+
+    result = {'host': socket.gethostname(), 'config': config, 'instance_time': instance_time,
+              'n_stations': len(instance.fixed.stations) - 2}
+    if config['backend'] == 'alns':
+        solution, exec_time = run_alns(instance, time_limit=config['time_limit'])
+        result.update({'objective': solution.obj_val, 'gap': None, 'solution_time': exec_time})
+    elif config['backend'] == 'decomposition':
+        solution, exec_time = run_decomposed(instance, time_limit=config['time_limit'],
+                                             arc_pruning=config['arc_pruning'], tight_ms=config['tight_ms'],
+                                             cores=threads)
+        result.update({'objective': None if solution is None else solution.obj_val, 'gap': None,
+                       'solution_time': exec_time})
+    else:
+        profile = ModelProfile()
+        m, exec_time = run_model(instance, profile=profile, mip_start=config['mip_start'],
+                                 time_limit=config['time_limit'], params={'Threads': threads, 'OutputFlag': 0},
+                                 arc_pruning=config['arc_pruning'], k_nearest=config['k_nearest'],
+                                 tight_ms=config['tight_ms'], lazy=config['lazy'])
+        result.update({'objective': profile.solver.get('objective'), 'gap': profile.solver.get('gap'),
+                       'solution_time': exec_time, 'build_time': profile.build_time(),
+                       'solver': profile.solver, 'arcs': profile.arcs, 'ms': profile.ms,
+                       'lazy': profile.lazy})
+    return result
+
+
+def split_cores(workers, cores=None):
+    cores = cores or os.cpu_count() or 1
+    workers = max(1, min(workers, cores))
+    return workers, max(1, cores // workers)
+
+
+def run_batch(grid, jobs_dir="Output/jobs", workers=None, shard=(0, 1), stale_after=24*60*60,
+              station_file="Data_processing/station.json"):
+    os.makedirs(jobs_dir, exist_ok=True)
+    configs = expand_grid(grid)
+    for config in configs:
+        config['station_file'] = station_file
+    index, n_shards = shard
+    pending = [config for k, config in enumerate(configs) if k % n_shards == index
+               and not os.path.exists(os.path.join(jobs_dir, job_id(config) + ".json"))]
+    workers, threads = split_cores(workers or os.cpu_count() or 1)
+    print("{} jobs in grid, {} pending in shard {}/{}, {} workers with {} threads each".format(
+        len(configs), len(pending), index, n_shards, workers, threads))
+
+    done = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_job, config, jobs_dir, threads, stale_after) for config in pending]
+        for config, future in zip(pending, futures):
+            try:
+                key = future.result()
+            except Exception as error:
+                print("Job", job_id(config), "failed:", repr(error))
+                continue
+            if key is not None:
+                done.append(key)
+    return done
+
+
+def collect_results(jobs_dir="Output/jobs"):
+    rows = []
+    for name in sorted(os.listdir(jobs_dir)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(jobs_dir, name), 'r') as f:
+            result = json.load(f)
+        row = dict(result['config'])
+        row.update({key: value for key, value in result.items() if key not in ('config', 'solver', 'arcs')})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a grid of model configurations in parallel")
+    parser.add_argument('grid', help="json file mapping run_model input names to a value or a list of values")
+    parser.add_argument('--jobs-dir', default="Output/jobs")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--shard', default="0/1", help="index/count, e.g. 1/3 runs every third job from the second")
+    parser.add_argument('--stale-after', type=float, default=24*60*60,
+                        help="seconds after which a lock left by a crashed runner is ignored")
+    parser.add_argument('--station-file', default="Data_processing/station.json")
+    parser.add_argument('--summary', default="Output/batch_results.csv")
+    args = parser.parse_args()
+
+    with open(args.grid, 'r') as f:
+        grid = json.load(f)
+    shard = tuple(int(k) for k in args.shard.split('/'))
+    run_batch(grid, args.jobs_dir, args.workers, shard, args.stale_after, args.station_file)
+    collect_results(args.jobs_dir).to_csv(args.summary, index=False)
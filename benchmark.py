@@ -0,0 +1,193 @@
+import argparse
+import copy
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+from gurobipy import Model, GurobiError, gurobi
+from Input.instance_generator import Instance
+from Input.generate_Ms import GenMs
+from Input.tighten_Ms import TightMs
+from Input.station import StationArrays
+from Model.gurobi_model import build_model
+
+default_sizes = [10, 25, 50, 100, 250, 500]
+default_vehicles = [1, 3, 5]
+
+# Relative slowdown above which a stage is flagged, and absolute floors below which time and memory are noise
+default_tolerance = 0.25
+min_time = 0.05
+min_memory = 1 << 20
+
+
+def synthetic_stations(n, seed=0):
+    # n swap stations behind a depot, spread over central Oslo, with loads and rates in the ranges of station.json.
+    # The same n and seed always give the same stations
+    rng = np.random.default_rng([seed, n])
+    latitude = np.concatenate(([59.93791], 59.91 + rng.uniform(-0.04, 0.04, n)))
+    longitude = np.concatenate(([10.73048], 10.75 + rng.uniform(-0.08, 0.08, n)))
+
+    def column(values):
+        return np.concatenate(([0], values))
+    return StationArrays(["depot"] + ["synthetic_{}".format(k) for k in range(1, n+1)], latitude, longitude,
+                         column(rng.integers(0, 15, n)), column(rng.integers(0, 10, n)),
+                         column(np.round(rng.uniform(0, 1, n), 2)), column(np.round(rng.uniform(0, 0.5, n), 2)),
+                         column(np.round(rng.uniform(0, 1, n), 2)), column(np.round(rng.uniform(0, 1.5, n), 2)))
+
+
+class Stages:
+    # Wall time per stage, or peak Python memory per stage when trace is set. Tracing slows Python down, so times
+    # are taken from an untraced pass. Gurobi allocates outside of Python, its own peak is read from the model
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.record = {}
+
+    def run(self, name, function, *args, **kwargs):
+        if self.trace:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            result = function(*args, **kwargs)
+            self.record[name] = tracemalloc.get_traced_memory()[1]
+        else:
+            start_time = time.perf_counter()
+            result = function(*args, **kwargs)
+            self.record[name] = time.perf_counter() - start_time
+        return result
+
+
+def solver_memory(m):
+    try:
+        return m.MaxMemUsed * 1e9
+    except (AttributeError, GurobiError):
+        return None
+
+
+def pipeline(stages, n, n_vehicles, seed, time_horizon, solve, time_limit):
+    stations = stages.run('stations', synthetic_stations, n, seed)
+    instance = stages.run('instance', Instance, n+2, n_vehicles, time_horizon, stations, vehicle_cap=30,
+                          station_cap=20, ideal_state=10, write_file=False, time_mode='haversine')
+    stages.run('gen_ms', GenMs, copy.copy(instance.fixed), instance.dynamic)
+    stages.run('tight_ms', TightMs, copy.copy(instance.fixed), instance.dynamic)
+
+    m = Model("Benchmark")
+    m.setParam('OutputFlag', 0)
+    m.setParam('Threads', 1)
+    m.setParam('TimeLimit', time_limit)
+    stages.run('build', build_model, m, instance.fixed, instance.dynamic)
+    case = {'rows': m.NumConstrs, 'columns': m.NumVars, 'nonzeros': m.NumNZs, 'build_solver_memory': solver_memory(m)}
+    if solve:
+        try:
+            stages.run('solve', m.optimize)
+            case.update({'status': m.Status, 'objective': m.ObjVal if m.SolCount > 0 else None,
+                         'gap': m.MIPGap if m.SolCount > 0 else None, 'nodes': m.NodeCount,
+                         'solve_solver_memory': solver_memory(m)})
+        except GurobiError as error:
+            # e.g. a size-limited license, the build stages are still recorded
+            case['solve_error'] = str(error)
+    m.dispose()
+    return case
+
+
+def run_case(n, n_vehicles, seed=0, time_horizon=25, solve_up_to=25, time_limit=10, memory=True):
+    # The solve only runs in the timed pass, its memory is Gurobi's own
+    timed = Stages()
+    case = {'n_stations': n, 'n_vehicles': n_vehicles, 'seed': seed}
+    case.update(pipeline(timed, n, n_vehicles, seed, time_horizon, n <= solve_up_to, time_limit))
+    case['stages'] = {name: {'time': value} for name, value in timed.record.items()}
+    if memory:
+        traced = Stages(trace=True)
+        pipeline(traced, n, n_vehicles, seed, time_horizon, False, time_limit)
+        tracemalloc.stop()
+        for name, value in traced.record.items():
+            case['stages'][name]['peak_memory'] = value
+    return case
+
+
+def case_key(n, n_vehicles, seed):
+    return "n{}_v{}_s{}".format(n, n_vehicles, seed)
+
+
+def run_suite(sizes=None, vehicles=None, seed=0, solve_up_to=25, time_limit=10, memory=True, path=None):
+    sizes = default_sizes if sizes is None else sizes
+    vehicles = default_vehicles if vehicles is None else vehicles
+    suite = {'meta': {'created': time.strftime("%Y-%m-%d %H:%M:%S"), 'host': platform.node(),
+                      'python': platform.python_version(), 'numpy': np.__version__,
+                      'gurobi': ".".join(str(k) for k in gurobi.version()), 'seed': seed,
+                      'solve_up_to': solve_up_to, 'time_limit': time_limit, 'memory': memory},
+             'cases': {}}
+    for n, n_vehicles in itertools.product(sizes, vehicles):
+        key = case_key(n, n_vehicles, seed)
+        case = run_case(n, n_vehicles, seed, solve_up_to=solve_up_to, time_limit=time_limit, memory=memory)
+        suite['cases'][key] = case
+        print(key, " ".join("{} {:.3f}s".format(name, stage['time']) for name, stage in case['stages'].items()))
+        if path is not None:
+            # Written after every case, so a long run keeps what it measured
+            with open(path, 'w') as fp:
+                json.dump(suite, fp, indent=2)
+    return suite
+
+
+def compare(baseline, current, tolerance=default_tolerance):
+    # A stage regresses when its time or peak memory grows by more than tolerance and by more than the noise
+    # floor. Any growth of the model size is a regression, a solve that gets worse is reported as well
+    regressions = []
+    for key, case in current['cases'].items():
+        if key not in baseline['cases']:
+            continue
+        base = baseline['cases'][key]
+        for name, stage in case['stages'].items():
+            if name not in base['stages']:
+                continue
+            for metric, floor in (('time', min_time), ('peak_memory', min_memory)):
+                if metric not in stage or metric not in base['stages'][name]:
+                    continue
+                old = base['stages'][name][metric]
+                new = stage[metric]
+                if new > old * (1 + tolerance) and new - old > floor:
+                    regressions.append((key, name, metric, old, new))
+        for metric in ('rows', 'columns', 'nonzeros'):
+            if case[metric] > base[metric]:
+                regressions.append((key, 'build', metric, base[metric], case[metric]))
+        if base.get('objective') is not None and case.get('objective') is not None \
+                and case['objective'] > base['objective'] + 1e-6 * max(1.0, abs(base['objective'])) \
+                and case.get('gap', 1) <= 1e-4 and base.get('gap', 1) <= 1e-4:
+            regressions.append((key, 'solve', 'objective', base['objective'], case['objective']))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Synthetic benchmark of instance generation, Ms, model build "
+                                                 "and solve")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="run the suite and write the results")
+    run_parser.add_argument('--out', default="Output/benchmark.json")
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=default_sizes)
+    run_parser.add_argument('--vehicles', type=int, nargs='+', default=default_vehicles)
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--solve-up-to', type=int, default=25, help="largest number of stations that is solved")
+    run_parser.add_argument('--time-limit', type=float, default=10)
+    run_parser.add_argument('--no-memory', action='store_true', help="skip the traced pass for peak memory")
+    compare_parser = commands.add_parser('compare', help="flag regressions of a run against a baseline")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--tolerance', type=float, default=default_tolerance)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run_suite(args.sizes, args.vehicles, args.seed, args.solve_up_to, args.time_limit, not args.no_memory,
+                  args.out)
+    else:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        with open(args.current, 'r') as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.tolerance)
+        for key, stage, metric, old, new in regressions:
+            print("{} {} {}: {:.4g} -> {:.4g}".format(key, stage, metric, old, new))
+        print("{} regressions in {} cases".format(len(regressions), len(current['cases'])))
+        sys.exit(1 if regressions else 0)
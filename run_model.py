@@ -1,41 +1,15 @@
-import json
-from Input.instance_generator import Instance
-from Input.station import Station
-from Model.gurobi_model import run_model
+from Input.station_selection import load_stations, build_instance, scenario_dynamics
+from Model.gurobi_model import run_model, profile_build_memory
+from Model.persistent_model import solve_scenarios
+from Model.alns_model import run_alns
+from Model.decomposition import run_decomposed
+from Model.solution_cache import SolutionCache
+from Model.profiler import ModelProfile, save_profile
+from Model.solution import Solution
 from Output.save_output import save_output
 from visualize import visualize
 
-with open("Data_processing/station.json", 'r') as f:
-    stations = json.load(f)
-
-
-def get_n_stations(n):
-    station_objects = []
-    counter = 1
-    for id, station in stations.items():
-        if counter > n:
-            break
-        latitude = float(station[0])
-        longitude = float(station[1])
-        init_battery_load = station[2][scenario][0]
-        init_flat_load = station[2][scenario][1]
-        incoming_battery_rate = station[2][scenario][2]
-        incoming_flat_rate = station[2][scenario][3]
-        outgoing_rate = station[2][scenario][4]
-        demand = station[2][scenario][5]
-        if check_demand(incoming_battery_rate, init_battery_load, demand, ideal_state):
-            obj = Station(latitude, longitude, init_battery_load, init_flat_load
-                          , incoming_battery_rate, incoming_flat_rate, outgoing_rate,
-                          demand, ideal_state, id)
-            station_objects.append(obj)
-            counter += 1
-    return station_objects
-
-
-def check_demand(incoming_bat_rate, init_bat_load, dem, ideal):
-    if init_bat_load + time_horizon * (incoming_bat_rate - dem) >= ideal:
-        return False
-    return True
+stations = load_stations()
 
 
 # ------- INPUT VALUES ----------
@@ -53,17 +27,58 @@ w_reward = 0.1
 w_dev_reward = 0.8
 w_driving_time = 0.2
 show_image = True
+mip_start = False
+arc_pruning = False
+k_nearest = None
+tight_ms = False
+lazy = False
+all_scenarios = False
+solution_cache = False
+profile_memory = False
+backend = 'gurobi'
 
-depot = Station(59.93791, 10.73048, None, None, None, None, None, None, None, 465)
-
-station_obj = get_n_stations(n_instance)
-station_obj.insert(0, depot)
-generated_instance = Instance(len(station_obj)+1, n_vehicles, time_horizon, station_obj, scenario=scenario,
-                              initial_size=n_instance, vehicle_cap=vehicle_cap, station_cap=station_cap,
-                              ideal_state=ideal_state, w_violation=w_violation, w_dev_obj=w_dev_obj,
-                              w_reward=w_reward, w_dev_reward=w_dev_reward, w_driving_time=w_driving_time)
-
-model, time = run_model(generated_instance)
-visualize(model, generated_instance.fixed, image=show_image)
+generated_instance, instance_stations = build_instance(stations, n_instance, scenario, n_vehicles, time_horizon,
+                                                       vehicle_cap, station_cap, ideal_state, w_violation,
+                                                       w_dev_obj, w_reward, w_dev_reward, w_driving_time)
 
-save_output(model, time, generated_instance.fixed, generated_instance.dynamic, station_obj)
+if all_scenarios and backend != 'gurobi':
+    raise ValueError("all_scenarios solves every scenario from one Gurobi model, it cannot be combined with the "
+                     "{} backend".format(backend))
+if all_scenarios:
+    # The selected stations in every scenario from one model, the selection itself is made for scenario
+    if solution_cache:
+        raise ValueError("solution_cache answers single instances, it cannot be combined with all_scenarios")
+    results = solve_scenarios(generated_instance, scenario_dynamics(stations, generated_instance),
+                              mip_start=mip_start, arc_pruning=arc_pruning, k_nearest=k_nearest, tight_ms=tight_ms,
+                              lazy=lazy)
+    for name, result in results.items():
+        if result['solution'] is None:
+            print("Scenario", name, "has no solution")
+            continue
+        print("Scenario", name, "Obj:", result['solution'].obj_val)
+        save_output(result['solution'], result['time'], result['solution'].fixed, result['dynamic'],
+                    instance_stations)
+else:
+    if backend == 'alns':
+        solution, time = run_alns(generated_instance)
+    elif backend == 'decomposition':
+        solution, time = run_decomposed(generated_instance)
+    elif solution_cache:
+        cache = SolutionCache()
+        solution, time = cache.solve(generated_instance, mip_start=mip_start, arc_pruning=arc_pruning,
+                                     k_nearest=k_nearest, tight_ms=tight_ms, lazy=lazy)
+        print(cache.summary())
+    else:
+        profile = ModelProfile()
+        model, time = run_model(generated_instance, profile=profile, mip_start=mip_start, arc_pruning=arc_pruning,
+                                k_nearest=k_nearest, tight_ms=tight_ms, lazy=lazy)
+        profile_key = "solvable_instance_" + str(len(generated_instance.fixed.stations)) + '_' + str(n_vehicles)
+        save_profile(profile, profile_key)
+        if profile_memory:
+            save_profile(profile_build_memory(generated_instance, lazy=lazy), profile_key + "_memory")
+        solution = Solution.from_model(model, generated_instance.fixed)
+    if solution is None:
+        print("No solution")
+    else:
+        visualize(solution, generated_instance.fixed, image=show_image)
+        save_output(solution, time, generated_instance.fixed, generated_instance.dynamic, instance_stations)
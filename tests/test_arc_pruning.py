@@ -0,0 +1,20 @@
+import contextlib
+import io
+from benchmark import synthetic_stations
+from Input.instance_generator import Instance
+from Model.gurobi_model import run_model
+
+
+def test_pruned_arcs_keep_the_optimum():
+    params = {'OutputFlag': 0, 'MIPGap': 0, 'MIPGapAbs': 0}
+    for n, vehicles, time_horizon, seed in ((4, 1, 10, 0), (5, 2, 15, 1), (6, 2, 25, 3)):
+        instance = Instance(n + 2, vehicles, time_horizon, synthetic_stations(n, seed), write_file=False,
+                            time_mode='haversine')
+        objectives, sizes = [], []
+        for arc_pruning in (False, True):
+            with contextlib.redirect_stdout(io.StringIO()):
+                m, _ = run_model(instance, time_limit=60, params=params, arc_pruning=arc_pruning)
+            objectives.append(m.ObjVal)
+            sizes.append(m.NumVars)
+        assert sizes[1] < sizes[0]
+        assert abs(objectives[0] - objectives[1]) <= 1e-6
@@ -0,0 +1,24 @@
+import copy
+import numpy as np
+import pytest
+from benchmark import synthetic_stations
+from Input.instance_generator import Instance
+from Model.decomposition import cluster_stations, station_distances
+
+
+def test_clusters_are_disjoint():
+    instance = Instance(12, 3, 25, synthetic_stations(10, 2), write_file=False, time_mode='haversine')
+    clusters = cluster_stations(instance.fixed, instance.dynamic, station_distances(instance))
+    stations = [i for cluster in clusters for i in cluster]
+    assert sorted(stations) == list(range(1, 11))
+    for v, cluster in enumerate(clusters):
+        start = int(instance.dynamic.start_stations[v])
+        assert start == 0 or start in cluster
+
+
+def test_shared_start_station_is_refused():
+    instance = Instance(12, 3, 25, synthetic_stations(10, 2), write_file=False, time_mode='haversine')
+    dynamic = copy.deepcopy(instance.dynamic)
+    dynamic.start_stations = np.array([4, 4, 0])
+    with pytest.raises(ValueError):
+        cluster_stations(instance.fixed, dynamic, station_distances(instance))
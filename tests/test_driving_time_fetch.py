@@ -0,0 +1,30 @@
+import json
+from Data_processing import driving_time_fetch
+from Data_processing.driving_time_store import get_store
+
+
+def fake_request(url, key, origins, destinations, timeout=30):
+    return {'times': [[1.5 for _ in destinations] for _ in origins], 'origin_addresses': ["a"] * len(origins),
+            'destination_addresses': ["b"] * len(destinations)}
+
+
+def test_removed_stations_keep_their_times(tmp_path, monkeypatch):
+    monkeypatch.setattr(driving_time_fetch, 'request_tile', fake_request)
+    station_path = str(tmp_path / "station.json")
+    out_path = str(tmp_path / "times.json")
+    with open(station_path, 'w') as fp:
+        json.dump({"1": [59.9, 10.7, {}], "2": [59.91, 10.71, {}]}, fp)
+    with open(out_path, 'w') as fp:
+        json.dump({"1_3": [4.0, "x", "z"], "3_1": [4.5, "z", "x"], "1_1": [0, "x", "x"]}, fp)
+    # The process has read the times before the fetch
+    assert get_store(out_path).get_driving_time("1", "3")[0] == 4.0
+
+    store, failed = driving_time_fetch.acquire_driving_times(station_path, out_path, key="key", rate=1000)
+    assert not failed
+    with open(out_path, 'r') as fp:
+        saved = json.load(fp)
+    assert saved["1_3"][0] == 4.0 and saved["3_1"][0] == 4.5
+    assert saved["1_2"][0] == 1.5 and saved["2_1"][0] == 1.5
+    # Pairs of a station that left station.json are not requested
+    assert "2_3" not in saved
+    assert get_store(out_path).get_driving_time("1", "2")[0] == 1.5
@@ -0,0 +1,18 @@
+import copy
+import os
+import numpy as np
+from benchmark import synthetic_stations
+from Input.generate_Ms import GenMs
+from Input.instance_generator import Instance
+from Input.tighten_Ms import M_names
+
+reference_path = os.path.join(os.path.dirname(__file__), 'data', 'genms_reference.npz')
+
+
+def test_ms_match_the_loop_version():
+    # The reference arrays were written by the per-station loops GenMs had before it was vectorized
+    instance = Instance(8, 2, 25, synthetic_stations(6, 0), write_file=False, time_mode='haversine')
+    fixed = GenMs(copy.copy(instance.fixed), instance.dynamic).fixed
+    reference = np.load(reference_path)
+    for name in M_names:
+        assert np.array_equal(np.asarray(getattr(fixed, name), dtype=float), reference[name]), name
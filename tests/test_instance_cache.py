@@ -0,0 +1,19 @@
+from benchmark import synthetic_stations
+from Input import instance_cache
+
+
+def test_refetched_times_give_a_new_key(tmp_path, monkeypatch):
+    path = str(tmp_path / "times.json")
+    with open(path, 'w') as fp:
+        fp.write('{"1_2": [3.0, "a", "b"]}')
+    stamp = instance_cache.time_files_stamp
+    monkeypatch.setattr(instance_cache, 'time_files_stamp', lambda: stamp(path))
+    stations = synthetic_stations(5, 0)
+    before = instance_cache.instance_key(stations, time_mode='store')
+    unchanged = instance_cache.instance_key(stations, time_mode='haversine')
+
+    with open(path, 'w') as fp:
+        fp.write('{"1_2": [3.5, "a", "b"], "2_1": [3.5, "b", "a"]}')
+    assert instance_cache.instance_key(stations, time_mode='store') != before
+    # Times from the coordinates only do not depend on the store
+    assert instance_cache.instance_key(stations, time_mode='haversine') == unchanged
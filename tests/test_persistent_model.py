@@ -0,0 +1,62 @@
+import contextlib
+import copy
+import io
+import numpy as np
+from benchmark import synthetic_stations
+from Input.generate_Ms import GenMs
+from Input.instance_generator import Instance
+from Model.gurobi_model import run_model
+from Model.persistent_model import PersistentModel, solve_scenarios
+
+params = {'OutputFlag': 0, 'MIPGap': 0, 'MIPGapAbs': 0}
+
+
+def next_state(instance, seed, move=False):
+    dynamic = copy.deepcopy(instance.dynamic)
+    rng = np.random.default_rng(seed)
+    swap = slice(1, -1)
+    dynamic.init_station_load[swap] = rng.integers(0, 12, len(dynamic.init_station_load) - 2)
+    dynamic.incoming_rate[swap] = np.round(rng.uniform(0, 1, len(dynamic.incoming_rate) - 2), 2)
+    dynamic.demand[swap] = np.round(rng.uniform(0, 1.5, len(dynamic.demand) - 2), 2)
+    dynamic.init_vehicle_load = np.array([3., 7.])
+    dynamic.driving_to_start = np.array([1.5, 0.5])
+    if move:
+        dynamic.start_stations = np.array([3, 4])
+    return dynamic
+
+
+def rebuilt_objective(instance, dynamic):
+    single = copy.copy(instance)
+    single.fixed = copy.copy(instance.fixed)
+    single.dynamic = dynamic
+    GenMs(single.fixed, dynamic)
+    m, _ = run_model(single, time_limit=60, params=params)
+    return m.ObjVal
+
+
+def test_update_matches_a_rebuild():
+    instance = Instance(7, 2, 20, synthetic_stations(5, 3), write_file=False, time_mode='haversine')
+    with contextlib.redirect_stdout(io.StringIO()):
+        model = PersistentModel(instance, 60)
+        for name, value in params.items():
+            model.m.setParam(name, value)
+        model.optimize()
+        state_constrs = list(model.handles.state_constrs)
+        for seed, move in ((1, False), (2, True)):
+            dynamic = next_state(instance, seed, move)
+            model.update(dynamic)
+            m, _ = model.optimize()
+            assert abs(m.ObjVal - rebuilt_objective(instance, dynamic)) <= 1e-6
+    # The state rows are updated in place, not replaced
+    assert all(a.sameAs(b) for a, b in zip(state_constrs, model.handles.state_constrs))
+
+
+def test_shared_scenarios_match_separate_solves():
+    instance = Instance(7, 2, 20, synthetic_stations(5, 4), write_file=False, time_mode='haversine')
+    dynamics = {'A': instance.dynamic, 'B': next_state(instance, 5), 'C': next_state(instance, 6, move=True)}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for arc_pruning in (False, True):
+            results = solve_scenarios(instance, dynamics, 60, params, arc_pruning=arc_pruning)
+            for scenario, dynamic in dynamics.items():
+                objective = results[scenario]['solution'].obj_val
+                assert abs(objective - rebuilt_objective(instance, dynamic)) <= 1e-6
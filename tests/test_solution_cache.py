@@ -0,0 +1,61 @@
+import copy
+import json
+from benchmark import synthetic_stations
+from Input.instance_generator import Instance
+from Model.solution import Solution
+from Model.solution_cache import SolutionCache, structure_key
+
+
+def route_solution(instance, stations, obj_val, gap=float('nan')):
+    # One vehicle from the depot over stations to the end station
+    path = [0] + stations + [instance.fixed.stations[-1]]
+    values = {"x[{},{},0]".format(i, j): 1 for i, j in zip(path[:-1], path[1:])}
+    values.update({"t[{}]".format(i): float(k) for k, i in enumerate(stations, 1)})
+    return Solution.from_values(instance.fixed, values, obj_val, gap)
+
+
+def test_replaced_entry_keeps_a_longer_route(tmp_path):
+    instance = Instance(8, 1, 25, synthetic_stations(6, 1), write_file=False, time_mode='haversine')
+    cache = SolutionCache(str(tmp_path))
+    cache.add(instance, route_solution(instance, [1], 10.0), 1.0)
+    longer = [1, 2, 3, 4, 5, 6]
+    cache.add(instance, route_solution(instance, longer, 5.0), 1.0)
+
+    reloaded = SolutionCache(str(tmp_path))
+    kind, k, _ = reloaded.lookup(instance)
+    assert kind == 'exact'
+    entries = reloaded.entries(structure_key(instance))
+    assert len(entries['objectives']) == 1
+    assert json.loads(entries['routes'][k]) == {'0': longer}
+    solution = reloaded.solution(instance, k)
+    assert solution.obj_val == 5.0
+    assert [step[0] for step in solution.routes()[0]] == [0] + longer
+
+
+def test_only_a_full_optimal_solve_answers_a_state(tmp_path):
+    instance = Instance(8, 1, 25, synthetic_stations(6, 1), write_file=False, time_mode='haversine')
+    cache = SolutionCache(str(tmp_path))
+    cache.add(instance, route_solution(instance, [1, 2], 5.0, gap=0.05), 1.0)
+    kind, k, _ = cache.lookup(instance)
+    assert kind == 'exact' and not cache.answers(instance, k)
+    # Over the k_nearest arcs only
+    cache.add(instance, route_solution(instance, [1, 2], 4.0, gap=0.0), 1.0, full=False)
+    assert not cache.answers(instance, k)
+    # A full solve to optimality replaces an entry with the same objective
+    cache.add(instance, route_solution(instance, [1, 2], 4.0, gap=0.0), 1.0)
+    assert SolutionCache(str(tmp_path)).answers(instance, k)
+
+
+def test_workers_keep_each_others_entries(tmp_path):
+    instance = Instance(8, 1, 25, synthetic_stations(6, 1), write_file=False, time_mode='haversine')
+    other = copy.copy(instance)
+    other.dynamic = copy.deepcopy(instance.dynamic)
+    other.dynamic.init_station_load[1] += 3
+    first = SolutionCache(str(tmp_path))
+    second = SolutionCache(str(tmp_path))
+    # Both have read the file before either writes
+    assert first.entries(structure_key(instance)) is None and second.entries(structure_key(other)) is None
+    first.add(instance, route_solution(instance, [1], 5.0), 1.0)
+    second.add(other, route_solution(other, [2], 6.0), 1.0)
+    entries = SolutionCache(str(tmp_path)).entries(structure_key(instance))
+    assert sorted(entries['objectives']) == [5.0, 6.0]
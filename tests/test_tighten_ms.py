@@ -0,0 +1,36 @@
+import contextlib
+import copy
+import io
+import numpy as np
+from benchmark import synthetic_stations
+from Input.generate_Ms import GenMs
+from Input.instance_generator import Instance
+from Input.tighten_Ms import TightMs
+from Model.gurobi_model import run_model
+
+
+def small_instance(n, vehicles, time_horizon, seed):
+    return Instance(n + 2, vehicles, time_horizon, synthetic_stations(n, seed), write_file=False,
+                    time_mode='haversine')
+
+
+def test_time_bounds_are_not_tightened():
+    # M_3 and M_6 bound the arrival time itself, a smaller one would change the model
+    instance = small_instance(6, 2, 25, 0)
+    loose = GenMs(copy.copy(instance.fixed), instance.dynamic).fixed
+    tight = TightMs(copy.copy(instance.fixed), instance.dynamic).fixed
+    for name in ('M_2', 'M_3', 'M_6', 'M_9', 'M_10', 'M_12', 'M_13'):
+        assert np.array_equal(getattr(tight, name), getattr(loose, name))
+    assert np.all(tight.M_1 <= loose.M_1) and np.all(tight.M_14 <= loose.M_14) and tight.M_5 <= loose.M_5
+
+
+def test_tight_ms_keep_the_optimum():
+    params = {'OutputFlag': 0, 'MIPGap': 0, 'MIPGapAbs': 0}
+    for n, vehicles, time_horizon, seed in ((4, 1, 10, 0), (5, 2, 15, 1), (5, 1, 40, 2)):
+        instance = small_instance(n, vehicles, time_horizon, seed)
+        objectives = []
+        for tight_ms in (False, True):
+            with contextlib.redirect_stdout(io.StringIO()):
+                m, _ = run_model(instance, time_limit=60, params=params, tight_ms=tight_ms)
+            objectives.append(m.ObjVal)
+        assert abs(objectives[0] - objectives[1]) <= 1e-6
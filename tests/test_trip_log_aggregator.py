@@ -0,0 +1,51 @@
+import json
+import pandas as pd
+from Data_processing.trip_log_aggregator import TripLogAggregator
+
+
+def trips(day, n=8):
+    # n trips from station 1 to station 2 during the 07:00 interval of scenario A
+    started = pd.Timestamp(day) + pd.Timedelta(hours=7)
+    return pd.DataFrame({'started_at': [started + pd.Timedelta(minutes=10 * k) for k in range(n)],
+                         'ended_at': [started + pd.Timedelta(minutes=10 * k + 5) for k in range(n)],
+                         'start_station_id': 1, 'end_station_id': 2,
+                         'start_station_latitude': 59.91, 'start_station_longitude': 10.75})
+
+
+def test_appended_log_only_adds_new_days(tmp_path):
+    log = tmp_path / "trips.csv"
+    state = tmp_path / "state.json"
+    trips("2024-05-01").to_csv(log, index=False)
+    aggregator = TripLogAggregator(str(state), None)
+    aggregator.ingest(str(log))
+    aggregator.save()
+
+    pd.concat([trips("2024-05-01"), trips("2024-05-02")]).to_csv(log, index=False)
+    aggregator = TripLogAggregator(str(state), None)
+    assert aggregator.ingest(str(log))
+    assert aggregator.totals['1'][0][0] == 16
+    assert len(aggregator.days) == 2
+    assert aggregator.skipped_rows == 16
+
+
+def test_unknown_stock_has_no_empty_minutes(tmp_path):
+    log = tmp_path / "trips.csv"
+    trips("2024-05-01").to_csv(log, index=False)
+    aggregator = TripLogAggregator(None, None)
+    aggregator.ingest(str(log))
+    assert aggregator.totals['1'][0][3] == 0
+    departures, demand = aggregator.rates()['1']['A'][2:]
+    assert departures == round(8 / 120, 3)
+    assert demand == round(8 / 120, 2)
+
+
+def test_known_stock_counts_empty_minutes(tmp_path):
+    # Two bikes at the start, the third departure proves one more, the station is empty after the last one
+    log = tmp_path / "trips.csv"
+    stations = tmp_path / "station.json"
+    trips("2024-05-01").to_csv(log, index=False)
+    with open(stations, 'w') as fp:
+        json.dump({'1': [59.91, 10.75, {scenario: [2, 0, 0, 0, 0, 0] for scenario in 'ABCDE'}]}, fp)
+    aggregator = TripLogAggregator(None, str(stations))
+    aggregator.ingest(str(log))
+    assert 0 < aggregator.totals['1'][0][3] <= 120